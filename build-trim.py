@@ -10,6 +10,14 @@ OUT = ROOT / 'out'
 OUT_TRIM = ROOT / 'out-trim'
 TRIM_RULES_FILE = ROOT / 'trim-rules.txt'
 
+# share/ folders holding baked lookup textures; these must stay lossless PNG
+BAKED_SHARE_DIRS = ('mask', 'warp', 'color-lut')
+
+def is_baked_texture(path_text):
+    """Check if a share/ path points into one of the baked lookup texture folders."""
+    normalized = path_text.replace('\\', '/')
+    return any(f'share/{name}/' in normalized for name in BAKED_SHARE_DIRS)
+
 def load_trim_rules(rules_file):
     """Load preset removal rules from a file.
     
@@ -72,15 +80,19 @@ def replace_png_with_jpg_in_presets(root_dir, verbose=False):
     if not presets_dir.exists():
         return 0, 0
     
-    for preset_file in presets_dir.rglob('*.slangp'):
+    for preset_file in sorted(presets_dir.rglob('*.slangp')):
         try:
             content = preset_file.read_text(encoding='utf-8')
-            new_content = content.replace('.png', '.jpg')
+            lines = content.split('\n')
+            count = 0
+            for idx, line in enumerate(lines):
+                if '.png' in line and not is_baked_texture(line):
+                    count += line.count('.png')
+                    lines[idx] = line.replace('.png', '.jpg')
+            new_content = '\n'.join(lines)
             
             if new_content != content:
-                preset_file.write_text(new_content, encoding='utf-8')
-                # Count how many replacements were made
-                count = content.count('.png')
+                preset_file.write_text(new_content, encoding='utf-8', newline='\n')
                 replaced_count += count
                 files_modified += 1
                 if verbose:
@@ -138,12 +150,14 @@ def copy_and_trim(verbose=False):
                 else:
                     item.unlink()
     
-    # Remove *.png from share folder
+    # Remove *.png from share folder (baked lookup textures are kept)
     share_dir = OUT_TRIM / 'share'
     if share_dir.exists():
         if verbose:
             print(f"Removing PNG files from: {share_dir}")
-        for png_file in share_dir.rglob('*.png'):
+        for png_file in sorted(share_dir.rglob('*.png')):
+            if is_baked_texture(png_file.as_posix()):
+                continue
             if verbose:
                 print(f"  Removing: {png_file}")
             png_file.unlink()
@@ -159,7 +173,7 @@ def copy_and_trim(verbose=False):
         presets_dir = OUT_TRIM / 'presets'
         if presets_dir.exists():
             removed_count = 0
-            for preset_file in presets_dir.rglob('*.slangp'):
+            for preset_file in sorted(presets_dir.rglob('*.slangp')):
                 if should_remove_preset(preset_file, rules):
                     if verbose:
                         print(f"  Removing preset: {preset_file.relative_to(OUT_TRIM)}")
@@ -0,0 +1,546 @@
+"""
+Bakes the color-sdr/color-wcg output transform into LUTs for shaders/color-lut.slang.
+Rules:
+- For each preset using `color-sdr.slang` or `color-wcg.slang`, resolve the
+  colorimetry, chromatic adaptation and gamut parameters (preset values over
+  the shader's declared defaults).
+- Evaluate the fragment-stage transform that follows tone mapping in
+  color-base.slang (YrYgYb -> XYZ, chromatic adaptation, gamut compression,
+  output matrix, safety clamp) on an N x N x N grid over YrYgYb in [0, 1].
+- Tone mapping, makeup gain and the picture/brightness controls depend on the
+  per-pixel gain channel, so they stay in the shader and run before the LUT.
+- Store the grid as a 2D strip (N*N wide, blue slices side by side) in a PNG
+  under `share/color-lut/`. Input and output use a power shaper; the output
+  is scaled by LUT_HEADROOM so over-range RGB survives the [0, 1] texture.
+  Output is 16-bit, split into high/low byte halves because RetroArch loads
+  PNGs at 8 bits per channel.
+- Rewrite the preset in place: the color pass -> `color-lut.slang` and add the
+  `COLOR_LUT` texture with linear, non-mipmapped, clamped sampling.
+- HDR presets keep the analytic pass: their input is not clamped after tone
+  mapping, so there is no bounded domain to tabulate.
+- The LUT reflects shipped defaults; OPTION_NOCOLOR/OPTION_NOCAT and the
+  OPTION_DEBUG color tools are not baked.
+- Evaluation is pure Python: one LUT takes about 0.3s at 33 and 2.5s at 65
+  on one core. Blue/red slices are baked in bands of BAND_SLICES green
+  values on a process pool of `--jobs` workers, so large LUTs scale with
+  the core count instead of serializing on the GIL.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+import shader_source
+import slangp
+from colorimetry import COLORIMETRY_PRESETS, mat_inverse, mat_mul, mat_vec
+from png_writer import quantize, write_png
+
+
+LUT_NAME = 'COLOR_LUT'
+DEFAULT_LUT_SIZE = 33
+BAND_SLICES = 8
+# Keep in sync with color-lut.slang
+LUT_SHAPER_GAMMA = 2.2
+LUT_HEADROOM = 16.0
+
+# Analytic pass -> output gamut handled by the baker
+BAKED_SHADERS = {
+    'color-sdr.slang': 'sdr',
+    'color-wcg.slang': 'wcg',
+}
+# Parameters that select the baked transform (everything else stays live)
+LUT_PARAMETERS = (
+    'COLORIMETRY_PRESET',
+    'R_X', 'R_Y', 'G_X', 'G_Y', 'B_X', 'B_Y', 'W_X', 'W_Y',
+    'CHROMATIC_ADAPTATION',
+    'ADAPTATION_LEVEL',
+    'GAMUT_COMPRESSION',
+    'GAMUT_SELECT',
+)
+
+THRESHOLD = 1.0 / 255.0
+IPT_GAMMA = 0.43
+D65_XYZ = (0.95047, 1.0, 1.08883)
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def glsl_mat3(*values):
+    """Row-major matrix from GLSL's column-major mat3(...) constructor order."""
+    return tuple(tuple(values[col * 3 + row] for col in range(3)) for row in range(3))
+
+
+# Constants from shaders/color.inc
+XYZ_TO_sRGB = glsl_mat3(
+    3.2406255, -0.9689307, 0.0557101,
+    -1.5372080, 1.8758561, -0.2040211,
+    -0.4986286, 0.0415175, 1.0569959)
+XYZ_TO_BT2020 = glsl_mat3(
+    1.716650, -0.66668, 0.01764,
+    -0.355671, 1.616481, -0.042771,
+    -0.253366, 0.015769, 0.942103)
+XYZ_TO_DCIP3 = glsl_mat3(
+    2.493497, -0.829489, 0.035846,
+    -0.931384, 1.762664, -0.076172,
+    -0.402711, 0.023625, 0.956885)
+sRGB_TO_XYZ = glsl_mat3(
+    0.4124, 0.2126, 0.0193,
+    0.3576, 0.7152, 0.1192,
+    0.1805, 0.0722, 0.9505)
+NTSC_J_TO_XYZ = glsl_mat3(
+    0.3965, 0.2246, 0.0205,
+    0.3119, 0.6740, 0.1281,
+    0.2447, 0.1014, 1.2640)
+EBU_TO_XYZ = glsl_mat3(
+    0.4306, 0.2220, 0.0202,
+    0.3411, 0.7066, 0.1292,
+    0.1785, 0.0714, 0.9393)
+SMPTE_C_TO_XYZ = glsl_mat3(
+    0.3935, 0.2124, 0.0187,
+    0.3653, 0.7011, 0.1119,
+    0.1912, 0.0866, 0.9584)
+XYZ_TO_LMS = glsl_mat3(
+    0.8951, -0.7502, 0.0389,
+    0.2664, 1.7135, -0.0685,
+    -0.1614, 0.0367, 1.0296)
+LMS_TO_XYZ = glsl_mat3(
+    0.9869929, 0.4323053, -0.0085287,
+    -0.1470543, 0.5183603, 0.0400428,
+    0.1599627, 0.0492912, 0.9684867)
+CAT16_M = glsl_mat3(
+    0.401288, -0.250268, -0.002079,
+    0.650173, 1.204414, 0.048952,
+    -0.051461, 0.045854, 0.953127)
+CAT16_M_INV = glsl_mat3(
+    1.8620678, 0.387526, -0.015841,
+    -1.0112546, 0.621447, -0.034123,
+    0.1491868, -0.008974, 1.049964)
+IPT_XYZ_TO_LMS = glsl_mat3(
+    0.4002, -0.2280, 0.0,
+    0.7075, 1.1500, 0.0,
+    -0.0807, 0.0612, 0.9184)
+IPT_LMS_TO_XYZ = glsl_mat3(
+    1.8502, 0.3668, 0.0,
+    -1.1383, 0.6439, 0.0,
+    0.2384, -0.0107, 1.0889)
+IPT_LMS_TO_IPT = glsl_mat3(
+    0.4000, 4.4550, 0.8056,
+    0.4000, -4.8510, 0.3572,
+    0.2000, 0.3960, -1.1628)
+IPT_IPT_TO_LMS = glsl_mat3(
+    1.0, 1.0, 1.0,
+    0.0975689, -0.11388, 0.0326151,
+    0.205226, 0.133217, -0.67689)
+
+IDENTITY = ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0))
+LUV_UN = (4.0 * 0.95047) / (0.95047 + 15.0 + 3.0 * 1.08883)
+LUV_VN = 9.0 / (0.95047 + 15.0 + 3.0 * 1.08883)
+
+
+def xyY_to_XYZ(x: float, y: float, Y: float):
+    return (Y * x / y, Y, Y * (1.0 - x - y) / y)
+
+
+def XYZ_to_CIE_LUV(XYZ):
+    X, Y, Z = XYZ
+    L = 116.0 * Y ** (1.0 / 3.0) - 16.0 if Y > 0.008856 else 903.3 * Y
+    denom = X + 15.0 * Y + 3.0 * Z
+    u = 4.0 * X / denom if denom > 0.0 else 0.0
+    v = 9.0 * Y / denom if denom > 0.0 else 0.0
+    return (L, 13.0 * L * (u - LUV_UN), 13.0 * L * (v - LUV_VN))
+
+
+def CIE_LUV_to_XYZ(luv):
+    L, U, V = luv
+    if L <= 0.0:
+        # The shader divides by zero here; black is the only sensible result.
+        return (0.0, 0.0, 0.0)
+    u = LUV_UN + U / (13.0 * L)
+    v = LUV_VN + V / (13.0 * L)
+    Y = ((L + 16.0) / 116.0) ** 3 if L > 8.0 else L / 903.3
+    if v == 0.0:
+        return (0.0, Y, 0.0)
+    return (Y * 9.0 * u / (4.0 * v), Y, Y * (12.0 - 3.0 * u - 20.0 * v) / (4.0 * v))
+
+
+def signed_pow(values, p: float):
+    return tuple(math.copysign(abs(v) ** p, v) for v in values)
+
+
+def XYZ_to_IPT(XYZ):
+    return mat_vec(IPT_LMS_TO_IPT, signed_pow(mat_vec(IPT_XYZ_TO_LMS, XYZ), IPT_GAMMA))
+
+
+def IPT_to_XYZ(ipt):
+    return mat_vec(IPT_LMS_TO_XYZ, signed_pow(mat_vec(IPT_IPT_TO_LMS, ipt), 1.0 / IPT_GAMMA))
+
+
+def get_RGB_to_XYZ(red_XYZ, green_XYZ, blue_XYZ, white_XYZ):
+    primaries = tuple(tuple(c[row] for c in (red_XYZ, green_XYZ, blue_XYZ)) for row in range(3))
+    S = mat_vec(mat_inverse(primaries), white_XYZ)
+    return tuple(tuple(primaries[row][col] * S[col] for col in range(3)) for row in range(3))
+
+
+def diagonal(values):
+    return tuple(tuple(values[i] if i == j else 0.0 for j in range(3)) for i in range(3))
+
+
+def bradford_linear(wref_XYZ, wout_XYZ):
+    wref = mat_vec(XYZ_TO_LMS, wref_XYZ)
+    wout = mat_vec(XYZ_TO_LMS, wout_XYZ)
+    return mat_mul(LMS_TO_XYZ, mat_mul(diagonal([o / r for o, r in zip(wout, wref)]), XYZ_TO_LMS))
+
+
+def zhai2018_cat16(ref_XYZ, tgt_XYZ, d: float):
+    src = mat_vec(CAT16_M, ref_XYZ)
+    tgt = mat_vec(CAT16_M, tgt_XYZ)
+    D = diagonal([d * t / s + 1.0 - d for t, s in zip(tgt, src)])
+    return mat_mul(CAT16_M_INV, mat_mul(D, CAT16_M))
+
+
+def bradford_params(ref_XYZ):
+    wref = mat_vec(XYZ_TO_LMS, ref_XYZ)
+    wout = mat_vec(XYZ_TO_LMS, D65_XYZ)
+    return (wref, (wout[0] / wref[0], wout[1] / wref[1]), wout[2], (wref[2] / wout[2]) ** 0.0834)
+
+
+def bradford_fast(XYZ, params):
+    wref, rg_scale, b_out, p = params
+    lms = mat_vec(XYZ_TO_LMS, XYZ)
+    adapted_b = b_out * max(lms[2] / wref[2], 0.0) ** p
+    return mat_vec(LMS_TO_XYZ, (rg_scale[0] * lms[0], rg_scale[1] * lms[1], adapted_b))
+
+
+def _bisect_scale(test):
+    """Port of the 9-step bisection in color-base.slang's scale_* helpers."""
+    min_scale, max_scale, scale = 0.0, 1.0, 1.0
+    for _ in range(9):
+        if test(scale):
+            min_scale = scale
+        else:
+            max_scale = scale
+        scale = 0.5 * (min_scale + max_scale)
+        if max_scale - min_scale < THRESHOLD:
+            break
+    return min_scale
+
+
+def scale_luminance(color, lab, to_rgb, to_XYZ):
+    if not any(c > 1.0 for c in color):
+        return 1.0
+    return _bisect_scale(lambda s: all(c <= 1.0 for c in mat_vec(to_rgb, to_XYZ((lab[0] * s, lab[1], lab[2])))))
+
+
+def scale_chroma(color, lab, to_rgb, to_XYZ):
+    if not any(c < 0.0 for c in color):
+        return 1.0
+    return _bisect_scale(lambda s: all(c >= 0.0 for c in mat_vec(to_rgb, to_XYZ((lab[0], lab[1] * s, lab[2] * s)))))
+
+
+class ColorTransform:
+    """Per-preset state from color-base.slang's vertex stage, plus the fragment transform."""
+
+    def __init__(self, params: dict, gamut: str):
+        self.preset = params['COLORIMETRY_PRESET']
+        self.adaptation = params['CHROMATIC_ADAPTATION']
+        self.compression = params.get('GAMUT_COMPRESSION', 0.0) if gamut == 'sdr' else None
+        if gamut == 'sdr':
+            self.to_rgb = XYZ_TO_sRGB
+        else:
+            self.to_rgb = XYZ_TO_BT2020 if params.get('GAMUT_SELECT', 0.0) < 0.5 else XYZ_TO_DCIP3
+
+        if self.preset < 0.5:
+            xy = [(params['R_X'], params['R_Y']), (params['G_X'], params['G_Y']),
+                  (params['B_X'], params['B_Y']), (params['W_X'], params['W_Y'])]
+            primaries = [xyY_to_XYZ(x, y, 1.0) for x, y in xy]
+            rgb_to_XYZ = get_RGB_to_XYZ(*primaries)
+        else:
+            index = min(int(self.preset + 0.5), max(COLORIMETRY_PRESETS))
+            c = COLORIMETRY_PRESETS[index][1]
+            xy = [c.red, c.green, c.blue, c.white]
+            rgb_to_XYZ = {1: SMPTE_C_TO_XYZ, 2: NTSC_J_TO_XYZ, 3: EBU_TO_XYZ, 4: sRGB_TO_XYZ}[index]
+        self.primaries_xy = xy[:3]
+
+        ref_XYZ = mat_vec(rgb_to_XYZ, (1.0, 1.0, 1.0))
+        # Only Custom (0) and NTSC-J (2) have non-D65 white points
+        self.needs_cat = self.adaptation > 0.5 and (self.preset < 0.5 or 1.5 <= self.preset < 2.5)
+        d65_preset = 0.5 <= self.preset < 1.5 or self.preset >= 2.5
+        if self.adaptation < 0.5 or d65_preset or self.adaptation >= 2.5:
+            self.cat = IDENTITY
+        elif self.adaptation < 1.5:
+            self.cat = bradford_linear(ref_XYZ, D65_XYZ)
+        else:
+            self.cat = zhai2018_cat16(ref_XYZ, D65_XYZ, params['ADAPTATION_LEVEL'])
+        self.bradford = bradford_params(ref_XYZ)
+
+        self.luv_scale = None
+        self.ipt_scale = None
+        if self.compression is not None and self.compression > 1.5 and self.preset < 3.5:
+            self._precompute_compression(rgb_to_XYZ)
+
+    def adapt(self, XYZ):
+        if 0.5 <= self.adaptation < 2.5:
+            return mat_vec(self.cat, XYZ)
+        if self.adaptation >= 2.5:
+            return bradford_fast(XYZ, self.bradford)
+        return XYZ
+
+    def _precompute_compression(self, rgb_to_XYZ):
+        white, red, green, blue = (
+            self.adapt(mat_vec(rgb_to_XYZ, v)) for v in ((1.0, 1.0, 1.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0))
+        )
+        if self.compression < 2.5:
+            to_lab, from_lab = XYZ_to_CIE_LUV, CIE_LUV_to_XYZ
+        else:
+            to_lab, from_lab = XYZ_to_IPT, IPT_to_XYZ
+        y_scale = scale_luminance(mat_vec(self.to_rgb, white), to_lab(white), self.to_rgb, from_lab)
+        c_scale = 1.0
+        for primary in (red, green, blue):
+            lab = to_lab(primary)
+            lab = (lab[0] * y_scale, lab[1], lab[2])
+            c_scale = min(c_scale, scale_chroma(mat_vec(self.to_rgb, primary), lab, self.to_rgb, from_lab))
+        if self.compression < 2.5:
+            self.luv_scale = (y_scale, c_scale)
+        else:
+            self.ipt_scale = (y_scale, c_scale)
+
+    def __call__(self, YrYgYb):
+        XYZ = [0.0, 0.0, 0.0]
+        for (x, y), Y in zip(self.primaries_xy, YrYgYb):
+            for i, v in enumerate(xyY_to_XYZ(x, y, Y)):
+                XYZ[i] += v
+        if self.needs_cat:
+            XYZ = mat_vec(self.cat, XYZ) if self.adaptation < 2.5 else bradford_fast(XYZ, self.bradford)
+
+        if self.luv_scale is not None:
+            L, U, V = XYZ_to_CIE_LUV(XYZ)
+            XYZ = CIE_LUV_to_XYZ((L * self.luv_scale[0], U * self.luv_scale[1], V * self.luv_scale[1]))
+        elif self.ipt_scale is not None:
+            I, P, T = XYZ_to_IPT(XYZ)
+            XYZ = IPT_to_XYZ((I * self.ipt_scale[0], P * self.ipt_scale[1], T * self.ipt_scale[1]))
+
+        rgb = mat_vec(self.to_rgb, XYZ)
+        if self.compression is not None and 0.5 <= self.compression < 1.5 and self.preset < 3.5:
+            peak = max(rgb)
+            if peak > 1.0:
+                rgb = tuple(c / peak for c in rgb)
+        return tuple(max(c, 0.0) for c in rgb)
+
+
+def split_16bit(value: float):
+    """High and low bytes of a 16-bit code, as normalized 8-bit samples."""
+    code = quantize(value, 16)
+    return (code >> 8) / 255.0, (code & 0xFF) / 255.0
+
+
+def bake_band(transform: ColorTransform, size: int, green):
+    """High-byte rows, low-byte rows and max output for the green grid indices in `green`."""
+    grid = [(i / (size - 1)) ** LUT_SHAPER_GAMMA for i in range(size)]
+    inv_gamma = 1.0 / LUT_SHAPER_GAMMA
+    high_rows = []
+    low_rows = []
+    peak = 0.0
+    for g in (grid[i] for i in green):
+        high = []
+        low = []
+        for b in grid:
+            for r in grid:
+                rgb = transform((r, g, b))
+                peak = max(peak, *rgb)
+                for c in rgb:
+                    hi, lo = split_16bit((c / LUT_HEADROOM) ** inv_gamma)
+                    high.append(hi)
+                    low.append(lo)
+        high_rows.append(high)
+        low_rows.append(low)
+    return high_rows, low_rows, peak
+
+
+def bake_lut(transform: ColorTransform, size: int, executor=None):
+    """Rows of the N*N x 2N strip for color-lut.slang; also returns the max output.
+
+    RetroArch decodes every PNG to 8 bits per channel, so each shaped 16-bit
+    value is split into a high-byte strip (top N rows) and a low-byte strip
+    (bottom N rows). Filtering is linear, so both halves interpolate exactly.
+    With an `executor`, bands of green slices are baked on it.
+    """
+    bands = [range(g, min(g + BAND_SLICES, size)) for g in range(0, size, BAND_SLICES)]
+    if executor is None:
+        results = [bake_band(transform, size, band) for band in bands]
+    else:
+        results = [future.result() for future in [executor.submit(bake_band, transform, size, band) for band in bands]]
+    high_rows = [row for high, _, _ in results for row in high]
+    low_rows = [row for _, low, _ in results for row in low]
+    return high_rows + low_rows, max(peak for _, _, peak in results)
+
+
+def effective_parameters(values: dict, shader_file: Path) -> dict:
+    declared = shader_source.collect_parameters(shader_file)
+    params = {}
+    for name in LUT_PARAMETERS:
+        raw = values.get(name)
+        if raw is None:
+            if name not in declared:
+                continue
+            params[name] = declared[name].default
+        else:
+            params[name] = float(raw)
+    return params
+
+
+class ColorLutBaker:
+    """Bakes each unique (gamut, parameter set) LUT once; safe to share between threads.
+
+    Use as a context manager: LUT bands run on a process pool of `jobs` workers.
+    """
+
+    def __init__(self, share_dir: Path, size: int, verbose=False, jobs=1):
+        self.lut_dir = share_dir / 'color-lut'
+        self.size = size
+        self.verbose = verbose
+        self.jobs = max(1, jobs)
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._executor = None
+
+    def __enter__(self):
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+        return self
+
+    def __exit__(self, *exc):
+        self._executor.shutdown()
+        self._executor = None
+
+    def lut_path(self, gamut: str, params: dict) -> Path:
+        key = json.dumps({'gamut': gamut, 'size': self.size, **params}, sort_keys=True)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+        return self.lut_dir / f'{gamut}-{self.size}-{digest}.png'
+
+    def bake(self, gamut: str, params: dict) -> Path:
+        path = self.lut_path(gamut, params)
+        with self._lock:
+            event = self._pending.get(path)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[path] = event
+        if not owner:
+            event.wait()
+            return path
+
+        try:
+            rows, peak = bake_lut(ColorTransform(params, gamut), self.size, self._executor)
+            write_png(path, self.size * self.size, 2 * self.size, rows, channels=3)
+            if peak > LUT_HEADROOM:
+                print(f"Warning: {path.name} peaks at {peak:.3f}, above LUT headroom {LUT_HEADROOM:g}; clipped")
+            if self.verbose:
+                print(f"  Baked {path.name}: peak={peak:.4f}")
+            with self._lock:
+                self.manifest[path.name] = {
+                    'gamut': gamut,
+                    'size': self.size,
+                    'parameters': params,
+                    'peak': round(peak, 6),
+                }
+        finally:
+            event.set()
+        return path
+
+    def write_manifest(self):
+        if not self.manifest:
+            return
+        manifest_path = self.lut_dir / 'luts.json'
+        existing = {}
+        if manifest_path.exists():
+            existing = json.loads(manifest_path.read_text(encoding='utf-8'))
+        existing.update(self.manifest)
+        manifest_path.write_text(json.dumps(existing, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+
+def transform_preset(preset_path: Path, baker: ColorLutBaker, verbose=False):
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+
+    for shader_name, gamut in BAKED_SHADERS.items():
+        color_index = slangp.find_shader_index(values, shader_name)
+        if color_index is not None:
+            break
+    else:
+        return False
+
+    shader_key = f'shader{color_index}'
+    shader_path = values[shader_key]
+    shader_file = (preset_path.parent / shader_path).resolve()
+    if not shader_file.is_file():
+        print(f"Warning: {shader_path} not found for {preset_path}; keeping analytic color pass")
+        return False
+    try:
+        params = effective_parameters(values, shader_file)
+    except ValueError:
+        print(f"Warning: unreadable color parameters in {preset_path}; keeping analytic color pass")
+        return False
+
+    lut = baker.bake(gamut, params)
+
+    slangp.replace_value(lines, shader_key, shader_path[: -len(shader_name)] + 'color-lut.slang', quote=False)
+    textures = slangp.texture_names(values)
+    if LUT_NAME not in textures:
+        textures.append(LUT_NAME)
+    slangp.set_value(lines, 'textures', ';'.join(textures))
+    slangp.set_value(lines, LUT_NAME, slangp.relative_preset_path(preset_path, lut))
+    slangp.set_value(lines, f'{LUT_NAME}_linear', 'true')
+    slangp.set_value(lines, f'{LUT_NAME}_mipmap', 'false')
+    slangp.set_value(lines, f'{LUT_NAME}_wrap_mode', 'clamp_to_edge')
+
+    preset_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+    if verbose:
+        print(f"Baked color LUT: {preset_path} -> {lut.name}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bake color LUTs and switch presets to color-lut.slang')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing share/ and presets/')
+    parser.add_argument(
+        '--input-dir',
+        type=Path,
+        action='append',
+        default=[],
+        help='Preset folder to convert (repeatable)',
+    )
+    parser.add_argument('--size', type=int, default=DEFAULT_LUT_SIZE, help='LUT grid size per axis (33 or 65)')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    if args.size < 2:
+        parser.error('--size must be at least 2')
+
+    jobs = max(1, args.jobs)
+    with ColorLutBaker(args.root_dir / 'share', args.size, verbose=args.verbose, jobs=jobs) as baker:
+        for presets_dir in args.input_dir:
+            if not presets_dir.exists():
+                print(f"Warning: Input directory not found: {presets_dir}")
+                continue
+            presets = sorted(presets_dir.rglob('*.slangp'))
+            print(f"Baking color LUTs for {presets_dir.name} ({len(presets)} preset(s))")
+            # Preset threads wait on LUT bands running in the process pool
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(transform_preset, preset, baker, args.verbose) for preset in presets]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+
+    baker.write_manifest()
+    print(f"Color LUT baking complete: {len(baker.manifest)} LUT(s).")
+
+
+if __name__ == '__main__':
+    main()
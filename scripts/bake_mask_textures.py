@@ -0,0 +1,368 @@
+"""
+Bakes CRT mask tiles for shaders/mask-baked.slang and switches presets to them.
+Rules:
+- For each preset using `mask.slang`, read TVL and MASK_TYPE (shader defaults
+  from shaders/menus/parameters/mask.inc when the preset does not set them).
+- Bake one tileable mask period per (mask type, TVL, output height) into
+  `share/mask/<type>-tvl<TVL>-h<height>.png` under the root directory.
+  Each texel pre-integrates the point-sampled mask of mask.slang over its
+  footprint and is normalized by the peak mask value, so the vertex-stage
+  `compute_peak_mask_value` search is done here once per tile.
+- The alpha channel stores the peak Yr+Yg+Yb gain / 3 at the mip level that
+  matches the target output height (16:9 viewport assumed).
+- Rewrite the preset in place: `mask.slang` -> `mask-baked.slang` and add the
+  `MASK_LUT` texture with linear, mipmapped, repeating sampling.
+- Tiles are power-of-two sized so RetroArch's generated mip chain is an exact
+  box pre-integration of the pattern. A manifest (`share/mask/masks.json`)
+  records the sigma, peak value, average color and peak gain of every tile.
+"""
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+import slangp
+from png_writer import write_png
+
+
+DEFAULT_TVL = 325.0
+DEFAULT_MASK_TYPE = 1.0
+LUT_NAME = 'MASK_LUT'
+
+# Mask period in mask units and baked tile size in texels, per mask type.
+MASK_PERIODS = {
+    'aperture': (6.0, 1.0),
+    'slot': (12.0, 3.0),
+    'shadow': (6.0, 4.0),
+}
+TILE_SIZES = {
+    'aperture': (256, 4),
+    'slot': (256, 64),
+    'shadow': (256, 128),
+}
+# Sample grid used by mask.slang's compute_peak_mask_value
+PEAK_SAMPLES = {
+    'aperture': (144, 1),
+    'slot': (216, 72),
+    'shadow': (144, 96),
+}
+TEXEL_SUPERSAMPLES = 4
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def mask_type_name(mask_type: float) -> str:
+    if mask_type < 0.5:
+        return 'aperture'
+    if mask_type < 1.5:
+        return 'slot'
+    return 'shadow'
+
+
+def derive_mask_sigma(tvl: float, output_height: float, kind: str) -> float:
+    """Port of derive_effective_mask_sigma() from mask.slang."""
+    height_scale = 2160.0 / max(output_height, 1e-7)
+    tvl_4k_equivalent = max(tvl, 1.0) * height_scale
+    sigma = 0.5 + (2.0 - 0.5) * (tvl_4k_equivalent - 100.0) / 500.0
+    if kind == 'shadow':
+        sigma *= 0.625
+    return sigma
+
+
+def cyclic_dist(x: float, center: float, period: float) -> float:
+    d = abs(x - center)
+    return min(d, period - d)
+
+
+def _stripes(cycle: float, centers, period: float, sigma: float):
+    k = -0.5 / (sigma * sigma)
+    return [math.exp(k * cyclic_dist(cycle, c, period) ** 2) for c in centers]
+
+
+def mask_factors(x_units: float, y_units: float, sigma: float, kind: str):
+    """Split compute_mask_point_sample() into [(row weight, column [r, g, b])] terms.
+
+    The mask is a sum of row weights (functions of y only) times stripe
+    profiles (functions of x only), so averages over a texel separate.
+    """
+    if kind == 'aperture':
+        return [(1.0, _stripes((x_units - 0.5) % 6.0, (0.0, 2.0, 4.0), 6.0, sigma))]
+
+    brightness_ratio = math.sqrt(1.0 + sigma * sigma)
+    k_v = -0.5 / (sigma * sigma)
+
+    if kind == 'slot':
+        cycle = (x_units - 0.5) % 12.0
+        vcycle = (y_units - 0.5) % 3.0
+        w_a = math.exp(k_v * max(cyclic_dist(vcycle, 0.5, 3.0) - 0.5, 0.0) ** 2)
+        w_b = math.exp(k_v * max(cyclic_dist(vcycle, 2.0, 3.0) - 0.5, 0.0) ** 2)
+        return [
+            (w_a / brightness_ratio, _stripes(cycle, (0.0, 2.0, 4.0), 12.0, sigma)),
+            (w_b / brightness_ratio, _stripes(cycle, (6.0, 8.0, 10.0), 12.0, sigma)),
+        ]
+
+    cycle = (x_units - 0.5) % 6.0
+    vcycle = (y_units - 1.0) % 4.0
+    w0 = math.exp(k_v * cyclic_dist(vcycle, 0.0, 4.0) ** 2)
+    w2 = math.exp(k_v * cyclic_dist(vcycle, 2.0, 4.0) ** 2)
+    b2, r2, g2 = _stripes(cycle, (1.0, 3.0, 5.0), 6.0, sigma)
+    return [
+        (w0 / brightness_ratio, _stripes(cycle, (0.0, 2.0, 4.0), 6.0, sigma)),
+        (w2 / brightness_ratio, [r2, g2, b2]),
+    ]
+
+
+def mask_point_sample(x_units: float, y_units: float, sigma: float, kind: str):
+    """Port of compute_mask_point_sample() from mask.slang (no debug bias)."""
+    terms = mask_factors(x_units, y_units, sigma, kind)
+    return [sum(weight * column[c] for weight, column in terms) for c in range(3)]
+
+
+def peak_mask_value(sigma: float, kind: str) -> float:
+    """Port of compute_peak_mask_value() from mask.slang."""
+    period_x, period_y = MASK_PERIODS[kind]
+    samples_x, samples_y = PEAK_SAMPLES[kind]
+    peak = 0.0
+    for j in range(samples_y):
+        y_units = (j + 0.5) * (period_y / samples_y)
+        for i in range(samples_x):
+            x_units = (i + 0.5) * (period_x / samples_x)
+            peak = max(peak, max(mask_point_sample(x_units, y_units, sigma, kind)))
+    return max(peak, 1.19209289551e-7)
+
+
+def bake_tile(sigma: float, kind: str, peak: float):
+    """Return the level-0 tile as rows of [r, g, b] texels.
+
+    Each texel averages TEXEL_SUPERSAMPLES^2 point samples. Since the mask
+    separates into row weights times column profiles, the average is the sum
+    of (mean row weight) * (mean column profile) over the terms, and the
+    supersampling is done once per row and once per column.
+    """
+    period_x, period_y = MASK_PERIODS[kind]
+    width, height = TILE_SIZES[kind]
+    sub_x = TEXEL_SUPERSAMPLES
+    sub_y = TEXEL_SUPERSAMPLES if kind != 'aperture' else 1
+    texel_w = period_x / width
+    texel_h = period_y / height
+
+    def mean_terms(samples):
+        """Average a texel's [(weight, column)] terms over its subsamples."""
+        count = len(samples)
+        return [
+            (sum(terms[t][0] for terms in samples) / count,
+             [sum(terms[t][1][c] for terms in samples) / count for c in range(3)])
+            for t in range(len(samples[0]))
+        ]
+
+    # x only drives the columns and y only the weights, so the other coordinate is arbitrary
+    columns = [
+        [column for _, column in mean_terms([
+            mask_factors((tx + (sx + 0.5) / sub_x) * texel_w, 0.0, sigma, kind) for sx in range(sub_x)
+        ])]
+        for tx in range(width)
+    ]
+    weights = [
+        [weight for weight, _ in mean_terms([
+            mask_factors(0.0, (ty + (sy + 0.5) / sub_y) * texel_h, sigma, kind) for sy in range(sub_y)
+        ])]
+        for ty in range(height)
+    ]
+
+    rows = []
+    for row_weights in weights:
+        row = []
+        for texel_columns in columns:
+            row.append([
+                min(sum(w * column[c] for w, column in zip(row_weights, texel_columns)) / peak, 1.0)
+                for c in range(3)
+            ])
+        rows.append(row)
+    return rows
+
+
+def downsample(rows):
+    """2x2 box filter (one mip level); collapses a dimension once it reaches 1."""
+    height = len(rows)
+    width = len(rows[0])
+    step_y = 2 if height > 1 else 1
+    step_x = 2 if width > 1 else 1
+    out = []
+    for y in range(0, height, step_y):
+        row = []
+        for x in range(0, width, step_x):
+            texels = [rows[y + dy][x + dx] for dy in range(step_y) for dx in range(step_x)]
+            row.append([sum(t[c] for t in texels) / len(texels) for c in range(3)])
+        out.append(row)
+    return out
+
+
+def mip_chain(rows):
+    levels = [rows]
+    while len(levels[-1]) > 1 or len(levels[-1][0]) > 1:
+        levels.append(downsample(levels[-1]))
+    return levels
+
+
+def peak_gain_for_height(levels, kind: str, tvl: float, output_height: float) -> float:
+    """Peak Yr+Yg+Yb / 3 at the mip level the GPU picks for this output size."""
+    width, _ = TILE_SIZES[kind]
+    period_x, _ = MASK_PERIODS[kind]
+    output_width = output_height * 16.0 / 9.0
+    pixels_per_period = output_width / (max(tvl, 1.0) * 6.0) * period_x
+    texels_per_pixel = width / max(pixels_per_period, 1e-7)
+    level = int(round(math.log2(texels_per_pixel))) if texels_per_pixel > 1.0 else 0
+    level = min(max(level, 0), len(levels) - 1)
+    return max(sum(texel) for row in levels[level] for texel in row) / 3.0
+
+
+class MaskBaker:
+    """Bakes each (type, TVL, height) tile once; safe to share between threads."""
+
+    def __init__(self, share_dir: Path, verbose=False):
+        self.mask_dir = share_dir / 'mask'
+        self.verbose = verbose
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def tile_path(self, kind: str, tvl: float, output_height: int) -> Path:
+        return self.mask_dir / f'{kind}-tvl{tvl:g}-h{output_height}.png'
+
+    def bake(self, kind: str, tvl: float, output_height: int) -> Path:
+        key = (kind, tvl, output_height)
+        with self._lock:
+            event = self._pending.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[key] = event
+        path = self.tile_path(kind, tvl, output_height)
+        if not owner:
+            event.wait()
+            return path
+
+        try:
+            sigma = derive_mask_sigma(tvl, output_height, kind)
+            peak = peak_mask_value(sigma, kind)
+            levels = mip_chain(bake_tile(sigma, kind, peak))
+            peak_gain = peak_gain_for_height(levels, kind, tvl, output_height)
+            average = levels[-1][0][0]
+            width, height = TILE_SIZES[kind]
+            rows = [[v for texel in row for v in (*texel, peak_gain)] for row in levels[0]]
+            write_png(path, width, height, rows, channels=4)
+            if self.verbose:
+                print(f"  Baked {path.name}: sigma={sigma:.4f} peak={peak:.5f} peak_gain={peak_gain:.4f}")
+            with self._lock:
+                self.manifest[path.name] = {
+                    'mask_type': kind,
+                    'tvl': tvl,
+                    'output_height': output_height,
+                    'sigma': round(sigma, 6),
+                    'peak_mask_value': round(peak, 6),
+                    'average_mask_color': [round(c, 6) for c in average],
+                    'peak_mask_gain': round(peak_gain, 6),
+                    'size': [width, height],
+                }
+        finally:
+            event.set()
+        return path
+
+    def write_manifest(self):
+        if not self.manifest:
+            return
+        manifest_path = self.mask_dir / 'masks.json'
+        existing = {}
+        if manifest_path.exists():
+            existing = json.loads(manifest_path.read_text(encoding='utf-8'))
+        existing.update(self.manifest)
+        manifest_path.write_text(json.dumps(existing, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+
+def transform_preset(preset_path: Path, baker: MaskBaker, output_height: int, verbose=False):
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+
+    mask_index = slangp.find_shader_index(values, 'mask.slang')
+    if mask_index is None:
+        return False
+
+    try:
+        tvl = float(values.get('TVL', DEFAULT_TVL))
+        mask_type = float(values.get('MASK_TYPE', DEFAULT_MASK_TYPE))
+    except ValueError:
+        print(f"Warning: unreadable TVL/MASK_TYPE in {preset_path}; keeping analytic mask")
+        return False
+
+    kind = mask_type_name(mask_type)
+    tile = baker.bake(kind, tvl, output_height)
+
+    shader_key = f'shader{mask_index}'
+    shader_path = values[shader_key]
+    slangp.replace_value(lines, shader_key, shader_path[: -len('mask.slang')] + 'mask-baked.slang', quote=False)
+
+    textures = slangp.texture_names(values)
+    if LUT_NAME not in textures:
+        textures.append(LUT_NAME)
+    slangp.set_value(lines, 'textures', ';'.join(textures))
+    slangp.set_value(lines, LUT_NAME, slangp.relative_preset_path(preset_path, tile))
+    slangp.set_value(lines, f'{LUT_NAME}_linear', 'true')
+    slangp.set_value(lines, f'{LUT_NAME}_mipmap', 'true')
+    slangp.set_value(lines, f'{LUT_NAME}_wrap_mode', 'repeat')
+
+    preset_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+    if verbose:
+        print(f"Baked mask: {preset_path} -> {tile.name}")
+    return True
+
+
+def parse_target(value: str):
+    presets_dir, sep, height = value.rpartition('=')
+    if not sep or not presets_dir:
+        raise argparse.ArgumentTypeError(f"expected DIR=HEIGHT, got {value!r}")
+    return Path(presets_dir), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bake CRT mask textures and switch presets to mask-baked.slang')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing share/ and presets/')
+    parser.add_argument(
+        '--target',
+        type=parse_target,
+        action='append',
+        default=[],
+        help='Preset folder and output height to bake for, as DIR=HEIGHT (repeatable)',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    baker = MaskBaker(args.root_dir / 'share', verbose=args.verbose)
+
+    for presets_dir, output_height in args.target:
+        if not presets_dir.exists():
+            print(f"Warning: Input directory not found: {presets_dir}")
+            continue
+        presets = sorted(presets_dir.rglob('*.slangp'))
+        print(f"Baking masks for {presets_dir.name} at {output_height}p ({len(presets)} preset(s))")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(transform_preset, preset, baker, output_height, args.verbose)
+                for preset in presets
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+
+    baker.write_manifest()
+    print(f"Mask baking complete: {len(baker.manifest)} tile(s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Bakes CRT curvature warp maps for shaders/curve-baked.slang and switches presets to them.
+Rules:
+- For each preset using `curve.slang`, read ASPECT, SCREEN_ANGLE_H and
+  SCREEN_ANGLE_V (preset values over the shader's declared defaults).
+- Evaluate curve.slang's barrel remap (output coordinate -> source texture
+  coordinate, before zoom) on a grid of 1/WARP_DECIMATION of the target output
+  resolution (16:9 viewport assumed). The remap is smooth, so bilinear
+  filtering of the decimated grid stays well under a pixel at the target size.
+- Grid points sit on texel centers and span the full output (corner-aligned),
+  so the shader samples exact values at the viewport edges.
+- Store x/y as 16-bit values over [WARP_MIN, WARP_MIN + WARP_RANGE], split into
+  high bytes (RG) and low bytes (BA) because RetroArch loads PNGs at 8 bits per
+  channel. Maps go to `share/warp/` with a `warps.json` manifest.
+- ZOOM and SCREEN_FOCUS stay live in the shader; the map covers every zoom in
+  the ZOOM parameter range.
+- Rewrite the preset in place: `curve.slang` -> `curve-baked.slang` and add the
+  `WARP_LUT` texture with linear, non-mipmapped, clamped sampling.
+"""
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+import shader_source
+import slangp
+from png_writer import quantize, write_png
+
+
+LUT_NAME = 'WARP_LUT'
+WARP_DECIMATION = 4
+# Keep in sync with curve-baked.slang
+WARP_MIN = -0.5
+WARP_RANGE = 2.0
+WARP_PARAMETERS = ('ASPECT', 'SCREEN_ANGLE_H', 'SCREEN_ANGLE_V')
+ASPECT_RATIOS = (4.0 / 3.0, 16.0 / 9.0, 5.0 / 4.0, 16.0 / 10.0)
+EPS = 1.19209289551e-7
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def aspect_index(aspect: float) -> int:
+    """ASPECT parameter -> index into ASPECT_RATIOS, with curve.slang's thresholds."""
+    if aspect < 0.5:
+        return 0
+    if aspect < 1.5:
+        return 1
+    if aspect < 2.5:
+        return 2
+    return 3
+
+
+def barrel_theta(x: float, y: float, theta_h: float, theta_v: float):
+    """Port of curve.slang's barrel_theta."""
+    if theta_h < EPS and theta_v < EPS:
+        return x, y
+    safe_h = max(theta_h, 0.001)
+    safe_v = max(theta_v, 0.001)
+    tx = x * safe_h
+    ty = y * safe_v
+    return math.tan(tx) / math.cos(ty) / safe_h, math.tan(ty) / math.cos(tx) / safe_v
+
+
+def warp_coordinate(u: float, v: float, mask_ar: float, theta_h: float, theta_v: float):
+    """Output texture coordinate -> source texture coordinate (zoom excluded)."""
+    sx, sy = barrel_theta((u * 2.0 - 1.0) * mask_ar, v * 2.0 - 1.0, theta_h, theta_v)
+    return (sx / mask_ar) * 0.5 + 0.5, sy * 0.5 + 0.5
+
+
+def map_size(output_height: int):
+    height = max(2, output_height // WARP_DECIMATION)
+    width = max(2, round(output_height * 16.0 / 9.0) // WARP_DECIMATION)
+    return width, height
+
+
+def bake_map(params: dict, width: int, height: int):
+    mask_ar = ASPECT_RATIOS[aspect_index(params['ASPECT'])]
+    theta_h = math.radians(params['SCREEN_ANGLE_H'] / 2.0)
+    theta_v = math.radians(params['SCREEN_ANGLE_V'] / 2.0)
+    rows = []
+    clipped = 0
+    for j in range(height):
+        v = j / (height - 1)
+        row = []
+        for i in range(width):
+            tex = warp_coordinate(i / (width - 1), v, mask_ar, theta_h, theta_v)
+            normalized = [(t - WARP_MIN) / WARP_RANGE for t in tex]
+            clipped += sum(1 for n in normalized if n < 0.0 or n > 1.0)
+            x_code, y_code = (quantize(n, 16) for n in normalized)
+            row.extend((
+                (x_code >> 8) / 255.0,
+                (y_code >> 8) / 255.0,
+                (x_code & 0xFF) / 255.0,
+                (y_code & 0xFF) / 255.0,
+            ))
+        rows.append(row)
+    return rows, clipped
+
+
+def effective_parameters(values: dict, shader_file: Path) -> dict:
+    declared = shader_source.collect_parameters(shader_file)
+    params = {}
+    for name in WARP_PARAMETERS:
+        raw = values.get(name)
+        params[name] = float(raw) if raw is not None else declared[name].default
+    return params
+
+
+class WarpBaker:
+    """Bakes each (geometry, height) warp map once; safe to share between threads."""
+
+    def __init__(self, share_dir: Path, verbose=False):
+        self.warp_dir = share_dir / 'warp'
+        self.verbose = verbose
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def map_path(self, params: dict, output_height: int) -> Path:
+        aspect = aspect_index(params['ASPECT'])
+        angle_h = params['SCREEN_ANGLE_H']
+        angle_v = params['SCREEN_ANGLE_V']
+        return self.warp_dir / f'aspect{aspect}-h{angle_h:g}-v{angle_v:g}-{output_height}p.png'
+
+    def bake(self, params: dict, output_height: int) -> Path:
+        path = self.map_path(params, output_height)
+        with self._lock:
+            event = self._pending.get(path)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[path] = event
+        if not owner:
+            event.wait()
+            return path
+
+        try:
+            width, height = map_size(output_height)
+            rows, clipped = bake_map(params, width, height)
+            write_png(path, width, height, rows, channels=4)
+            if self.verbose:
+                print(f"  Baked {path.name}: {width}x{height}, {clipped} clipped sample(s)")
+            with self._lock:
+                self.manifest[path.name] = {
+                    'parameters': params,
+                    'output_height': output_height,
+                    'size': [width, height],
+                    'clipped_samples': clipped,
+                }
+        finally:
+            event.set()
+        return path
+
+    def write_manifest(self):
+        if not self.manifest:
+            return
+        manifest_path = self.warp_dir / 'warps.json'
+        existing = {}
+        if manifest_path.exists():
+            existing = json.loads(manifest_path.read_text(encoding='utf-8'))
+        existing.update(self.manifest)
+        manifest_path.write_text(json.dumps(existing, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+
+def transform_preset(preset_path: Path, baker: WarpBaker, output_height: int, verbose=False):
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+
+    curve_index = slangp.find_shader_index(values, 'curve.slang')
+    if curve_index is None:
+        return False
+
+    shader_key = f'shader{curve_index}'
+    shader_path = values[shader_key]
+    shader_file = (preset_path.parent / shader_path).resolve()
+    if not shader_file.is_file():
+        print(f"Warning: {shader_path} not found for {preset_path}; keeping analytic curvature")
+        return False
+    try:
+        params = effective_parameters(values, shader_file)
+    except (KeyError, ValueError):
+        print(f"Warning: unreadable geometry parameters in {preset_path}; keeping analytic curvature")
+        return False
+
+    warp = baker.bake(params, output_height)
+
+    slangp.replace_value(lines, shader_key, shader_path[: -len('curve.slang')] + 'curve-baked.slang', quote=False)
+    textures = slangp.texture_names(values)
+    if LUT_NAME not in textures:
+        textures.append(LUT_NAME)
+    slangp.set_value(lines, 'textures', ';'.join(textures))
+    slangp.set_value(lines, LUT_NAME, slangp.relative_preset_path(preset_path, warp))
+    slangp.set_value(lines, f'{LUT_NAME}_linear', 'true')
+    slangp.set_value(lines, f'{LUT_NAME}_mipmap', 'false')
+    slangp.set_value(lines, f'{LUT_NAME}_wrap_mode', 'clamp_to_edge')
+
+    preset_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+    if verbose:
+        print(f"Baked warp map: {preset_path} -> {warp.name}")
+    return True
+
+
+def parse_target(value: str):
+    presets_dir, sep, height = value.rpartition('=')
+    if not sep or not presets_dir:
+        raise argparse.ArgumentTypeError(f"expected DIR=HEIGHT, got {value!r}")
+    return Path(presets_dir), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bake curvature warp maps and switch presets to curve-baked.slang')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing share/ and presets/')
+    parser.add_argument(
+        '--target',
+        type=parse_target,
+        action='append',
+        default=[],
+        help='Preset folder and output height to bake for, as DIR=HEIGHT (repeatable)',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    baker = WarpBaker(args.root_dir / 'share', verbose=args.verbose)
+
+    for presets_dir, output_height in args.target:
+        if not presets_dir.exists():
+            print(f"Warning: Input directory not found: {presets_dir}")
+            continue
+        presets = sorted(presets_dir.rglob('*.slangp'))
+        print(f"Baking warp maps for {presets_dir.name} at {output_height}p ({len(presets)} preset(s))")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(transform_preset, preset, baker, output_height, args.verbose)
+                for preset in presets
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+
+    baker.write_manifest()
+    print(f"Warp map baking complete: {len(baker.manifest)} map(s).")
+
+
+if __name__ == '__main__':
+    main()
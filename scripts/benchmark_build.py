@@ -0,0 +1,279 @@
+"""
+Benchmarks build.py and build-trim.py on synthetic preset catalogues scaled up from presetdata/.
+Rules:
+- For each `--scale N` the build tools (TREE_FILES, TREE_DIRS) are copied to
+  `<work-dir>/scale-N` with presetdata/ replicated N times. Every pipeline and
+  parameter set gets N-1 copies beside it (`<name>-xNNN.json`, so relative
+  roots still resolve). Every input gets N-1 copies that use those copies and
+  suffix each `_`-separated preset name in `filename` the same way. Scale 1 is
+  the real catalogue.
+- Each tree is built with `build.py --trace` plus `--build-args`, then trimmed
+  with build-trim.py. Stage wall times come from the trace's `stage` spans.
+  Peak RSS and bytes read/written come from the `process_usage` of the
+  processes that ran the stage: each tool for its own step, and for the
+  `build` stage build.py itself (menus and derived folders run in it) plus the
+  presetgen processes it starts, which build.py runs through build_trace.py
+  while tracing so they leave fragments too. Bytes are summed over the
+  processes; peak RSS is the largest peak of any one of them, since presetgen
+  runs in parallel with the build.py process. build-trim.py is measured here: peak RSS from wait4 where the
+  platform has it, bytes as the size of out/ read and out-trim/ written.
+- With two or more scales, each stage prints its growth exponent k between the
+  smallest and largest scale (time ~ scale^k). Stages above SUPERLINEAR grow
+  faster than the catalogue; stages under MIN_SECONDS at the largest scale
+  are too short to judge, and are not compared with the baseline either.
+- Results are compared with `--baseline` (default
+  .cache/benchmark/baseline.json, per machine): stages at a scale also in the
+  baseline that got slower or larger by more than `--tolerance` are listed,
+  and `--fail-on-regression` exits non-zero when there are any.
+  `--save-baseline` stores this run as the baseline.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path, PurePosixPath
+
+import build_trace
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# What a build needs besides presetdata/, which is synthesized
+TREE_FILES = ('build.py', 'build-trim.py', 'trim-rules.txt', 'README.md', 'COPYING', 'NEWS')
+TREE_DIRS = ('scripts', 'shaders', 'share', 'config', 'doc', 'external')
+REPLICATED_DIRS = ('pipelines', 'params')
+SUPERLINEAR = 1.3
+MIN_SECONDS = 0.5
+COMPARED_FIELDS = ('wall_s', 'peak_rss_kb', 'bytes_read', 'bytes_written')
+# Processes whose usage counts toward the `build` stage
+BUILD_PROCESSES = ('build', 'presetgen')
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def copy_suffix(copy: int) -> str:
+    return f'-x{copy:03d}'
+
+
+def suffixed(name: str, suffix: str) -> str:
+    path = PurePosixPath(name)
+    return str(path.with_name(f'{path.stem}{suffix}{path.suffix}'))
+
+
+def synthesize(tree: Path, scale: int):
+    """Copy the build tools to `tree` with presetdata/ replicated `scale` times; returns the input count."""
+    if tree.exists():
+        shutil.rmtree(tree)
+    ignore = shutil.ignore_patterns('__pycache__', '*.pyc')
+    for name in TREE_DIRS:
+        if (ROOT / name).is_dir():
+            shutil.copytree(ROOT / name, tree / name, ignore=ignore)
+    for name in TREE_FILES:
+        if (ROOT / name).is_file():
+            shutil.copy2(ROOT / name, tree / name)
+    source = ROOT / 'presetdata'
+    shutil.copytree(source, tree / 'presetdata', ignore=ignore)
+
+    inputs = sorted((source / 'input').rglob('*.json'))
+    for copy in range(1, scale):
+        suffix = copy_suffix(copy)
+        for folder in REPLICATED_DIRS:
+            for path in sorted((source / folder).rglob('*.json')):
+                relative = path.relative_to(source)
+                shutil.copy2(path, tree / 'presetdata' / suffixed(relative.as_posix(), suffix))
+        for path in inputs:
+            spec = json.loads(path.read_text(encoding='utf-8'))
+            # presetgen writes one preset per `_`-separated name
+            spec['filename'] = '_'.join(f'{name}{suffix}' for name in spec['filename'].split('_'))
+            spec['pipelines'] = [suffixed(name, suffix) for name in spec.get('pipelines', [])]
+            spec['parameter_sets'] = [suffixed(name, suffix) for name in spec.get('parameter_sets', [])]
+            target = tree / 'presetdata' / suffixed(path.relative_to(source).as_posix(), suffix)
+            target.write_text(json.dumps(spec, indent=4) + '\n', encoding='utf-8', newline='\n')
+    return len(inputs) * scale
+
+
+def run_measured(cmd, cwd: Path, log: Path):
+    """Run `cmd` with output appended to `log`; returns (exit code, wall seconds, peak RSS KB or None)."""
+    with log.open('ab') as out:
+        out.write(f"$ {' '.join(str(part) for part in cmd)}\n".encode('utf-8'))
+        out.flush()
+        start = time.perf_counter()
+        process = subprocess.Popen(cmd, cwd=cwd, stdout=out, stderr=subprocess.STDOUT)
+        if not hasattr(os, 'wait4'):
+            return process.wait(), time.perf_counter() - start, None
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        # Tell Popen the child is reaped so it does not wait again
+        process.returncode = os.waitstatus_to_exitcode(status)
+    peak = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    return process.returncode, elapsed, peak
+
+
+def stage_metrics(events):
+    """Return {stage: metrics} from a merged build trace."""
+    names = {}
+    usages = {}
+    for event in events:
+        if event.get('ph') != 'M':
+            continue
+        if event['name'] == 'process_name':
+            names[event['pid']] = event['args']['name']
+        elif event['name'] == 'process_usage':
+            usages[event['pid']] = event['args']
+
+    # Tools run under their script stem; build.py and the presetgen runs it starts make up the `build` stage
+    usage_by_stage = {}
+    for pid, usage in usages.items():
+        stage = 'build' if names.get(pid) in BUILD_PROCESSES else f'{names.get(pid)}.py'
+        entry = usage_by_stage.setdefault(stage, {})
+        for field, value in usage.items():
+            entry[field] = max(entry.get(field, 0), value) if field == 'peak_rss_kb' else entry.get(field, 0) + value
+
+    stages = {}
+    for event in events:
+        if event.get('ph') == 'X' and event['cat'] == 'stage':
+            entry = stages.setdefault(event['name'], {'wall_s': 0.0})
+            entry['wall_s'] = round(entry['wall_s'] + event['dur'] / 1e6, 3)
+    for name, entry in stages.items():
+        entry.update(usage_by_stage.get(name, {}))
+    return stages
+
+
+def benchmark_scale(scale: int, work_dir: Path, build_args, jobs: int, keep: bool):
+    tree = work_dir / f'scale-{scale}'
+    print(f"Synthesizing scale {scale} in {tree}")
+    inputs = synthesize(tree, scale)
+    log = work_dir / f'scale-{scale}.log'
+    log.unlink(missing_ok=True)
+    python = sys.executable
+
+    trace = tree / 'out' / 'build-trace.json'
+    code, _, _ = run_measured([python, 'build.py', '--jobs', str(jobs), '--trace', str(trace), *build_args], tree, log)
+    if code != 0:
+        print(f"Error: build.py failed at scale {scale} (exit {code}); see {log}")
+        raise SystemExit(1)
+    stages = stage_metrics(json.loads(trace.read_text(encoding='utf-8'))['traceEvents'])
+    presets = sum(1 for _ in (tree / 'out' / 'presets').rglob('*.slangp'))
+
+    code, elapsed, peak = run_measured([python, 'build-trim.py'], tree, log)
+    if code != 0:
+        print(f"Error: build-trim.py failed at scale {scale} (exit {code}); see {log}")
+        raise SystemExit(1)
+    trim = {'wall_s': round(elapsed, 3)}
+    if peak is not None:
+        trim['peak_rss_kb'] = peak
+    trim['bytes_read'] = build_trace.measure([tree / 'out'])[0]
+    trim['bytes_written'] = build_trace.measure([tree / 'out-trim'])[0]
+    stages['build-trim.py'] = trim
+
+    if not keep:
+        shutil.rmtree(tree)
+    return {'inputs': inputs, 'presets': presets, 'stages': stages}
+
+
+def growth(results: dict):
+    """Return [(stage, k)] for stages in both the smallest and largest scale."""
+    scales = sorted(results, key=int)
+    if len(scales) < 2:
+        return []
+    small, large = results[scales[0]], results[scales[-1]]
+    ratio = math.log(large['inputs'] / small['inputs'])
+    exponents = []
+    for name, entry in large['stages'].items():
+        base = small['stages'].get(name)
+        if base is None or base['wall_s'] <= 0 or entry['wall_s'] < MIN_SECONDS:
+            continue
+        exponents.append((name, math.log(entry['wall_s'] / base['wall_s']) / ratio))
+    return sorted(exponents, key=lambda item: -item[1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Return (scale, stage, field, old, new) for every compared metric that grew past `tolerance`."""
+    regressed = []
+    for scale, entry in results.items():
+        old_entry = baseline.get(scale)
+        if not old_entry:
+            continue
+        for name, metrics in entry['stages'].items():
+            old = old_entry['stages'].get(name, {})
+            for field in COMPARED_FIELDS:
+                if field not in metrics or field not in old:
+                    continue
+                # Ignore noise on stages too short to time
+                if field == 'wall_s' and metrics[field] < MIN_SECONDS:
+                    continue
+                if metrics[field] > old[field] * (1.0 + tolerance):
+                    regressed.append((scale, name, field, old[field], metrics[field]))
+    return regressed
+
+
+def print_scale(scale: str, entry: dict):
+    print(f"Scale {scale}: {entry['inputs']} input(s), {entry['presets']} preset(s)")
+    print(f"  {'wall s':>9}  {'peak MB':>8}  {'read MB':>9}  {'written MB':>10}  stage")
+    for name, metrics in sorted(entry['stages'].items(), key=lambda item: -item[1]['wall_s']):
+        peak = f"{metrics['peak_rss_kb'] / 1024:8.0f}" if 'peak_rss_kb' in metrics else f"{'-':>8}"
+        read = f"{metrics['bytes_read'] / 2**20:9.1f}" if 'bytes_read' in metrics else f"{'-':>9}"
+        written = f"{metrics['bytes_written'] / 2**20:10.1f}" if 'bytes_written' in metrics else f"{'-':>10}"
+        print(f"  {metrics['wall_s']:9.2f}  {peak}  {read}  {written}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the build on synthetic catalogues scaled up from presetdata/')
+    parser.add_argument('--scale', type=int, action='append', default=[], help='Copies of presetdata/ to build (repeatable, default: 1 and 10)')
+    parser.add_argument('--build-args', default='', help='Extra build.py flags, e.g. --build-args="--tiers --layer-presets"')
+    parser.add_argument('--work-dir', type=Path, default=ROOT / '.cache' / 'benchmark', help='Folder for the synthetic trees and logs')
+    parser.add_argument('--keep', action='store_true', help='Keep the synthetic trees after measuring them')
+    parser.add_argument('--report', type=Path, help='Report path (default: <work-dir>/report.json)')
+    parser.add_argument('--baseline', type=Path, help='Earlier report to compare with (default: <work-dir>/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Growth over the baseline to report (default: 0.25 = 25%%)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    scales = sorted(set(args.scale or [1, 10]))
+    if scales[0] < 1:
+        parser.error('--scale must be at least 1')
+    build_args = args.build_args.split()
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    for scale in scales:
+        results[str(scale)] = benchmark_scale(scale, args.work_dir, build_args, max(1, args.jobs), args.keep)
+        print_scale(str(scale), results[str(scale)])
+
+    for name, exponent in growth(results):
+        marker = '  <- superlinear' if exponent > SUPERLINEAR else ''
+        print(f"Growth: {name} time ~ scale^{exponent:.2f}{marker}")
+
+    report = {'build_args': build_args, 'scales': results}
+    report_path = args.report or args.work_dir / 'report.json'
+    report_path.write_text(json.dumps(report, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+    regressed = []
+    baseline_path = args.baseline or args.work_dir / 'baseline.json'
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+        if baseline.get('build_args') != build_args:
+            print(f"Warning: {baseline_path} was run with build args {baseline.get('build_args')}; not comparing")
+        else:
+            regressed = compare(results, baseline['scales'], args.tolerance)
+            for scale, name, field, old, new in regressed:
+                print(f"Regressed: scale {scale} {name} {field} {old} -> {new}")
+    if args.save_baseline:
+        shutil.copy2(report_path, baseline_path)
+        print(f"Saved baseline: {baseline_path}")
+
+    print(f"Benchmark complete: {len(scales)} scale(s), {len(regressed)} regression(s). Report: {report_path}")
+    if regressed and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
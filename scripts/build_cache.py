@@ -0,0 +1,168 @@
+"""
+Content-addressed build cache kept in a plain directory.
+
+An entry maps a key to the files one build step wrote. The key is a hash of
+everything the step reads, plus the tools that run it. File contents are
+stored once per sha256 under `objects/`. Entries are small JSON files under
+`entries/` that map relative paths to object hashes, so identical outputs
+from different steps share storage. Reading an entry refreshes its mtime.
+`evict` drops the least recently used entries until the objects they
+reference fit in the size bound, then deletes unreferenced objects. Every
+write goes through a temporary name and a rename, so concurrent builds can
+share one store. `put` holds a shared lock on `lock` and `evict` an
+exclusive one: otherwise an evict could delete an object that a put found
+already stored, before the put's entry referencing it is written. Nothing
+is fetched over the network: to share the cache, copy the directory (CI
+restores and saves it with actions/cache).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Bump when the entry layout or what a key covers changes
+CACHE_VERSION = 2
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def make_key(*parts) -> str:
+    """Hash `parts` (str or bytes) into a cache key."""
+    digest = hashlib.sha1(f'v{CACHE_VERSION}'.encode('utf-8'))
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f'{path.name}.{os.getpid()}-{threading.get_ident()}.tmp')
+    partial.write_bytes(data)
+    os.replace(partial, path)
+
+
+@contextlib.contextmanager
+def _locked(path: Path, exclusive: bool):
+    """Hold a lock on `path` shared between processes; Windows only has exclusive locks."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            handle.seek(0)
+            while True:
+                try:
+                    # LK_LOCK gives up after 10 seconds
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class BuildCache:
+    """Directory-backed store of {relative path: bytes} per key; safe to share between threads and processes."""
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / 'entries' / key[:2] / f'{key}.json'
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / 'objects' / digest[:2] / digest
+
+    def _locked(self, exclusive=False):
+        return _locked(self.root / 'lock', exclusive)
+
+    def get(self, key: str):
+        """Return the files stored under `key`, or None (missing, or an object was evicted)."""
+        entry = self._entry_path(key)
+        try:
+            files = json.loads(entry.read_text(encoding='utf-8'))
+            outputs = {relative: self._object_path(digest).read_bytes() for relative, digest in files.items()}
+            os.utime(entry)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return outputs
+
+    def put(self, key: str, outputs: dict):
+        with self._locked():
+            files = {}
+            for relative, data in sorted(outputs.items()):
+                digest = hashlib.sha256(data).hexdigest()
+                path = self._object_path(digest)
+                if not path.exists():
+                    _write_atomic(path, data)
+                files[str(relative)] = digest
+            _write_atomic(self._entry_path(key), (json.dumps(files, sort_keys=True) + '\n').encode('utf-8'))
+
+    def evict(self):
+        """Keep the most recently used entries whose objects fit in max_bytes; returns (entries, bytes) removed."""
+        with self._locked(exclusive=True):
+            return self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in (self.root / 'entries').glob('*/*.json'):
+            try:
+                entries.append((path.stat().st_mtime_ns, path, json.loads(path.read_text(encoding='utf-8'))))
+            except (OSError, ValueError):
+                continue
+        entries.sort(key=lambda item: item[0], reverse=True)
+
+        sizes = {}
+        for path in (self.root / 'objects').glob('*/*'):
+            if not path.name.endswith('.tmp'):
+                sizes[path.name] = path.stat().st_size
+
+        kept = set()
+        total = 0
+        removed_entries = 0
+        for _, path, files in entries:
+            new = set(files.values()) - kept
+            size = sum(sizes.get(digest, 0) for digest in new)
+            if total + size > self.max_bytes:
+                path.unlink(missing_ok=True)
+                removed_entries += 1
+                continue
+            kept |= new
+            total += size
+
+        removed_bytes = 0
+        for digest, size in sizes.items():
+            if digest not in kept:
+                self._object_path(digest).unlink(missing_ok=True)
+                removed_bytes += size
+        return removed_entries, removed_bytes
+
+    def size(self) -> int:
+        return sum(path.stat().st_size for path in (self.root / 'objects').glob('*/*'))
@@ -0,0 +1,277 @@
+"""
+Long-lived build server with warm state, and the thin client that talks to it.
+Rules:
+- `serve` listens on a Unix socket (default `.cache/build.sock`). It imports
+  build.py, scripts/lint_shaders.py and build-trim.py once, and keeps between
+  requests:
+  - presetgen output per input (preset_sources.PresetgenMemo), keyed by the
+    hash of the input, its pipelines and parameter sets, the pipeline shaders
+    with their includes, and presetgen itself;
+  - file hashes, recomputed only when mtime or size change;
+  - parsed shader declarations (shader_source caches).
+- Before each request the files under shaders/ are compared with the previous
+  request by mtime and size, and the shader caches are dropped if any changed.
+  If build.py or scripts/*.py changed, the server restarts itself so requests
+  never run stale tool code; the client resends its request.
+- `build ARGS`, `lint ARGS` and `trim ARGS` behave like `python build.py ARGS`,
+  `python scripts/lint_shaders.py ARGS` and `python build-trim.py ARGS`. Output
+  streams to the client, which exits with the command's status. Requests run
+  one at a time because they share out/.
+- `status` reports the warm state and `stop` shuts the server down.
+- Messages are JSON lines: the client sends {"command", "args"}; the server
+  answers with {"output"} lines and ends with {"status"} or {"restart"}.
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+import preset_sources
+import shader_source
+from file_watch import snapshot
+
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SOCKET = ROOT / '.cache' / 'build.sock'
+SHADERS_DIR = ROOT / 'shaders'
+COMMANDS = ('build', 'lint', 'trim', 'status', 'stop')
+RESTART_TIMEOUT = 30.0
+
+
+def load_module(name: str, path: Path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class StreamWriter(io.TextIOBase):
+    """Text stream that forwards writes to the client as JSON lines; output is dropped once the client goes away."""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def send(self, message: dict):
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self._wfile.write((json.dumps(message) + '\n').encode('utf-8'))
+                self._wfile.flush()
+            except OSError:
+                self._closed = True
+
+    def write(self, text):
+        if text:
+            self.send({'output': text})
+        return len(text)
+
+    def writable(self):
+        return True
+
+
+class BuildState:
+    """Everything the server keeps warm between requests."""
+
+    def __init__(self):
+        sys.path.insert(0, str(ROOT))
+        import build
+        import lint_shaders
+
+        self.build = build
+        self.lint_shaders = lint_shaders
+        self.build_trim = load_module('build_trim', ROOT / 'build-trim.py')
+        self.memo = preset_sources.PresetgenMemo()
+        self.tools = snapshot([ROOT / 'build.py', ROOT / 'build-trim.py', ROOT / 'scripts'])
+        self.shaders = snapshot([SHADERS_DIR])
+        self.started = time.time()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def tools_changed(self) -> bool:
+        return snapshot([ROOT / 'build.py', ROOT / 'build-trim.py', ROOT / 'scripts']) != self.tools
+
+    def refresh(self):
+        shaders = snapshot([SHADERS_DIR])
+        if shaders != self.shaders:
+            shader_source.clear_caches()
+            self.shaders = shaders
+            print("Shaders changed; dropped parsed shader caches")
+        self.memo.refresh()
+
+    def run(self, command: str, args):
+        """Run one request with stdout/stderr already redirected; returns the exit status."""
+        self.requests += 1
+        self.refresh()
+        start = time.perf_counter()
+        argv = sys.argv
+        try:
+            if command == 'build':
+                sys.argv = ['build.py', *args]
+                self.build.main(args, presetgen_memo=self.memo)
+                status = 0
+            elif command == 'lint':
+                sys.argv = ['lint_shaders.py', *args]
+                status = self.lint_shaders.main()
+            else:
+                sys.argv = ['build-trim.py', *args]
+                self.build_trim.main()
+                status = 0
+        except SystemExit as exc:
+            status = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+        except Exception as exc:
+            print(f"Error: {command} failed: {exc!r}")
+            status = 1
+        finally:
+            sys.argv = argv
+        elapsed = time.perf_counter() - start
+        if command == 'build':
+            print(f"Server: {command} took {elapsed:.2f}s ({self.memo.hits} presetgen input(s) reused)")
+        else:
+            print(f"Server: {command} took {elapsed:.2f}s")
+        return status
+
+    def status(self):
+        return (
+            f"Build server pid {os.getpid()}, up {time.time() - self.started:.0f}s, {self.requests} request(s); "
+            f"{len(self.memo)} presetgen output(s), {len(self.shaders)} shader file(s) tracked"
+        )
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        writer = StreamWriter(self.wfile)
+        state = self.server.state
+        command = request.get('command')
+
+        if command == 'status':
+            writer.send({'output': state.status() + '\n'})
+            writer.send({'status': 0})
+            return
+        if command == 'stop':
+            writer.send({'output': 'Build server stopping\n'})
+            writer.send({'status': 0})
+            threading.Thread(target=self.server.shutdown).start()
+            return
+        if command not in COMMANDS:
+            writer.send({'output': f'Unknown command: {command}\n'})
+            writer.send({'status': 2})
+            return
+
+        with state.lock:
+            if state.tools_changed():
+                # Unlink first so the client's retry waits for the restarted server
+                Path(self.server.server_address).unlink(missing_ok=True)
+                writer.send({'restart': True})
+                self.server.restart = True
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+                status = state.run(command, request.get('args', []))
+        writer.send({'status': status})
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: Path):
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        if connect(socket_path) is not None:
+            print(f"Error: a build server is already listening on {socket_path}")
+            raise SystemExit(1)
+        socket_path.unlink()
+
+    state = BuildState()
+    server = Server(str(socket_path), Handler)
+    server.state = state
+    server.restart = False
+    print(f"Build server listening on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+    if server.restart:
+        print("Build tools changed; restarting")
+        os.execv(sys.executable, [sys.executable, *sys.argv])
+
+
+def connect(socket_path: Path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(socket_path: Path, command: str, args) -> int:
+    """Send one request and relay its output; returns the exit status."""
+    deadline = None
+    while True:
+        sock = connect(socket_path)
+        if sock is None:
+            if deadline is not None and time.monotonic() < deadline:
+                time.sleep(0.1)
+                continue
+            print(f"Error: no build server on {socket_path}; start one with: python scripts/build_server.py serve")
+            return 1
+        try:
+            with sock, sock.makefile('rwb') as stream:
+                stream.write((json.dumps({'command': command, 'args': args}) + '\n').encode('utf-8'))
+                stream.flush()
+                for line in stream:
+                    message = json.loads(line)
+                    if 'output' in message:
+                        sys.stdout.write(message['output'])
+                        sys.stdout.flush()
+                    elif 'status' in message:
+                        return message['status']
+                    elif message.get('restart'):
+                        break
+                else:
+                    print("Error: build server closed the connection")
+                    return 1
+        except OSError as exc:
+            print(f"Error: lost the build server connection: {exc}")
+            return 1
+        # The server is restarting with new tool code; resend once it is back
+        deadline = time.monotonic() + RESTART_TIMEOUT
+        time.sleep(0.2)
+
+
+def main():
+    if not hasattr(socket, 'AF_UNIX'):
+        print("Error: the build server needs Unix domain sockets")
+        raise SystemExit(2)
+    parser = argparse.ArgumentParser(description='Warm build server and its client')
+    parser.add_argument('--socket', type=Path, default=DEFAULT_SOCKET, help='Server socket path')
+    parser.add_argument('command', choices=('serve',) + COMMANDS)
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Arguments for build.py, lint_shaders.py or build-trim.py')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.socket)
+        return
+    raise SystemExit(request(args.socket, args.command, args.args))
+
+
+if __name__ == '__main__':
+    main()
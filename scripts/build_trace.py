@@ -0,0 +1,231 @@
+"""
+Build tracing in Chrome trace-event format (load in chrome://tracing or Perfetto).
+
+Tracing is off unless build.py enables it (`--trace`) or the tools inherit
+TRACE_DIR_ENV from it; `span` is then a cheap no-op. Each span records
+start/end, the worker thread, and the byte and file counts of the paths it
+names as read and written (directories are summed), measured when the span
+ends. Tools started by build.py write their spans to a fragment per process
+in TRACE_DIR_ENV at exit, and build.py merges the fragments into one trace.
+Every process also records its peak RSS and the bytes it read and wrote, as
+a `process_usage` metadata event, where the platform reports them. Scripts
+that do not import this module (presetgen) are started through it instead,
+`python build_trace.py <script> [args]`, so they leave a fragment too.
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+TRACE_DIR_ENV = 'SCANLINE_TRACE_DIR'
+
+# Wall-clock microseconds, so spans from different processes line up
+_WALL_START = time.time()
+_PERF_START = time.perf_counter()
+
+
+def now_us() -> float:
+    return (_WALL_START + time.perf_counter() - _PERF_START) * 1e6
+
+
+def measure(paths) -> tuple[int, int]:
+    """Return (bytes, files) for the files and directory trees in `paths` that exist."""
+    size = files = 0
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            size += path.stat().st_size
+            files += 1
+        elif path.is_dir():
+            for child in path.rglob('*'):
+                if child.is_file():
+                    size += child.stat().st_size
+                    files += 1
+    return size, files
+
+
+def process_usage() -> dict:
+    """Return this process's peak RSS (KB) and bytes read/written so far, where available."""
+    usage = {}
+    try:
+        # VmHWM starts over at exec; ru_maxrss keeps the parent's peak on Linux
+        with open('/proc/self/status', encoding='ascii') as status:
+            fields = dict(line.split(':', 1) for line in status if ':' in line)
+        usage['peak_rss_kb'] = int(fields['VmHWM'].split()[0])
+    except (OSError, KeyError, ValueError):
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+            usage['peak_rss_kb'] = peak // 1024 if sys.platform == 'darwin' else peak
+    try:
+        with open('/proc/self/io', encoding='ascii') as counters:
+            fields = dict(line.split(':', 1) for line in counters)
+        usage['bytes_read'] = int(fields['rchar'])
+        usage['bytes_written'] = int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    return usage
+
+
+class Tracer:
+    """Collects complete ('X') events for one process; safe to share between threads."""
+
+    def __init__(self, process_name: str):
+        self.pid = os.getpid()
+        self.process_name = process_name
+        self.events = []
+        self._lock = threading.Lock()
+        self._threads = {}
+
+    def _tid(self) -> int:
+        thread = threading.current_thread()
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads[thread.ident] = (len(self._threads), thread.name)
+            return self._threads[thread.ident][0]
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, reads=(), writes=()):
+        start = now_us()
+        try:
+            yield
+        finally:
+            end = now_us()
+            args = {}
+            if reads:
+                args['bytes_read'], args['files_read'] = measure(reads)
+            if writes:
+                args['bytes_written'], args['files_written'] = measure(writes)
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': round(start, 1),
+                'dur': round(end - start, 1),
+                'pid': self.pid,
+                'tid': self._tid(),
+                'args': args,
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def trace_events(self):
+        """Return the spans plus process name, process usage and thread name metadata."""
+        with self._lock:
+            events = list(self.events)
+            threads = list(self._threads.values())
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': self.process_name}})
+        events.append({'name': 'process_usage', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': process_usage()})
+        for tid, name in threads:
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}})
+        return events
+
+    def write_fragment(self, trace_dir: Path):
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        path = trace_dir / f'{self.process_name}-{self.pid}.json'
+        path.write_text(json.dumps(self.trace_events()) + '\n', encoding='utf-8', newline='\n')
+
+
+_tracer: Tracer | None = None
+
+
+def enable(process_name: str) -> Tracer:
+    global _tracer
+    _tracer = Tracer(process_name)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def _enable_from_env(name=None):
+    trace_dir = os.environ.get(TRACE_DIR_ENV)
+    if not trace_dir:
+        return
+    if name is None:
+        import __main__
+        name = Path(getattr(__main__, '__file__', None) or 'python').stem
+    tracer = enable(name)
+    atexit.register(tracer.write_fragment, Path(trace_dir))
+
+
+def run_script(script: Path, args):
+    """Run `script` as __main__ in this process, traced under its own name."""
+    script = script.resolve()
+    _enable_from_env(script.stem)
+    sys.argv = [str(script), *args]
+    sys.path[0] = str(script.parent)
+    runpy.run_path(str(script), run_name='__main__')
+
+
+def span(name: str, category: str, reads=(), writes=()):
+    """Trace the enclosed block when tracing is on."""
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.span(name, category, reads, writes)
+
+
+def merge(tracer: Tracer, trace_dir: Path):
+    """Return this process's events plus every fragment in `trace_dir`."""
+    events = tracer.trace_events()
+    for fragment in sorted(trace_dir.glob('*.json')):
+        events.extend(json.loads(fragment.read_text(encoding='utf-8')))
+    return events
+
+
+def write_trace(path: Path, events):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}) + '\n', encoding='utf-8', newline='\n')
+
+
+def summary(events, limit=10):
+    """Return a text table of the slowest stages, task categories and single tasks."""
+    spans = [event for event in events if event.get('ph') == 'X']
+    stages = [event for event in spans if event['cat'] == 'stage']
+    tasks = [event for event in spans if event['cat'] != 'stage']
+
+    lines = ['Slowest stages:']
+    for event in sorted(stages, key=lambda e: -e['dur'])[:limit]:
+        lines.append(f"  {event['dur'] / 1e6:9.2f}s  {event['name']}")
+
+    categories = {}
+    for event in tasks:
+        entry = categories.setdefault(event['cat'], {'count': 0, 'total': 0.0, 'max': 0.0, 'bytes': 0})
+        entry['count'] += 1
+        entry['total'] += event['dur']
+        entry['max'] = max(entry['max'], event['dur'])
+        entry['bytes'] += event['args'].get('bytes_written', 0)
+    lines.append('Task categories (time summed over workers):')
+    lines.append(f"  {'total s':>10}  {'max s':>7}  {'tasks':>6}  {'written':>10}  category")
+    for category, entry in sorted(categories.items(), key=lambda item: -item[1]['total'])[:limit]:
+        lines.append(
+            f"  {entry['total'] / 1e6:10.2f}  {entry['max'] / 1e6:7.2f}  {entry['count']:6d}  "
+            f"{entry['bytes'] / 1024:8.0f}KB  {category}"
+        )
+
+    lines.append('Slowest tasks:')
+    for event in sorted(tasks, key=lambda e: -e['dur'])[:limit]:
+        lines.append(f"  {event['dur'] / 1e6:9.3f}s  {event['name']}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    run_script(Path(sys.argv[1]), sys.argv[2:])
+else:
+    _enable_from_env()
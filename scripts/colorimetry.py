@@ -0,0 +1,366 @@
+"""
+Batch colorimetry for Scanline Classic presets.
+Replaces the interactive tools/phosphorweights.R and tools/colormatrixcalc.R.
+Rules:
+- Colorimetry presets mirror COLORIMETRY_PRESET in shaders/color-base.slang
+  (0 custom R_X..W_Y, 1 SMPTE C, 2 Japan D93, 3 EBU, 4 Rec. 709).
+- Every unique primaries/white-point combination is solved once and cached.
+- `--report` lists every combination referenced under presetdata/ with its
+  luminance weights and RGB<->XYZ / sRGB matrices.
+- `--fill DIR` writes derived parameters (luminance weights and phosphor
+  chromaticities) into presets whose shaders declare them. Only the debug
+  pass phosphor-chroma.slang declares them, so pass `--define OPTION_DEBUG`
+  for presets that use it; the shipped passes derive these values from the
+  colorimetry parameters themselves, and build.py does not run the fill.
+  Values set explicitly in the preset are kept; mismatches are reported.
+  Explicit CHROMA_{A,B,C}_{X,Y} override the preset colorimetry's primaries.
+- `--check` compares results against tools/colorimetry-snapshots.json.
+  tools/colorimetry-snapshots.R regenerates them from the R tools; the
+  committed file still holds values recorded from this script, so until it
+  is regenerated under R the check catches regressions in the port rather
+  than verifying it against R.
+"""
+import argparse
+import concurrent.futures
+import functools
+import json
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import shader_source
+import slangp
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PRESETDATA = ROOT / 'presetdata'
+SNAPSHOTS_PATH = ROOT / 'tools' / 'colorimetry-snapshots.json'
+
+# Rec. 709 / sRGB matrices as used by tools/colormatrixcalc.R
+SRGB_TO_XYZ = (
+    (0.4124, 0.3576, 0.1805),
+    (0.2126, 0.7152, 0.0722),
+    (0.0193, 0.1192, 0.9505),
+)
+XYZ_TO_SRGB = (
+    (3.2406, -1.5372, -0.4986),
+    (-0.9689, 1.8758, 0.0415),
+    (0.0557, -0.2040, 1.0570),
+)
+
+CHROMATICITY_KEYS = ('R_X', 'R_Y', 'G_X', 'G_Y', 'B_X', 'B_Y', 'W_X', 'W_Y')
+PHOSPHOR_KEYS = ('CHROMA_A_X', 'CHROMA_A_Y', 'CHROMA_B_X', 'CHROMA_B_Y', 'CHROMA_C_X', 'CHROMA_C_Y')
+DEFAULT_COLORIMETRY_PRESET = 1.0
+# Tolerance for reporting explicit preset values that disagree with derived ones
+MISMATCH_TOLERANCE = 5e-4
+
+
+@dataclass(frozen=True)
+class Colorimetry:
+    red: tuple[float, float]
+    green: tuple[float, float]
+    blue: tuple[float, float]
+    white: tuple[float, float]
+
+    def label(self) -> str:
+        parts = [self.red, self.green, self.blue, self.white]
+        return ' '.join(f'({x:.4f}, {y:.4f})' for x, y in parts)
+
+
+# Keep in sync with the COLORIMETRY_PRESET branches in color-base.slang.
+COLORIMETRY_PRESETS = {
+    1: ('SMPTE C', Colorimetry((0.630, 0.340), (0.310, 0.595), (0.155, 0.070), (0.3127, 0.3290))),
+    2: ('Japan D93', Colorimetry((0.618, 0.350), (0.280, 0.605), (0.152, 0.063), (0.2832, 0.2971))),
+    3: ('EBU', Colorimetry((0.640, 0.330), (0.290, 0.600), (0.150, 0.060), (0.3127, 0.3290))),
+    4: ('Rec. 709', Colorimetry((0.640, 0.330), (0.300, 0.600), (0.150, 0.060), (0.3127, 0.3290))),
+}
+
+
+@dataclass(frozen=True)
+class ColorimetryResult:
+    colorimetry: Colorimetry
+    luminance_weights: tuple[float, float, float]
+    rgb_to_xyz: tuple[tuple[float, ...], ...]
+    xyz_to_rgb: tuple[tuple[float, ...], ...]
+    srgb_to_rgb: tuple[tuple[float, ...], ...]
+    rgb_to_srgb: tuple[tuple[float, ...], ...]
+
+
+def xy_to_xyz(x: float, y: float) -> tuple[float, float, float]:
+    """Chromaticity to (x, y, z) with z = 1 - x - y, as the R scripts do."""
+    return (x, y, 1.0 - x - y)
+
+
+def mat_mul(a, b):
+    return tuple(tuple(sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3)) for i in range(3))
+
+
+def mat_vec(a, v):
+    return tuple(sum(a[i][k] * v[k] for k in range(3)) for i in range(3))
+
+
+def mat_inverse(m):
+    (a, b, c), (d, e, f), (g, h, i) = m
+    det = a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+    if abs(det) < 1e-12:
+        raise ValueError('Chromaticities are collinear; matrix is singular')
+    inv_det = 1.0 / det
+    return (
+        ((e * i - f * h) * inv_det, (c * h - b * i) * inv_det, (b * f - c * e) * inv_det),
+        ((f * g - d * i) * inv_det, (a * i - c * g) * inv_det, (c * d - a * f) * inv_det),
+        ((d * h - e * g) * inv_det, (b * g - a * h) * inv_det, (a * e - b * d) * inv_det),
+    )
+
+
+def columns(*vectors):
+    return tuple(tuple(v[row] for v in vectors) for row in range(3))
+
+
+@functools.lru_cache(maxsize=None)
+def solve(colorimetry: Colorimetry) -> ColorimetryResult:
+    """Solve one combination (cached; colorimetries are hashable)."""
+    primaries = columns(*(xy_to_xyz(*xy) for xy in (colorimetry.red, colorimetry.green, colorimetry.blue)))
+    w = xy_to_xyz(*colorimetry.white)
+    white_xyz = tuple(c / w[1] for c in w)
+    scale = mat_vec(mat_inverse(primaries), white_xyz)
+    rgb_to_xyz = tuple(tuple(primaries[row][col] * scale[col] for col in range(3)) for row in range(3))
+    xyz_to_rgb = mat_inverse(rgb_to_xyz)
+    return ColorimetryResult(
+        colorimetry=colorimetry,
+        luminance_weights=tuple(rgb_to_xyz[1]),
+        rgb_to_xyz=rgb_to_xyz,
+        xyz_to_rgb=xyz_to_rgb,
+        srgb_to_rgb=mat_mul(xyz_to_rgb, SRGB_TO_XYZ),
+        rgb_to_srgb=mat_mul(XYZ_TO_SRGB, rgb_to_xyz),
+    )
+
+
+def solve_batch(colorimetries) -> dict:
+    """Solve every unique combination in `colorimetries` once."""
+    return {c: solve(c) for c in dict.fromkeys(colorimetries)}
+
+
+def colorimetry_from_values(values: dict, defaults: dict | None = None) -> Colorimetry:
+    """Effective colorimetry for a parameter mapping (preset values over shader defaults)."""
+    defaults = defaults or {}
+
+    def number(key, fallback):
+        raw = values.get(key, defaults.get(key, fallback))
+        return float(raw)
+
+    preset = number('COLORIMETRY_PRESET', DEFAULT_COLORIMETRY_PRESET)
+    if preset >= 0.5:
+        index = min(int(preset + 0.5), max(COLORIMETRY_PRESETS))
+        return COLORIMETRY_PRESETS[index][1]
+
+    custom = COLORIMETRY_PRESETS[1][1]
+    fallback = (*custom.red, *custom.green, *custom.blue, *custom.white)
+    rx, ry, gx, gy, bx, by, wx, wy = (number(key, fb) for key, fb in zip(CHROMATICITY_KEYS, fallback))
+    return Colorimetry((rx, ry), (gx, gy), (bx, by), (wx, wy))
+
+
+# Derived parameter name -> value extractor. Only written when a pass declares it.
+DERIVED_PARAMETERS = {
+    'LUMINANCE_WEIGHT_R': lambda r: r.luminance_weights[0],
+    'LUMINANCE_WEIGHT_G': lambda r: r.luminance_weights[1],
+    'LUMINANCE_WEIGHT_B': lambda r: r.luminance_weights[2],
+    'CHROMA_A_X': lambda r: r.colorimetry.red[0],
+    'CHROMA_A_Y': lambda r: r.colorimetry.red[1],
+    'CHROMA_B_X': lambda r: r.colorimetry.green[0],
+    'CHROMA_B_Y': lambda r: r.colorimetry.green[1],
+    'CHROMA_C_X': lambda r: r.colorimetry.blue[0],
+    'CHROMA_C_Y': lambda r: r.colorimetry.blue[1],
+    'CHROMA_A_WEIGHT': lambda r: r.luminance_weights[0],
+    'CHROMA_B_WEIGHT': lambda r: r.luminance_weights[1],
+    'CHROMA_C_WEIGHT': lambda r: r.luminance_weights[2],
+}
+
+
+def collect_catalogue_colorimetries(presetdata_dir: Path) -> dict:
+    """Map each colorimetry referenced by presetdata params/overrides to its sources."""
+    found = {}
+
+    def record(values: dict, source: str):
+        if 'COLORIMETRY_PRESET' not in values and not any(key in values for key in CHROMATICITY_KEYS):
+            return
+        colorimetry = colorimetry_from_values(values)
+        found.setdefault(colorimetry, []).append(source)
+
+    for path in sorted(presetdata_dir.rglob('*.json')):
+        data = json.loads(path.read_text(encoding='utf-8'))
+        rel = path.relative_to(presetdata_dir).as_posix()
+        record(data.get('parameters', {}), rel)
+        record(data.get('parameter_overrides', {}), rel)
+
+    found.setdefault(COLORIMETRY_PRESETS[1][1], []).append('(shader default)')
+    return found
+
+
+def format_matrix(name: str, m) -> str:
+    rows = '\n'.join('  ' + ' '.join(f'{v: .5f}' for v in row) for row in m)
+    return f'{name}\n{rows}'
+
+
+def print_result(result: ColorimetryResult, sources=()):
+    print(result.colorimetry.label())
+    if sources:
+        print('  Referenced by: ' + ', '.join(sources))
+    r, g, b = result.luminance_weights
+    print(f'  Luminance weights: R {r:.6f}  G {g:.6f}  B {b:.6f}')
+    for name, m in (
+        ('RGB to XYZ Matrix', result.rgb_to_xyz),
+        ('XYZ to RGB Matrix', result.xyz_to_rgb),
+        ('sRGB to RGB Matrix', result.srgb_to_rgb),
+        ('RGB to sRGB Matrix', result.rgb_to_srgb),
+    ):
+        print(format_matrix('  ' + name, m))
+    print()
+
+
+def check_snapshots(snapshots_path: Path) -> int:
+    snapshots = json.loads(snapshots_path.read_text(encoding='utf-8'))
+    failures = 0
+    for case in snapshots['cases']:
+        xy = case['chromaticities']
+        colorimetry = Colorimetry(tuple(xy[0:2]), tuple(xy[2:4]), tuple(xy[4:6]), tuple(xy[6:8]))
+        result = solve(colorimetry)
+        tolerance = case.get('tolerance', snapshots.get('tolerance', 5e-5))
+        expected = case['expected']
+        actual = {
+            'luminance_weights': [result.luminance_weights],
+            'rgb_to_xyz': result.rgb_to_xyz,
+            'xyz_to_rgb': result.xyz_to_rgb,
+            'srgb_to_rgb': result.srgb_to_rgb,
+            'rgb_to_srgb': result.rgb_to_srgb,
+        }
+        for key, want in expected.items():
+            want_rows = want if isinstance(want[0], list) else [want]
+            got_rows = actual[key]
+            for want_row, got_row in zip(want_rows, got_rows):
+                for want_value, got_value in zip(want_row, got_row):
+                    if abs(want_value - got_value) > tolerance:
+                        failures += 1
+                        print(f"Mismatch in {case['name']} {key}: expected {want_value}, got {got_value:.6f}")
+    if failures:
+        print(f"Colorimetry check failed: {failures} mismatch(es).")
+        return 1
+    print(f"Colorimetry check passed: {len(snapshots['cases'])} case(s).")
+    return 0
+
+
+def fill_preset(preset_path: Path, defines: dict | None = None, verbose=False):
+    """Write derived colorimetry parameters into one generated preset."""
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+
+    declared = {}
+    for idx in range(slangp.shader_count(values)):
+        shader_path = values.get(f'shader{idx}')
+        if not shader_path:
+            continue
+        shader_file = (preset_path.parent / shader_path).resolve()
+        if shader_file.is_file():
+            declared.update(shader_source.collect_parameters(shader_file, defines))
+
+    targets = [name for name in DERIVED_PARAMETERS if name in declared]
+    phosphors = [values.get(key) for key in PHOSPHOR_KEYS]
+    if any(phosphors) and not all(phosphors):
+        # Partial phosphor sets (e.g. monochrome) are not tristimulus; leave them alone.
+        targets = [name for name in targets if not name.startswith('CHROMA_')]
+    if not targets:
+        return False
+
+    defaults = {name: param.default for name, param in declared.items()}
+    colorimetry = colorimetry_from_values(values, defaults)
+    if all(phosphors):
+        # Explicit phosphor chromaticities win; weights follow them under the preset white.
+        rx, ry, gx, gy, bx, by = (float(v) for v in phosphors)
+        colorimetry = Colorimetry((rx, ry), (gx, gy), (bx, by), colorimetry.white)
+    result = solve(colorimetry)
+    changed = False
+    for name in targets:
+        derived = DERIVED_PARAMETERS[name](result)
+        if name in values:
+            try:
+                explicit = float(values[name])
+            except ValueError:
+                explicit = None
+            if explicit is None or abs(explicit - derived) > MISMATCH_TOLERANCE:
+                print(f"Warning: {preset_path}: {name} = {values[name]} differs from derived {derived:.4f}")
+            continue
+        slangp.set_value(lines, name, f'{derived:.4f}')
+        changed = True
+        if verbose:
+            print(f"  Derived: {name} = {derived:.4f}")
+
+    if changed:
+        preset_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+    return changed
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch colorimetry for Scanline Classic presets')
+    parser.add_argument('--presetdata-dir', type=Path, default=PRESETDATA)
+    parser.add_argument('--report', action='store_true', help='Report every colorimetry referenced by presetdata')
+    parser.add_argument(
+        '--primaries',
+        type=float,
+        nargs=8,
+        metavar=('RX', 'RY', 'GX', 'GY', 'BX', 'BY', 'WX', 'WY'),
+        help='Solve a single set of chromaticities',
+    )
+    parser.add_argument('--check', action='store_true', help='Compare results with the recorded regression snapshots')
+    parser.add_argument('--snapshots', type=Path, default=SNAPSHOTS_PATH)
+    parser.add_argument(
+        '--fill',
+        type=Path,
+        action='append',
+        default=[],
+        help='Preset folder to fill with derived colorimetry parameters (repeatable)',
+    )
+    parser.add_argument(
+        '--define',
+        action='append',
+        default=[],
+        help='Shader define to assume when scanning passes for --fill, e.g. OPTION_DEBUG (repeatable)',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    status = 0
+    if args.primaries:
+        v = args.primaries
+        print_result(solve(Colorimetry((v[0], v[1]), (v[2], v[3]), (v[4], v[5]), (v[6], v[7]))))
+
+    if args.report:
+        catalogue = collect_catalogue_colorimetries(args.presetdata_dir)
+        for colorimetry, result in solve_batch(catalogue).items():
+            print_result(result, catalogue[colorimetry])
+
+    if args.check:
+        status = check_snapshots(args.snapshots)
+
+    defines = {name: '' for name in args.define}
+    for presets_dir in args.fill:
+        if not presets_dir.exists():
+            print(f"Warning: Input directory not found: {presets_dir}")
+            continue
+        presets = sorted(presets_dir.rglob('*.slangp'))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            filled = sum(executor.map(lambda p: fill_preset(p, defines, args.verbose), presets))
+        print(f"Colorimetry: filled derived parameters in {filled} of {len(presets)} preset(s) in {presets_dir.name}")
+
+    if not (args.primaries or args.report or args.check or args.fill):
+        parser.print_help()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Compiles every pass referenced by generated presets to SPIR-V and reports per-pass metrics.
+Rules:
+- Every distinct shader file referenced by `shaderN` in the preset folders is
+  compiled once per define set (DEFINE_SETS: shipped defaults and
+  OPTION_DEBUG), whichever presets share it.
+- Each pass is split into vertex and fragment sources the way RetroArch does:
+  includes expanded, `#pragma include_optional` inlined when the file exists
+  and dropped otherwise, lines after `#pragma stage X` kept only for stage X,
+  and the set's defines inserted after `#version`.
+- Stages are compiled with glslangValidator (`-V`, Vulkan target) from the
+  PATH or `--glslang`, several at a time. SPIR-V and its metrics are cached
+  under `--cache-dir` by the sha1 of stage source, stage and glslang version,
+  so unchanged passes are not recompiled between builds.
+- The report records per pass, define set and stage: instruction count
+  (inside functions), texture sample/fetch/gather instructions, SPIR-V size
+  and compile time. Counts are static: loops count once. With `--baseline`
+  the previous report is compared and passes that grew are listed.
+- Exits non-zero when any stage fails to compile.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import shader_source
+import slangp
+
+
+# name -> defines added after #version
+DEFINE_SETS = {
+    'default': (),
+    'debug': ('OPTION_DEBUG',),
+}
+STAGES = {
+    'vertex': 'vert',
+    'fragment': 'frag',
+}
+GLSLANG = 'glslangValidator'
+
+STAGE_PATTERN = re.compile(r'^\s*#pragma\s+stage\s+(\w+)')
+VERSION_PATTERN = re.compile(r'^\s*#\s*version\b')
+
+SPIRV_MAGIC = 0x07230203
+OP_FUNCTION = 54
+OP_FUNCTION_END = 56
+# OpImageSample*, OpImageFetch, OpImageGather, OpImageDrefGather and their sparse forms
+SAMPLE_OPCODES = set(range(87, 98)) | set(range(305, 316))
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def stage_sources(shader_file: Path, defines=()):
+    """Return {stage: source text} as RetroArch hands it to glslang."""
+    lines = []
+    for source, line in shader_source.expand_includes(shader_file):
+        optional = shader_source.INCLUDE_OPTIONAL_PATTERN.match(line)
+        if optional:
+            target = (source.parent / optional.group(2)).resolve()
+            if target.is_file():
+                lines.extend(text for _, text in shader_source.expand_includes(target))
+            continue
+        lines.append(line)
+
+    sources = {stage: [] for stage in STAGES}
+    current = None
+    for line in lines:
+        stage = STAGE_PATTERN.match(line)
+        if stage:
+            current = stage.group(1)
+            continue
+        for name, out in sources.items():
+            if current is None or current == name:
+                out.append(line)
+                if VERSION_PATTERN.match(line):
+                    out.extend(f'#define {define}' for define in defines)
+    return {stage: '\n'.join(out) + '\n' for stage, out in sources.items()}
+
+
+def spirv_metrics(data: bytes):
+    """Count instructions inside functions and texture sampling instructions."""
+    if len(data) < 20 or len(data) % 4:
+        return {'instructions': 0, 'texture_samples': 0}
+    order = '<' if struct.unpack_from('<I', data)[0] == SPIRV_MAGIC else '>'
+    words = struct.unpack(f'{order}{len(data) // 4}I', data)
+    instructions = samples = 0
+    in_function = False
+    pos = 5
+    while pos < len(words):
+        count, opcode = words[pos] >> 16, words[pos] & 0xFFFF
+        if count == 0:
+            break
+        if opcode == OP_FUNCTION:
+            in_function = True
+        elif opcode == OP_FUNCTION_END:
+            in_function = False
+        elif in_function:
+            instructions += 1
+            if opcode in SAMPLE_OPCODES:
+                samples += 1
+        pos += count
+    return {'instructions': instructions, 'texture_samples': samples}
+
+
+class Compiler:
+    def __init__(self, glslang: str, cache_dir: Path, verbose=False):
+        self.glslang = glslang
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+        version = subprocess.run([glslang, '--version'], capture_output=True, text=True)
+        self.version = (version.stdout.splitlines() or [''])[0].strip()
+
+    def compile(self, label: str, stage: str, text: str):
+        key = hashlib.sha1(f'{self.version}\0{stage}\0{text}'.encode('utf-8')).hexdigest()
+        spv_path = self.cache_dir / f'{key}.spv'
+        metrics_path = self.cache_dir / f'{key}.json'
+        if spv_path.exists() and metrics_path.exists():
+            result = json.loads(metrics_path.read_text(encoding='utf-8'))
+            result['cached'] = True
+            return result
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source_path = Path(tmp) / f'pass.{STAGES[stage]}'
+            output_path = Path(tmp) / 'pass.spv'
+            source_path.write_text(text, encoding='utf-8', newline='\n')
+            start = time.perf_counter()
+            run = subprocess.run(
+                [self.glslang, '-V', '--target-env', 'vulkan1.0', '-S', STAGES[stage], '-o', str(output_path), str(source_path)],
+                capture_output=True,
+                text=True,
+            )
+            elapsed = time.perf_counter() - start
+            if run.returncode != 0:
+                message = (run.stdout + run.stderr).replace(str(source_path), label).strip()
+                return {'error': message}
+            data = output_path.read_bytes()
+
+        result = spirv_metrics(data)
+        result['spirv_bytes'] = len(data)
+        result['compile_ms'] = round(elapsed * 1000.0, 1)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name and rename: concurrent builds share the cache
+        metrics = (json.dumps(result, sort_keys=True) + '\n').encode('utf-8')
+        for path, content in ((spv_path, data), (metrics_path, metrics)):
+            partial = path.with_name(f'{path.name}.{os.getpid()}-{threading.get_ident()}.tmp')
+            partial.write_bytes(content)
+            os.replace(partial, path)
+        if self.verbose:
+            print(f"  Compiled {label} [{stage}] in {result['compile_ms']} ms")
+        result['cached'] = False
+        return result
+
+
+def referenced_passes(input_dirs):
+    """Return {shader file: number of presets using it} for every preset under `input_dirs`."""
+    passes = {}
+    for input_dir in input_dirs:
+        for preset in sorted(input_dir.rglob('*.slangp')):
+            values = slangp.read_preset_values(preset)
+            used = set()
+            for idx in range(slangp.shader_count(values)):
+                shader_file = (preset.parent / values.get(f'shader{idx}', '')).resolve()
+                if not shader_file.is_file():
+                    print(f"Warning: {values.get(f'shader{idx}', '')} not found for {preset}")
+                    continue
+                used.add(shader_file)
+            for shader_file in used:
+                passes[shader_file] = passes.get(shader_file, 0) + 1
+    return passes
+
+
+def compare(report: dict, baseline: dict):
+    """Return (key, field, old, new) for every metric that grew since the baseline."""
+    grown = []
+    for key, entry in report.items():
+        old_entry = baseline.get(key)
+        if not old_entry:
+            continue
+        for stage, metrics in entry['stages'].items():
+            old = old_entry.get('stages', {}).get(stage, {})
+            for field in ('instructions', 'texture_samples'):
+                if field in metrics and field in old and metrics[field] > old[field]:
+                    grown.append((f'{key} [{stage}]', field, old[field], metrics[field]))
+    return grown
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile preset passes to SPIR-V and report instruction metrics')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing shaders/ and presets/')
+    parser.add_argument('--input-dir', type=Path, action='append', default=[], help='Preset folder to compile (repeatable, default: all presets)')
+    parser.add_argument('--define-set', choices=sorted(DEFINE_SETS), action='append', default=[], help='Define set to compile (repeatable, default: all)')
+    parser.add_argument('--glslang', default=GLSLANG, help='glslangValidator executable')
+    parser.add_argument('--cache-dir', type=Path, default=Path(__file__).resolve().parent.parent / '.cache' / 'spirv', help='SPIR-V cache folder')
+    parser.add_argument('--report', type=Path, help='Report path (default: <root-dir>/compile-report.json)')
+    parser.add_argument('--baseline', type=Path, help='Earlier report to compare instruction and sample counts with')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    glslang = shutil.which(args.glslang)
+    if glslang is None:
+        print(f"Error: {args.glslang} not found; install glslang or pass --glslang")
+        raise SystemExit(1)
+
+    jobs = max(1, args.jobs)
+    input_dirs = args.input_dir or [args.root_dir / 'presets']
+    define_sets = args.define_set or list(DEFINE_SETS)
+    compiler = Compiler(glslang, args.cache_dir, verbose=args.verbose)
+    passes = referenced_passes([d for d in input_dirs if d.exists()])
+    print(f"Compiling {len(passes)} pass(es) x {len(define_sets)} define set(s) with {compiler.version}")
+
+    report = {}
+    jobs_list = []
+    for shader_file, preset_count in sorted(passes.items()):
+        label = Path(os.path.relpath(shader_file, args.root_dir)).as_posix()
+        for define_set in define_sets:
+            key = f'{label} ({define_set})'
+            report[key] = {'presets': preset_count, 'stages': {}}
+            for stage, text in stage_sources(shader_file, DEFINE_SETS[define_set]).items():
+                jobs_list.append((key, label, stage, text))
+
+    failures = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(compiler.compile, label, stage, text): (key, stage)
+            for key, label, stage, text in jobs_list
+        }
+        # Collect in submission order so errors print the same way every run
+        for future, (key, stage) in futures.items():
+            result = future.result()
+            report[key]['stages'][stage] = result
+            if 'error' in result:
+                failures += 1
+                print(f"Error: {key} [{stage}] failed to compile:\n{result['error']}")
+
+    report_path = args.report or args.root_dir / 'compile-report.json'
+    report_path.write_text(json.dumps(report, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+    if args.baseline and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        for key, field, old, new in compare(report, baseline):
+            print(f"Grew: {key} {field} {old} -> {new}")
+
+    stages = [result for entry in report.values() for result in entry['stages'].values()]
+    cached = sum(1 for result in stages if result.get('cached'))
+    print(f"Shader compilation complete: {len(stages)} stage(s), {cached} from cache, {failures} failure(s). Report: {report_path}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Converts folders of user presets built on Scanline Classic SDR presets to every output target.
+Rules:
+- Every .slangp under each `--input-dir` is resolved: `#reference` chains are
+  followed and flattened into one preset. As in RetroArch, the passes and
+  textures come from the preset at the root of the chain; a referencing
+  preset only sets parameter values and texture paths (later presets and
+  lines win), and its shader and per-pass keys are ignored. Shader and
+  texture paths are rewritten relative to where the preset is written. Presets with no `-sdr.slang` pass are not
+  Scanline Classic SDR presets and are skipped.
+- The flattened preset is written to `<output-dir>/uhd-4k-sdr/<input dir
+  name>/<relative path>`. Each `--target` is then derived from its source
+  folder (TARGETS, the same transforms build.py runs) into the same relative
+  path. A target's source folder is written too (fhd-hdr needs uhd-4k-hdr).
+- `--root-dir` is the Scanline Classic tree the presets use (default: out/);
+  its shaders/ decide which WCG/HDR passes exist.
+- Presets are streamed through a bounded work queue (preset_stream), several
+  at a time. Results are cached in a content-addressed store
+  (build_cache, `--cache-dir`), keyed by the flattened preset, the output
+  location relative to `--root-dir`, the targets, the tools in scripts/ and
+  the shaders under `--root-dir` (by relative path, so a copied cache still
+  matches). Unchanged presets are restored from the cache after an
+  upstream release changes nothing they use.
+- Exits non-zero when any preset could not be converted.
+"""
+import argparse
+import os
+import re
+from pathlib import Path
+
+import build_cache
+import generate_deck_presets
+import generate_fhd_presets
+import generate_hdr_presets
+import generate_wcg_presets
+import preset_sources
+import preset_stream
+import slangp
+
+
+ROOT = Path(__file__).resolve().parent.parent
+SDR_FOLDER = 'uhd-4k-sdr'
+# target folder -> (source folder, transform(src, dst, root_dir, verbose)), in dependency order
+TARGETS = {
+    'uhd-4k-wcg': (SDR_FOLDER, lambda src, dst, root, verbose: generate_wcg_presets.transform_preset(src, dst, root, verbose)),
+    'uhd-4k-hdr': (SDR_FOLDER, lambda src, dst, root, verbose: generate_hdr_presets.transform_preset(src, dst, root, verbose)),
+    'fhd-sdr': (SDR_FOLDER, lambda src, dst, root, verbose: generate_fhd_presets.transform_preset(src, dst, verbose)),
+    'fhd-hdr': ('uhd-4k-hdr', lambda src, dst, root, verbose: generate_fhd_presets.transform_preset(src, dst, verbose)),
+    'steamdeck-lcd': (SDR_FOLDER, lambda src, dst, root, verbose: generate_deck_presets.transform_preset(src, dst, False, verbose)),
+    'steamdeck-oled-native': ('uhd-4k-wcg', lambda src, dst, root, verbose: generate_deck_presets.transform_preset(src, dst, True, verbose)),
+}
+REFERENCE_PATTERN = re.compile(r'^\s*#reference\s+"?([^"]+?)"?\s*$')
+# Keys a referencing preset cannot set; per-pass and texture option keys are matched separately
+STRUCTURE_KEYS = ('shaders', 'textures', 'parameters', 'feedback_pass')
+TEXTURE_OPTION_SUFFIXES = ('_linear', '_mipmap', '_wrap_mode')
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def resolve_preset(path: Path, chain=()):
+    """Return {key: (value, quoted)} for `path` with its #reference chain applied; path values are absolute."""
+    path = Path(os.path.normpath(path))
+    if path in chain:
+        raise ValueError(f"#reference loop: {' -> '.join(str(p) for p in (*chain, path))}")
+    if not path.is_file():
+        raise ValueError(f"{path} not found" + (f" (referenced from {chain[-1]})" if chain else ''))
+
+    references = []
+    own = []
+    for line in preset_stream.lines(path):
+        reference = REFERENCE_PATTERN.match(line)
+        if reference:
+            references.append(reference.group(1))
+            continue
+        assignment = slangp.split_assignment(line)
+        if assignment:
+            own.append((*assignment, '"' in line))
+    if len(references) > 1:
+        raise ValueError(f"{path} has more than one #reference")
+
+    if not references:
+        # The root of the chain: passes, textures and parameters as written
+        texture_names = slangp.texture_names({'textures': next((value for key, value, _ in own if key == 'textures'), '')})
+        entries = {}
+        for key, value, quoted in own:
+            if key in texture_names or slangp.SHADER_KEY_PATTERN.match(key):
+                value = os.path.normpath(path.parent / value)
+            entries[key] = (value, quoted)
+        return entries
+
+    # A referencing preset only overrides parameter values and the paths of the root's textures
+    entries = resolve_preset(path.parent / references[0], (*chain, path))
+    texture_names = slangp.texture_names({'textures': entries.get('textures', ('', False))[0]})
+    # Textures this preset declares itself are not loaded either
+    ignored = slangp.texture_names({'textures': next((value for key, value, _ in own if key == 'textures'), '')})
+    for key, value, quoted in own:
+        if key in texture_names:
+            entries[key] = (os.path.normpath(path.parent / value), quoted)
+        elif not is_structure_key(key, [*texture_names, *ignored]):
+            entries[key] = (value, quoted)
+    return entries
+
+
+def is_structure_key(key: str, texture_names) -> bool:
+    return (
+        key in STRUCTURE_KEYS
+        or key in texture_names
+        or slangp.PASS_KEY_PATTERN.match(key) is not None
+        or any(key == f'{name}{suffix}' for name in texture_names for suffix in TEXTURE_OPTION_SUFFIXES)
+    )
+
+
+def render_preset(entries: dict, output_path: Path) -> str:
+    texture_names = slangp.texture_names({'textures': entries.get('textures', ('', False))[0]})
+    lines = []
+    for key, (value, quoted) in entries.items():
+        if key in texture_names or slangp.SHADER_KEY_PATTERN.match(key):
+            value = slangp.relative_preset_path(output_path, Path(value))
+        lines.append(f'{key} = "{value}"' if quoted else f'{key} = {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def is_sdr_preset(entries: dict) -> bool:
+    return any(slangp.SHADER_KEY_PATTERN.match(key) and value.endswith('-sdr.slang') for key, (value, _) in entries.items())
+
+
+def target_order(targets):
+    """Return the folders to write for `targets`, sources first."""
+    needed = {SDR_FOLDER}
+    for target in targets:
+        while target != SDR_FOLDER:
+            needed.add(target)
+            target = TARGETS[target][0]
+    return [SDR_FOLDER] + [target for target in TARGETS if target in needed]
+
+
+class Converter:
+    def __init__(self, root_dir: Path, output_dir: Path, folders, cache=None, verbose=False):
+        self.root_dir = root_dir
+        self.output_dir = output_dir
+        self.folders = folders
+        self.cache = cache
+        self.verbose = verbose
+        # What a conversion reads besides the preset: the tools, and the shaders (passes that exist, declared parameters)
+        hashes = preset_sources.FileHashes()
+        tools = hashes.digest(sorted(Path(__file__).resolve().parent.glob('*.py')))
+        shaders = hashes.digest(preset_stream.walk(root_dir / 'shaders', ''), root_dir)
+        # Written presets point at the shaders by relative path, so only the relative location matters
+        self.environment = build_cache.make_key(tools, shaders, Path(os.path.relpath(root_dir, output_dir)).as_posix())
+
+    def convert(self, item):
+        """Convert one preset; returns 'converted', 'cached', 'skipped' or 'failed'."""
+        input_dir, preset = item
+        relative = Path(input_dir.name) / preset.relative_to(input_dir)
+        try:
+            entries = resolve_preset(preset)
+            if not is_sdr_preset(entries):
+                if self.verbose:
+                    print(f"Skipped {preset}: no Scanline Classic SDR pass")
+                return 'skipped'
+            sdr_path = self.output_dir / SDR_FOLDER / relative
+            text = render_preset(entries, sdr_path)
+
+            key = None
+            if self.cache is not None:
+                key = build_cache.make_key('convert', self.environment, relative.as_posix(), ','.join(self.folders), text)
+                files = self.cache.get(key)
+                if files is not None:
+                    for name, data in files.items():
+                        path = self.output_dir / name
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        path.write_bytes(data)
+                    return 'cached'
+
+            sdr_path.parent.mkdir(parents=True, exist_ok=True)
+            sdr_path.write_text(text, encoding='utf-8', newline='\n')
+            for folder in self.folders[1:]:
+                source, transform = TARGETS[folder]
+                transform(self.output_dir / source / relative, self.output_dir / folder / relative, self.root_dir, self.verbose)
+
+            if self.cache is not None:
+                self.cache.put(key, {
+                    f'{folder}/{relative.as_posix()}': (self.output_dir / folder / relative).read_bytes()
+                    for folder in self.folders
+                })
+        except (OSError, ValueError) as exc:
+            print(f"Warning: failed to convert {preset}: {exc}")
+            return 'failed'
+        if self.verbose:
+            print(f"Converted {preset}")
+        return 'converted'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert folders of user presets to every Scanline Classic output target')
+    parser.add_argument('--input-dir', type=Path, action='append', required=True, help='Folder of user presets (repeatable)')
+    parser.add_argument('--output-dir', type=Path, required=True, help='Folder to write <target>/<input dir name>/ into')
+    parser.add_argument('--root-dir', type=Path, default=ROOT / 'out', help='Scanline Classic tree whose shaders/ the presets use (default: out/)')
+    parser.add_argument('--target', choices=list(TARGETS), action='append', default=[], help='Target folder to derive (repeatable, default: all)')
+    parser.add_argument('--cache-dir', type=Path, default=ROOT / '.cache' / 'convert', help='Content-addressed conversion cache')
+    parser.add_argument('--cache-size', type=int, default=1024, help='Size bound of the cache in MB')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    root_dir = args.root_dir.resolve()
+    output_dir = args.output_dir.resolve()
+    if not (root_dir / 'shaders').is_dir():
+        print(f"Error: {root_dir / 'shaders'} not found; pass the Scanline Classic tree as --root-dir")
+        raise SystemExit(1)
+    input_dirs = [input_dir.resolve() for input_dir in args.input_dir]
+    for input_dir in input_dirs:
+        if not input_dir.is_dir():
+            print(f"Error: input directory not found: {input_dir}")
+            raise SystemExit(1)
+        # The walk is lazy and would pick up presets written under it
+        if output_dir == input_dir or input_dir in output_dir.parents:
+            print(f"Error: --output-dir must not be inside {input_dir}")
+            raise SystemExit(1)
+
+    folders = target_order(args.target or list(TARGETS))
+    cache = None if args.no_cache else build_cache.BuildCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    converter = Converter(root_dir, output_dir, folders, cache=cache, verbose=args.verbose)
+    print(f"Converting {', '.join(str(d) for d in input_dirs)} to {', '.join(folders)}")
+
+    items = ((input_dir, preset) for input_dir in input_dirs for preset in preset_stream.walk(input_dir))
+    counts = {'converted': 0, 'cached': 0, 'skipped': 0, 'failed': 0}
+    for result in preset_stream.map_bounded(converter.convert, items, max(1, args.jobs)):
+        counts[result] += 1
+
+    if cache is not None:
+        cache.evict()
+    print(
+        f"Preset conversion complete: {counts['converted']} converted, {counts['cached']} from cache, "
+        f"{counts['skipped']} skipped, {counts['failed']} failed. Output: {output_dir}"
+    )
+    if counts['failed']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Drops passes that reduce to identity from generated presets and re-indexes the rest.
+Rules:
+- A pass is a candidate only when its shader has an entry in IDENTITY_RULES and
+  the rule holds for the preset: `stock.slang` when no later pass reads the
+  alpha it would have forwarded (its alpha is forced opaque), `decimate.slang`
+  when the pass does not resize (its own early return). Alpha is followed
+  through every pass that may forward it, by Source or by alias, until each
+  path reaches a pass that writes a constant alpha (`FragColor = vec4(...,
+  <number>)`); a pass on the way that reads `.a`/`.rgba` keeps the stock pass. Rules look only at what is fixed in
+  the preset; OPTION_DEBUG bypass parameters are runtime options and do not
+  count.
+- Every candidate must keep its input size (scale_type source, scale 1.0) and
+  must not be the last pass, which writes the viewport.
+- Nothing is dropped when another pass samples the candidate by its alias
+  (`#pragma name` or `aliasN`), or when any pass in the preset uses indexed
+  PassOutputN/PassFeedbackN references, which would shift.
+- Per-pass keys (`shaderN`, `scale_typeN`, `aliasN`, ...) of later passes are
+  renumbered in place and `shaders` is updated.
+- Presets with no pass in IDENTITY_RULES are left without expanding any
+  shader. Each shader's expansion, `#pragma name`s, identifiers and pattern
+  searches are worked out once per run and shared by every preset.
+- No pipeline in presetdata/ uses a pass in IDENTITY_RULES, so build.py does
+  not run this; it is for hand-made presets. Run it before
+  specialize_shaders.py, which renames the shader files.
+"""
+import argparse
+import concurrent.futures
+import functools
+import os
+import re
+from pathlib import Path
+
+import shader_source
+import slangp
+
+
+PASS_NAME_PATTERN = re.compile(r'^\s*#pragma\s+name\s+(\w+)')
+INDEXED_REFERENCE_PATTERN = re.compile(r'\b(PassOutput|PassFeedback)\d+')
+ALPHA_READ_PATTERN = re.compile(r'\.a\b|\.rgba\b')
+FRAGCOLOR_WRITE_PATTERN = re.compile(r'\bFragColor\s*(\.\w+)?\s*[-+*/]?=(?!=)\s*([^;]*);')
+CONSTANT_ALPHA_PATTERN = re.compile(r'^vec4\(.*,\s*[-+]?(\d+\.?\d*|\.\d+)\s*\)$', re.DOTALL)
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+@functools.lru_cache(maxsize=None)
+def shader_lines(shader_file: Path):
+    return tuple(line for _, line in shader_source.expanded_source(shader_file))
+
+
+@functools.lru_cache(maxsize=None)
+def shader_names(shader_file: Path):
+    """(`#pragma name`s, every identifier) of a shader."""
+    lines = shader_lines(shader_file)
+    names = frozenset(match.group(1) for match in map(PASS_NAME_PATTERN.match, lines) if match)
+    return names, frozenset(WORD_PATTERN.findall('\n'.join(lines)))
+
+
+@functools.lru_cache(maxsize=None)
+def shader_references(shader_file: Path, pattern) -> bool:
+    return any(pattern.search(line) for line in shader_lines(shader_file))
+
+
+class PresetPass:
+    def __init__(self, index: int, values: dict, shader_file: Path):
+        self.index = index
+        self.values = values
+        self.shader_file = shader_file
+        self.lines = shader_lines(shader_file)
+
+    def value(self, key: str, default=None):
+        return self.values.get(f'{key}{self.index}', default)
+
+    def aliases(self):
+        names = set(shader_names(self.shader_file)[0])
+        alias = self.value('alias')
+        if alias:
+            names.add(alias)
+        return names
+
+    def references(self, pattern) -> bool:
+        return shader_references(self.shader_file, pattern)
+
+    def samples(self, other: 'PresetPass') -> bool:
+        """True when this pass reads `other` by one of its aliases."""
+        tokens = shader_names(self.shader_file)[1]
+        return any(f'{alias}{suffix}' in tokens for alias in other.aliases() for suffix in ('', 'Size', 'Feedback'))
+
+    def writes_constant_alpha(self) -> bool:
+        """True when every FragColor write is `vec4(..., <number>)`, so no input alpha gets through."""
+        writes = FRAGCOLOR_WRITE_PATTERN.findall('\n'.join(self.lines))
+        return bool(writes) and all(
+            not swizzle and CONSTANT_ALPHA_PATTERN.match(value.strip()) for swizzle, value in writes
+        )
+
+    def keeps_size(self) -> bool:
+        return slangp.pass_keeps_size(self.values, self.index)
+
+
+def stock_is_identity(current: PresetPass, later: list) -> bool:
+    # Passes whose output alpha may still be the alpha stock.slang replaces
+    carriers = [current]
+    previous = current
+    for candidate in later:
+        if previous in carriers or any(candidate.samples(carrier) for carrier in carriers):
+            if candidate.references(ALPHA_READ_PATTERN):
+                return False
+            if not candidate.writes_constant_alpha():
+                carriers.append(candidate)
+        previous = candidate
+    return True
+
+
+def decimate_is_identity(current: PresetPass, later: list) -> bool:
+    # decimate.slang returns its input unchanged when the pass does not shrink
+    return True
+
+
+# shader file name -> predicate(pass, later passes); size is checked separately
+IDENTITY_RULES = {
+    'stock.slang': stock_is_identity,
+    'decimate.slang': decimate_is_identity,
+}
+
+
+def identity_passes(passes):
+    """Return the indices of passes that can be dropped."""
+    if any(p.references(INDEXED_REFERENCE_PATTERN) for p in passes):
+        return []
+    dropped = []
+    for position, current in enumerate(passes[:-1]):
+        rule = IDENTITY_RULES.get(current.shader_file.name)
+        if rule is None or not current.keeps_size():
+            continue
+        if not rule(current, passes[position + 1:]):
+            continue
+        sampled = any(p.samples(current) for p in passes if p is not current)
+        if not sampled:
+            dropped.append(current.index)
+    return dropped
+
+
+def transform_preset(preset_path: Path, verbose=False):
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+    count = slangp.shader_count(values)
+
+    shader_files = [(preset_path.parent / values.get(f'shader{idx}', '')).resolve() for idx in range(count)]
+    if not any(shader_file.name in IDENTITY_RULES for shader_file in shader_files[:-1]):
+        return 0
+
+    passes = []
+    for idx, shader_file in enumerate(shader_files):
+        if not shader_file.is_file():
+            print(f"Warning: {values.get(f'shader{idx}', '')} not found for {preset_path}; keeping all passes")
+            return 0
+        passes.append(PresetPass(idx, values, shader_file))
+
+    dropped = set(identity_passes(passes))
+    if not dropped:
+        return 0
+
+    lines = slangp.reindex_passes(lines, dropped, count)
+    preset_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+    if verbose:
+        names = ', '.join(passes[idx].shader_file.name for idx in sorted(dropped))
+        print(f"Dropped identity pass(es): {preset_path} ({names})")
+    return len(dropped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drop identity passes from generated presets')
+    parser.add_argument('--input-dir', type=Path, action='append', default=[], help='Preset folder to process (repeatable)')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    total = 0
+    for input_dir in args.input_dir:
+        if not input_dir.exists():
+            print(f"Warning: Input directory not found: {input_dir}")
+            continue
+        presets = sorted(input_dir.rglob('*.slangp'))
+        print(f"Checking {input_dir.name} for identity passes ({len(presets)} preset(s))")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(transform_preset, preset, args.verbose) for preset in presets]
+            for future in concurrent.futures.as_completed(futures):
+                total += future.result()
+
+    print(f"Identity pass elimination complete: {total} pass(es) dropped.")
+
+
+if __name__ == '__main__':
+    main()
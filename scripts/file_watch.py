@@ -0,0 +1,70 @@
+"""
+Polling file watcher for build.py --watch and the build server.
+
+Folders are compared by (mtime_ns, size) per file, so it works the same on
+every platform and needs no extra packages. `wait` returns once a batch of
+changes has settled: after the first change it keeps polling until nothing
+has changed for the debounce interval, so an editor's save-and-rename or a
+`git checkout` becomes one rebuild.
+"""
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+
+POLL_INTERVAL = 0.5
+DEBOUNCE = 0.3
+
+
+def snapshot(paths):
+    """Return {path: (mtime_ns, size)} for every file in `paths` (files or directory trees)."""
+    state = {}
+    for root in paths:
+        root = Path(root)
+        files = [root] if root.is_file() else root.rglob('*')
+        for path in files:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.is_file():
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def changed_paths(before: dict, after: dict):
+    """Return the sorted paths added, removed or modified between two snapshots."""
+    return sorted(path for path in before.keys() | after.keys() if before.get(path) != after.get(path))
+
+
+class Watcher:
+    """Polls `paths` and reports changed files in settled batches."""
+
+    def __init__(self, paths, interval: float = POLL_INTERVAL, debounce: float = DEBOUNCE):
+        self.paths = [Path(path) for path in paths]
+        self.interval = interval
+        self.debounce = debounce
+        self.state = snapshot(self.paths)
+
+    def poll(self):
+        """Return the files changed since the last poll."""
+        state = snapshot(self.paths)
+        changes = changed_paths(self.state, state)
+        self.state = state
+        return changes
+
+    def wait(self):
+        """Block until files change, then until they stop changing; return them all."""
+        while True:
+            changes = set(self.poll())
+            if changes:
+                break
+            time.sleep(self.interval)
+        while True:
+            time.sleep(self.debounce)
+            more = self.poll()
+            if not more:
+                return sorted(changes)
+            changes.update(more)
@@ -0,0 +1,287 @@
+"""
+Emits flattened single-file copies of preset passes so RetroArch opens one file per pass.
+Rules:
+- Each pass source has its `#include` chain inlined (as RetroArch's
+  preprocessor does), comments and blank lines stripped, and functions that
+  nothing can reach removed.
+- Reachability is textual and ignores `#if` blocks, because options.cfg is
+  only known at install time: roots are `main` and every function named
+  outside a function body (macros, constant initializers), and a function is
+  kept when a kept function names it. Overloads share their name. A function
+  whose span does not balance its own `#if`/`#endif` lines is always kept, and
+  nothing is removed when the braces of the file do not balance.
+- `#pragma include_optional "../config/options.cfg"` stays a separate file
+  (it is the user's install-time configuration); its path is rewritten for
+  the new location.
+- Files go to `shaders/flat/<shader>-<sha1[:12]>.slang`, named by content hash
+  so identical passes are shared across the catalogue; `flat.json` records the
+  source, line counts and removed functions of each.
+- Run last: it rewrites `shaderN` in place, and the other steps look passes
+  up by their original file names or need the includes to stay separate.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+import shader_source
+import slangp
+
+
+SIGNATURE_PATTERN = re.compile(
+    r'^\s*(?:(?:const|highp|mediump|lowp|precise)\s+)*[A-Za-z_]\w*\s+([A-Za-z_]\w*)\s*\('
+)
+IDENTIFIER_PATTERN = re.compile(r'\b[A-Za-z_]\w*\b')
+CONDITIONAL_OPEN_PATTERN = re.compile(r'^\s*#\s*if(n?def)?\b')
+CONDITIONAL_BRANCH_PATTERN = re.compile(r'^\s*#\s*(else|elif)\b')
+CONDITIONAL_CLOSE_PATTERN = re.compile(r'^\s*#\s*endif\b')
+VERSION_PATTERN = re.compile(r'^\s*#\s*version\b')
+NOT_FUNCTIONS = {'return', 'else', 'layout', 'struct', 'uniform', 'in', 'out'}
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def find_functions(lines):
+    """Return (name, first line, last line) of every top-level function, or None if braces do not balance."""
+    functions = []
+    depth = 0
+    pending = None
+    current = None
+    # Each `#if` branch starts at the depth before it and all branches must
+    # end at the same depth: (depth at #if, depth at end of first branch)
+    branches = []
+    for idx, line in enumerate(lines):
+        if CONDITIONAL_OPEN_PATTERN.match(line):
+            branches.append((depth, None))
+            continue
+        if CONDITIONAL_BRANCH_PATTERN.match(line) and branches:
+            start, end = branches[-1]
+            if end is not None and depth != end:
+                return None
+            branches[-1] = (start, depth)
+            depth = start
+            continue
+        if CONDITIONAL_CLOSE_PATTERN.match(line) and branches:
+            _, end = branches.pop()
+            if end is not None and depth != end:
+                return None
+            continue
+        if line.lstrip().startswith('#'):
+            continue
+        if depth == 0 and pending is None:
+            match = SIGNATURE_PATTERN.match(line)
+            if match and match.group(1) not in NOT_FUNCTIONS:
+                pending = (match.group(1), idx)
+        for char in line:
+            if char == '{':
+                if depth == 0 and pending is not None:
+                    current, pending = pending, None
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth < 0:
+                    return None
+                if depth == 0 and current is not None:
+                    functions.append((current[0], current[1], idx))
+                    current = None
+            elif char == ';' and depth == 0 and pending is not None:
+                # Prototype
+                functions.append((pending[0], pending[1], idx))
+                pending = None
+    if depth != 0:
+        return None
+    return functions
+
+
+def conditionals_balanced(lines) -> bool:
+    depth = 0
+    for line in lines:
+        if CONDITIONAL_OPEN_PATTERN.match(line):
+            depth += 1
+        elif CONDITIONAL_CLOSE_PATTERN.match(line):
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def unreachable_functions(lines):
+    """Return the spans of functions nothing reaches and their names."""
+    functions = find_functions(lines)
+    if not functions:
+        return [], []
+
+    in_function = set()
+    references = {}
+    for name, start, end in functions:
+        in_function.update(range(start, end + 1))
+        names = references.setdefault(name, set())
+        for line in lines[start:end + 1]:
+            names.update(IDENTIFIER_PATTERN.findall(line))
+
+    defined = set(references)
+    roots = {'main'}
+    for idx, line in enumerate(lines):
+        if idx not in in_function:
+            roots.update(name for name in IDENTIFIER_PATTERN.findall(line) if name in defined)
+
+    reachable = set()
+    queue = [name for name in roots if name in defined]
+    while queue:
+        name = queue.pop()
+        if name in reachable:
+            continue
+        reachable.add(name)
+        queue.extend(other for other in references[name] if other in defined and other not in reachable)
+
+    spans = []
+    removed = []
+    for name, start, end in functions:
+        if name in reachable or not conditionals_balanced(lines[start:end + 1]):
+            continue
+        spans.append((start, end))
+        if name not in removed:
+            removed.append(name)
+    return spans, removed
+
+
+def flatten_lines(expanded, target_dir: Path, header: str):
+    """Return the flattened source text lines and the names of removed functions.
+
+    `header` is a comment placed after `#version` saying where the file came from.
+    """
+    stripped = shader_source.strip_comments([line for _, line in expanded])
+    pairs = [(source, line) for (source, _), line in zip(expanded, stripped) if line.strip()]
+    lines = [line for _, line in pairs]
+
+    spans, removed = unreachable_functions(lines)
+    dropped = set()
+    for start, end in spans:
+        dropped.update(range(start, end + 1))
+
+    out = []
+    for idx, (source, line) in enumerate(pairs):
+        if idx in dropped:
+            continue
+        out.append(shader_source.rebase_include_optional(source, line, target_dir))
+        if not idx and VERSION_PATTERN.match(line):
+            out.append(f'// {header}')
+    return out, removed
+
+
+class ShaderFlattener:
+    """Flattens each source once and writes each distinct result once; safe to share between threads."""
+
+    def __init__(self, shaders_dir: Path, verbose=False):
+        self.output_dir = shaders_dir / 'flat'
+        self.verbose = verbose
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._paths = {}
+
+    def flatten(self, shader_file: Path) -> Path:
+        with self._lock:
+            event = self._pending.get(shader_file)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[shader_file] = event
+        if not owner:
+            event.wait()
+            return self._paths[shader_file]
+
+        try:
+            expanded = shader_source.expand_includes(shader_file)
+            header = f'Flattened from {shader_file.name} by scripts/flatten_shaders.py'
+            lines, removed = flatten_lines(expanded, self.output_dir, header)
+            text = '\n'.join(lines) + '\n'
+            digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+            path = self.output_dir / f'{shader_file.stem}-{digest}.slang'
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding='utf-8', newline='\n')
+            if self.verbose:
+                print(f"  Flattened {shader_file.name} -> {path.name} ({len(expanded)} -> {len(lines)} lines)")
+            with self._lock:
+                self._paths[shader_file] = path
+                self.manifest[path.name] = {
+                    'source': shader_file.name,
+                    'lines': [len(expanded), len(lines)],
+                    'removed_functions': removed,
+                }
+        finally:
+            event.set()
+        return path
+
+    def write_manifest(self):
+        if not self.manifest:
+            return
+        manifest_path = self.output_dir / 'flat.json'
+        existing = {}
+        if manifest_path.exists():
+            existing = json.loads(manifest_path.read_text(encoding='utf-8'))
+        existing.update(self.manifest)
+        manifest_path.write_text(json.dumps(existing, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+
+def transform_preset(preset_path: Path, flattener: ShaderFlattener, verbose=False):
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+
+    changed = False
+    for idx in range(slangp.shader_count(values)):
+        shader_path = values.get(f'shader{idx}', '')
+        shader_file = (preset_path.parent / shader_path).resolve()
+        if not shader_file.is_file():
+            print(f"Warning: {shader_path} not found for {preset_path}; keeping it")
+            continue
+        if shader_file.parent == flattener.output_dir.resolve():
+            continue
+        flat = flattener.flatten(shader_file)
+        slangp.replace_value(lines, f'shader{idx}', slangp.relative_preset_path(preset_path, flat), quote=False)
+        changed = True
+
+    if changed:
+        preset_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+        if verbose:
+            print(f"Flattened: {preset_path}")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replace preset passes with flattened, comment-stripped single-file copies')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing shaders/ and presets/')
+    parser.add_argument('--input-dir', type=Path, action='append', default=[], help='Preset folder to flatten (repeatable)')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    flattener = ShaderFlattener(args.root_dir / 'shaders', verbose=args.verbose)
+
+    flattened_presets = 0
+    for input_dir in args.input_dir:
+        if not input_dir.exists():
+            print(f"Warning: Input directory not found: {input_dir}")
+            continue
+        presets = sorted(input_dir.rglob('*.slangp'))
+        print(f"Flattening shaders for {input_dir.name} ({len(presets)} preset(s))")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(transform_preset, preset, flattener, args.verbose) for preset in presets]
+            for future in concurrent.futures.as_completed(futures):
+                if future.result():
+                    flattened_presets += 1
+
+    flattener.write_manifest()
+    print(f"Shader flattening complete: {flattened_presets} preset(s), {len(flattener.manifest)} flattened pass(es).")
+
+
+if __name__ == '__main__':
+    main()
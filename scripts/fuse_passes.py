@@ -0,0 +1,820 @@
+"""
+Fuses a point-wise pass into the pass before it, cutting one full render-target write and read.
+Rules:
+- A pair (A, B) of consecutive passes fuses when B is point-wise: its only
+  sampler is Source, sampled only as `texture(Source, vTexCoord)`, and the pass
+  renders at its input size. A may be any pass that writes a float format (a
+  UNORM target clamps and quantizes, which is part of the signal), that does
+  not read its own feedback, and whose alias nobody else samples.
+- Presets using indexed PassOutputN/PassFeedbackN references are left alone.
+- The fused source expands both passes' includes (each file once), merges the
+  push and UBO blocks (B's members already declared by A are dropped; push
+  members spill to the UBO past 128 bytes), renumbers B's varyings after A's,
+  renames B's declarations that clash with A's, and calls A's then B's stage
+  entry points from a new main. A's output color becomes a global that replaces
+  B's `texture(Source, vTexCoord)`.
+- Fusion is skipped when B's varyings do not fit after A's
+  (MAX_VARYING_LOCATIONS, the Vulkan minimum): moving B's vertex work into the
+  fragment stage would run it once per pixel instead of once per vertex.
+- Fusion is skipped when B would see one of A's macros it does not define the
+  same way, or when a clashing name is also a macro.
+- The fused pass takes A's sampling and scale keys and B's name, format and
+  alias keys; later passes are renumbered. Chains fuse repeatedly.
+- Each shader file is read and expanded once per run, and each pass is
+  parsed and analysed (samplers, feedback and indexed references, tokens)
+  once per run (PassFuser.unit), not once per preset.
+- On the shipped pipelines the only pair these rules accept is beam -> mask
+  (one fused shader for the whole catalogue): most passes render to a UNORM
+  target or change size, and the rest exceed the varying limit.
+- Files go to `shaders/fused/<pass>_<pass>-<sha1[:12]>.slang`, shared across
+  the catalogue by content hash, with a `fused.json` manifest. Run after
+  eliminate_identity_passes.py and before specialize_shaders.py.
+"""
+import argparse
+import concurrent.futures
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+import shader_source
+import slangp
+
+
+PUSH_CONSTANT_LIMIT = 128
+MAX_VARYING_LOCATIONS = 16
+FLOAT_FORMAT_PATTERN = re.compile(r'SFLOAT')
+
+VERSION_PATTERN = re.compile(r'^\s*#version\b')
+NAME_PATTERN = re.compile(r'^\s*#pragma\s+name\s+(\w+)')
+FORMAT_PATTERN = re.compile(r'^\s*#pragma\s+format\s+(\w+)')
+STAGE_PATTERN = re.compile(r'^\s*#pragma\s+stage\s+(vertex|fragment)')
+PARAMETER_PATTERN = re.compile(r'^\s*#pragma\s+parameter\s+(\w+)')
+INCLUDE_OPTIONAL_PATTERN = re.compile(r'^(\s*#pragma\s+include_optional\s+)"([^"]+)"(.*)$')
+DEFINE_PATTERN = re.compile(r'^\s*#\s*define\s+(\w+)(.*)$')
+PREPROCESSOR_PATTERN = re.compile(r'^\s*#\s*(if|ifdef|ifndef|elif|else|endif)\b(.*)$')
+PUSH_PATTERN = re.compile(r'^\s*layout\s*\(\s*push_constant\s*\)\s*uniform\b')
+UBO_PATTERN = re.compile(r'^\s*layout\s*\([^)]*\bbinding\s*=\s*0\b[^)]*\)\s*uniform\s+\w+')
+BLOCK_END_PATTERN = re.compile(r'^\s*\}\s*(\w+)\s*;')
+MEMBER_PATTERN = re.compile(r'^\s*(\w+)\s+(\w+)\s*(\[[^\]]*\])?\s*;')
+VARYING_PATTERN = re.compile(
+    r'^(\s*layout\s*\(\s*location\s*=\s*)(\d+)(\s*\)\s*(?:(?:flat|noperspective|smooth)\s+)?(in|out)\s+(\w+)\s+(\w+)\s*(\[[^\]]*\])?\s*;.*)$'
+)
+SAMPLER_PATTERN = re.compile(r'\buniform\s+sampler\w*\s+(\w+)\s*;')
+STRUCT_PATTERN = re.compile(r'^\s*struct\s+(\w+)')
+FUNCTION_PATTERN = re.compile(r'^\s*(?:(?:const|highp|mediump|lowp|precise)\s+)*([A-Za-z_]\w*)\s+([A-Za-z_]\w*)\s*\(')
+VARIABLE_PATTERN = re.compile(
+    r'^\s*(?:(?:const|highp|mediump|lowp|precise)\s+)*([A-Za-z_]\w*)\s+([A-Za-z_]\w*)\s*(?:\[[^\]]*\])?\s*(?:=|;)'
+)
+SOURCE_FETCH_PATTERN = re.compile(r'\btexture\s*\(\s*Source\s*,\s*vTexCoord\s*\)')
+INDEXED_REFERENCE_PATTERN = re.compile(r'\b(PassOutput|PassFeedback)\d+')
+QUALIFIED_PATTERN = re.compile(r'\b(\w+)\.(\w+)\b')
+TOKEN_PATTERN = re.compile(r'\b[A-Za-z_]\w*\b')
+NOT_TYPES = {'return', 'else', 'layout', 'uniform', 'if', 'for', 'while', 'switch', 'case', 'in', 'out', 'inout'}
+STAGE_BUILTINS = {'main', 'Position', 'TexCoord', 'vTexCoord', 'FragColor', 'Source'}
+
+# std430 (size, alignment) for push constant members
+PUSH_LAYOUT = {
+    'float': (4, 4), 'int': (4, 4), 'uint': (4, 4), 'bool': (4, 4),
+    'vec2': (8, 8), 'ivec2': (8, 8), 'uvec2': (8, 8),
+    'vec3': (12, 16), 'ivec3': (12, 16), 'uvec3': (12, 16),
+    'vec4': (16, 16), 'ivec4': (16, 16), 'uvec4': (16, 16),
+    'mat2': (16, 8), 'mat3': (48, 16), 'mat4': (64, 16),
+}
+
+
+class FusionError(Exception):
+    """Raised when two passes cannot be fused safely."""
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+@functools.lru_cache(maxsize=None)
+def read_lines(path: Path):
+    return tuple(path.read_text(encoding='utf-8').splitlines())
+
+
+def expand_once(path: Path, seen: set):
+    """Like shader_source.expand_includes, but skips files already in `seen` (include-once)."""
+    path = path.resolve()
+    if path in seen:
+        return []
+    seen.add(path)
+    out = []
+    for line in read_lines(path):
+        match = shader_source.INCLUDE_PATTERN.match(line)
+        if match:
+            include_path = shader_source.resolve_include(path, match.group(1))
+            if include_path is not None:
+                out.extend(expand_once(include_path, seen))
+                continue
+        out.append((path, line))
+    return out
+
+
+def code_lines(lines):
+    """Yield (index, code, depth) with comments stripped and the brace depth at line start."""
+    depth = 0
+    in_comment = False
+    for idx, line in enumerate(lines):
+        code = ''
+        pos = 0
+        while pos < len(line):
+            if in_comment:
+                end = line.find('*/', pos)
+                if end < 0:
+                    pos = len(line)
+                else:
+                    in_comment = False
+                    pos = end + 2
+                continue
+            start_block = line.find('/*', pos)
+            start_line = line.find('//', pos)
+            if start_line >= 0 and (start_block < 0 or start_line < start_block):
+                code += line[pos:start_line]
+                break
+            if start_block >= 0:
+                code += line[pos:start_block]
+                in_comment = True
+                pos = start_block + 2
+                continue
+            code += line[pos:]
+            break
+        yield idx, code, depth
+        depth += code.count('{') - code.count('}')
+
+
+def declared_names(lines):
+    """Names of structs, functions, globals and varyings declared at file scope."""
+    names = set()
+    for _, code, depth in code_lines(lines):
+        varying = VARYING_PATTERN.match(code)
+        if varying:
+            names.add(varying.group(6))
+            continue
+        if depth != 0 or code.lstrip().startswith('#') or code.lstrip().startswith('layout'):
+            continue
+        for pattern in (STRUCT_PATTERN, FUNCTION_PATTERN, VARIABLE_PATTERN):
+            match = pattern.match(code)
+            if not match:
+                continue
+            if pattern is STRUCT_PATTERN:
+                names.add(match.group(1))
+            elif match.group(1) not in NOT_TYPES:
+                names.add(match.group(2))
+            break
+    return names
+
+
+def macro_definitions(lines, instances):
+    definitions = {}
+    for line in lines:
+        match = DEFINE_PATTERN.match(line)
+        if match:
+            body = match.group(2).split('//')[0].strip()
+            body = QUALIFIED_PATTERN.sub(lambda m: f'.{m.group(2)}' if m.group(1) in instances else m.group(0), body)
+            definitions.setdefault(match.group(1), set()).add(body)
+    return definitions
+
+
+def struct_slots(lines):
+    """Varying locations used by each struct declared in `lines`."""
+    structs = {}
+    current = None
+    for _, code, _ in code_lines(lines):
+        match = STRUCT_PATTERN.match(code)
+        if match:
+            current = match.group(1)
+            structs[current] = []
+            continue
+        if current is None:
+            continue
+        if '}' in code:
+            current = None
+            continue
+        member = MEMBER_PATTERN.match(code)
+        if member:
+            structs[current].append((member.group(1), member.group(3)))
+    return structs
+
+
+def varying_slots(type_name: str, array: str | None, structs) -> int:
+    count = 1
+    if array:
+        try:
+            count = int(array.strip('[]'))
+        except ValueError as exc:
+            raise FusionError(f'unsized varying array of {type_name}') from exc
+    if re.fullmatch(r'(|i|u|b)vec[234]|float|int|uint|bool', type_name):
+        return count
+    matrix = re.fullmatch(r'mat([234])(?:x[234])?', type_name)
+    if matrix:
+        return count * int(matrix.group(1))
+    if type_name in structs:
+        return count * sum(varying_slots(member, member_array, structs) for member, member_array in structs[type_name])
+    raise FusionError(f'unknown varying type {type_name}')
+
+
+class Block:
+    """A push constant or UBO block: opener lines, entries and the instance name."""
+
+    def __init__(self, kind: str, opener, instance: str):
+        self.kind = kind
+        self.opener = opener
+        self.instance = instance
+        # (name or None, type, condition stack, line)
+        self.entries = []
+
+    def members(self):
+        return {name: (member_type, conditions) for name, member_type, conditions, _ in self.entries if name}
+
+    def push_size(self) -> int:
+        offset = 0
+        for name, member_type, _, _ in self.entries:
+            if not name:
+                continue
+            size, align = PUSH_LAYOUT.get(member_type, (16, 16))
+            offset = (offset + align - 1) // align * align + size
+        return offset
+
+
+class ShaderUnit:
+    """A pass split into its preamble, uniform blocks and the two stages."""
+
+    def __init__(self, stems, lines, included, full_lines):
+        self.stems = stems
+        # Set by PassFuser: what the unit was parsed or fused from
+        self.key = None
+        self.included = included
+        self.full_lines = full_lines
+        self.name = None
+        self.format = None
+        self.preamble = []
+        self.blocks = {}
+        self.vertex = []
+        self.fragment = []
+        self._split([line for _, line in lines], [source for source, _ in lines])
+        # Units are never modified once split; fusable() and fuse() search these many times
+        self.code = '\n'.join(code for _, code, _ in code_lines(self.all_lines()) if not PARAMETER_PATTERN.match(code))
+        self.tokens = set(TOKEN_PATTERN.findall(self.code))
+        self.reads_feedback = any(len(token) > len('Feedback') and token.endswith('Feedback') for token in self.tokens)
+        self.indexed = any(INDEXED_REFERENCE_PATTERN.fullmatch(token) for token in self.tokens)
+        self.sampler_names = {match.group(1) for line in self.all_lines() for match in [SAMPLER_PATTERN.search(line)] if match}
+
+    @classmethod
+    def from_file(cls, path: Path, seen: set):
+        full = [line for _, line in shader_source.expanded_source(path)]
+        lines = expand_once(path, seen)
+        return cls([path.stem], lines, seen, full)
+
+    def _split(self, lines, sources):
+        section = self.preamble
+        idx = 0
+        while idx < len(lines):
+            line = lines[idx]
+            source = sources[idx]
+            optional = INCLUDE_OPTIONAL_PATTERN.match(line)
+            if optional and source is not None:
+                target = (source.parent / optional.group(2)).resolve()
+                line = f'{optional.group(1)}"{target.as_posix()}"{optional.group(3)}'
+            stage = STAGE_PATTERN.match(line)
+            if VERSION_PATTERN.match(line):
+                pass
+            elif NAME_PATTERN.match(line):
+                self.name = NAME_PATTERN.match(line).group(1)
+            elif FORMAT_PATTERN.match(line):
+                self.format = FORMAT_PATTERN.match(line).group(1)
+            elif stage:
+                section = self.vertex if stage.group(1) == 'vertex' else self.fragment
+            elif section is self.preamble and (PUSH_PATTERN.match(line) or UBO_PATTERN.match(line)):
+                kind = 'push' if PUSH_PATTERN.match(line) else 'ubo'
+                idx = self._read_block(kind, lines, idx)
+                self.preamble.append(f'\0{kind}')
+            else:
+                section.append(line)
+            idx += 1
+        if not self.vertex or not self.fragment:
+            raise FusionError('missing vertex or fragment stage')
+
+    def _read_block(self, kind, lines, idx):
+        opener = [lines[idx]]
+        while '{' not in opener[-1]:
+            idx += 1
+            opener.append(lines[idx])
+        block = Block(kind, opener, '')
+        conditions = []
+        idx += 1
+        while idx < len(lines):
+            line = lines[idx]
+            end = BLOCK_END_PATTERN.match(line)
+            if end:
+                block.instance = end.group(1)
+                break
+            directive = PREPROCESSOR_PATTERN.match(line)
+            if directive:
+                keyword = directive.group(1)
+                if keyword in ('if', 'ifdef', 'ifndef'):
+                    conditions.append(f'{keyword} {directive.group(2).split("//")[0].strip()}')
+                elif keyword in ('elif', 'else') and conditions:
+                    conditions[-1] += f' | {keyword} {directive.group(2).split("//")[0].strip()}'
+                elif keyword == 'endif' and conditions:
+                    conditions.pop()
+                block.entries.append((None, None, tuple(conditions), line))
+            else:
+                member = MEMBER_PATTERN.match(line.split('//')[0])
+                if member:
+                    block.entries.append((member.group(2), member.group(1), tuple(conditions), line))
+                else:
+                    block.entries.append((None, None, tuple(conditions), line))
+            idx += 1
+        self.blocks[kind] = block
+        return idx
+
+    def all_lines(self):
+        return self.preamble + self.vertex + self.fragment
+
+    def samplers(self):
+        return self.sampler_names
+
+    def references(self, pattern) -> bool:
+        """Search code only: comments and parameter labels often name other passes."""
+        return pattern.search(self.code) is not None
+
+    def names(self, *names) -> bool:
+        """True when code (as in references) uses any of `names` as an identifier."""
+        return not self.tokens.isdisjoint(names)
+
+
+def rename(lines, mapping):
+    if not mapping:
+        return list(lines)
+    pattern = re.compile(r'(?<![.\w])(' + '|'.join(map(re.escape, mapping)) + r')\b')
+    return [pattern.sub(lambda m: mapping[m.group(1)], line) for line in lines]
+
+
+def requalify(lines, instances, locations):
+    def replace(match):
+        instance, member = match.group(1), match.group(2)
+        if instance in instances and member in locations:
+            return f'{locations[member]}.{member}'
+        return match.group(0)
+    return [QUALIFIED_PATTERN.sub(replace, line) for line in lines]
+
+
+def check_pointwise(unit: ShaderUnit):
+    if unit.samplers() != {'Source'}:
+        raise FusionError('downstream pass samples more than Source')
+    if any(re.search(r'\bSource\b', line) for line in unit.vertex):
+        raise FusionError('downstream vertex stage reads Source')
+    for line in unit.fragment:
+        if SAMPLER_PATTERN.search(line):
+            continue
+        if re.search(r'\bSource\b', SOURCE_FETCH_PATTERN.sub('', line)):
+            raise FusionError('downstream pass reads Source away from vTexCoord')
+
+
+def merge_blocks(first: ShaderUnit, second: ShaderUnit):
+    """Return merged blocks and member -> instance map."""
+    merged = {}
+    declared = {}
+    for kind in ('push', 'ubo'):
+        block = first.blocks.get(kind)
+        if block is None:
+            continue
+        copy = Block(kind, block.opener, block.instance)
+        copy.entries = list(block.entries)
+        merged[kind] = copy
+        for name, (member_type, conditions) in block.members().items():
+            declared[name] = (member_type, conditions)
+
+    for kind in ('push', 'ubo'):
+        block = second.blocks.get(kind)
+        if block is None:
+            continue
+        target = merged.get(kind)
+        if target is None:
+            target = Block(kind, block.opener, block.instance)
+            merged[kind] = target
+        for name, member_type, conditions, line in block.entries:
+            if name and name in declared:
+                first_type, first_conditions = declared[name]
+                if first_type != member_type:
+                    raise FusionError(f'{name} declared as {first_type} and {member_type}')
+                if first_conditions and first_conditions != conditions:
+                    raise FusionError(f'{name} declared under different conditions')
+                continue
+            if name:
+                declared[name] = (member_type, conditions)
+            target.entries.append((name, member_type, conditions, line))
+
+    push = merged.get('push')
+    ubo = merged.get('ubo')
+    if push is not None and push.push_size() > PUSH_CONSTANT_LIMIT:
+        if ubo is None:
+            raise FusionError('push constants exceed 128 bytes and there is no UBO')
+        for entry in reversed(list(push.entries)):
+            if push.push_size() <= PUSH_CONSTANT_LIMIT:
+                break
+            name, _, conditions, _ = entry
+            if name and not conditions:
+                push.entries.remove(entry)
+                ubo.entries.append(entry)
+        if push.push_size() > PUSH_CONSTANT_LIMIT:
+            raise FusionError('push constants exceed 128 bytes')
+
+    locations = {}
+    for block in merged.values():
+        for name in block.members():
+            locations[name] = block.instance
+    return merged, locations
+
+
+def block_lines(block: Block):
+    return block.opener + [line for _, _, _, line in block.entries] + [f'}} {block.instance};']
+
+
+def relocate(lines, shift):
+    out = []
+    for line in lines:
+        match = VARYING_PATTERN.match(line)
+        if match and match.group(6) != 'vTexCoord':
+            line = f'{match.group(1)}{int(match.group(2)) + shift}{match.group(3)}'
+        out.append(line)
+    return out
+
+
+def entry_point(calls):
+    return ['', 'void main()', '{'] + [f'    {call}();' for call in calls] + ['}']
+
+
+def varying_extent(lines, structs):
+    extent = 0
+    for line in lines:
+        match = VARYING_PATTERN.match(line)
+        if match and match.group(4) == 'out':
+            slots = varying_slots(match.group(5), match.group(7), structs)
+            extent = max(extent, int(match.group(2)) + slots)
+    return extent
+
+
+def fuse(first: ShaderUnit, second: ShaderUnit, serial: int, max_varyings: int = MAX_VARYING_LOCATIONS) -> ShaderUnit:
+    check_pointwise(second)
+    if first.names('discard'):
+        raise FusionError('upstream pass discards fragments')
+
+    prefix = f'fuse{serial}_'
+    instances = {block.instance for unit in (first, second) for block in unit.blocks.values()}
+    # Block members end up in one merged block, so `config.X` and `global.X` agree
+    first_macros = macro_definitions(first.full_lines, instances)
+    second_macros = macro_definitions(second.full_lines, instances)
+    second_tokens = {
+        token
+        for line in second.all_lines() if not PARAMETER_PATTERN.match(line)
+        for token in TOKEN_PATTERN.findall(line.split('//')[0])
+    }
+    for name, definitions in first_macros.items():
+        if name in second_tokens and second_macros.get(name) != definitions:
+            raise FusionError(f'macro {name} from the upstream pass leaks into the downstream pass')
+
+    first_names = declared_names(first.all_lines())
+    second_names = declared_names(second.all_lines())
+    clashes = (first_names & second_names) - STAGE_BUILTINS
+    if clashes & (set(first_macros) | set(second_macros)):
+        raise FusionError('clashing name is also a macro')
+    mapping = {name: prefix + name for name in clashes}
+    mapping['main'] = f'{prefix}second'
+
+    merged, locations = merge_blocks(first, second)
+
+    structs = struct_slots(first.full_lines + second.full_lines)
+    first_extent = varying_extent(first.vertex, structs)
+    second_extent = varying_extent(second.vertex, structs)
+    if first_extent + max(second_extent - 1, 0) > max_varyings:
+        raise FusionError('too many varyings')
+    shift = max(first_extent - 1, 0)
+
+    # Upstream pass: entry points renamed, output color kept in a private global
+    color = f'{prefix}color'
+    first_vertex = rename(first.vertex, {'main': f'{prefix}first'})
+    first_fragment = []
+    for line in rename(first.fragment, {'main': f'{prefix}first', 'FragColor': color}):
+        match = VARYING_PATTERN.match(line)
+        if match and match.group(4) == 'out' and match.group(6) == color:
+            first_fragment.append(f'{match.group(1)}{match.group(2)}) out vec4 FragColor;')
+            first_fragment.append(f'vec4 {color};')
+        else:
+            first_fragment.append(line)
+    if not any(f'vec4 {color};' == line for line in first_fragment):
+        raise FusionError('upstream pass does not write FragColor')
+
+    # Downstream pass: shared declarations dropped, varyings moved after A's
+    second_vertex = []
+    for line in rename(second.vertex, mapping):
+        match = VARYING_PATTERN.match(line)
+        if match and match.group(6) in ('Position', 'TexCoord', 'vTexCoord'):
+            continue
+        second_vertex.append(line)
+    second_fragment = []
+    for line in rename(second.fragment, mapping):
+        match = VARYING_PATTERN.match(line)
+        if match and match.group(6) in ('vTexCoord', 'FragColor'):
+            continue
+        if SAMPLER_PATTERN.search(line):
+            continue
+        second_fragment.append(SOURCE_FETCH_PATTERN.sub(color, line))
+    second_vertex = relocate(second_vertex, shift)
+    second_fragment = relocate(second_fragment, shift)
+
+    first_optional = {INCLUDE_OPTIONAL_PATTERN.match(line).group(2) for line in first.preamble if INCLUDE_OPTIONAL_PATTERN.match(line)}
+    second_preamble = []
+    for line in rename(second.preamble, mapping):
+        optional = INCLUDE_OPTIONAL_PATTERN.match(line)
+        if line.startswith('\0') or (optional and optional.group(2) in first_optional):
+            continue
+        second_preamble.append(line)
+
+    preamble = []
+    emitted = set()
+    for line in first.preamble:
+        if line.startswith('\0'):
+            for kind in ('push', 'ubo'):
+                if kind in merged and kind not in emitted and (kind == line[1:] or kind == 'push'):
+                    preamble.extend(block_lines(merged[kind]))
+                    emitted.add(kind)
+            continue
+        preamble.append(line)
+    for kind in ('push', 'ubo'):
+        if kind in merged and kind not in emitted:
+            preamble.extend(block_lines(merged[kind]))
+    preamble.extend(second_preamble)
+
+    calls = [f'{prefix}first', f'{prefix}second']
+    vertex = requalify(first_vertex + [''] + second_vertex + entry_point(calls), instances, locations)
+    fragment = requalify(first_fragment + [''] + second_fragment + entry_point(calls), instances, locations)
+    preamble = requalify(preamble, instances, locations)
+
+    lines = ['#version 450', '']
+    if second.name:
+        lines.append(f'#pragma name {second.name}')
+    if second.format:
+        lines.append(f'#pragma format {second.format}')
+    lines.extend(preamble)
+    lines.append('#pragma stage vertex')
+    lines.extend(vertex)
+    lines.append('#pragma stage fragment')
+    lines.extend(fragment)
+
+    # `second` was expanded against a copy of A's include set, so it holds both
+    return ShaderUnit(first.stems + second.stems, [(None, line) for line in lines], second.included, lines)
+
+
+def render(unit: ShaderUnit, target_dir: Path) -> str:
+    """Final source text with include_optional paths relative to the output folder."""
+    lines = ['#version 450', '', f'// Fused by scripts/fuse_passes.py: {" + ".join(unit.stems)}', '']
+    if unit.name:
+        lines.append(f'#pragma name {unit.name}')
+    if unit.format:
+        lines.append(f'#pragma format {unit.format}')
+    for line in unit.preamble:
+        if line.startswith('\0'):
+            lines.extend(block_lines(unit.blocks[line[1:]]))
+            continue
+        optional = INCLUDE_OPTIONAL_PATTERN.match(line)
+        if optional:
+            relative = Path(os.path.relpath(Path(optional.group(2)), target_dir)).as_posix()
+            line = f'{optional.group(1)}"{relative}"{optional.group(3)}'
+        lines.append(line)
+    lines.append('#pragma stage vertex')
+    lines.extend(unit.vertex)
+    lines.append('#pragma stage fragment')
+    lines.extend(unit.fragment)
+    # Dropped declarations leave runs of blank lines behind
+    lines = [line for idx, line in enumerate(lines) if line.strip() or idx == 0 or lines[idx - 1].strip()]
+    return '\n'.join(lines) + '\n'
+
+
+class PassFuser:
+    """Writes each distinct fused source once; safe to share between threads."""
+
+    def __init__(self, shaders_dir: Path, max_varyings=MAX_VARYING_LOCATIONS, verbose=False):
+        self.output_dir = shaders_dir / 'fused'
+        self.max_varyings = max_varyings
+        self.verbose = verbose
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._units = {}
+        self._texts = {}
+
+    def unit(self, path: Path, included=frozenset()) -> ShaderUnit:
+        """The parsed shader at `path`, expanded against `included`; parsed once and shared."""
+        key = (path, frozenset(included))
+        with self._lock:
+            unit = self._units.get(key)
+        if unit is None:
+            # A FusionError is cached too, so a broken shader is reported without re-reading it
+            try:
+                unit = ShaderUnit.from_file(path, set(included))
+            except FusionError as exc:
+                unit = exc
+            else:
+                unit.key = key
+            with self._lock:
+                unit = self._units.setdefault(key, unit)
+        if isinstance(unit, FusionError):
+            raise unit
+        return unit
+
+    def fuse(self, first: ShaderUnit, second: ShaderUnit, serial: int) -> ShaderUnit:
+        """fuse() for units from unit() or fuse(); presets sharing a chain fuse it once."""
+        key = (first.key, second.key, serial)
+        with self._lock:
+            unit = self._units.get(key)
+        if unit is None:
+            try:
+                unit = fuse(first, second, serial, self.max_varyings)
+            except FusionError as exc:
+                unit = exc
+            else:
+                unit.key = key
+            with self._lock:
+                unit = self._units.setdefault(key, unit)
+        if isinstance(unit, FusionError):
+            raise unit
+        return unit
+
+    def write(self, unit: ShaderUnit) -> Path:
+        with self._lock:
+            text = self._texts.get(unit.key)
+        if text is None:
+            text = render(unit, self.output_dir)
+            with self._lock:
+                text = self._texts.setdefault(unit.key, text)
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+        path = self.output_dir / f'{"_".join(unit.stems)}-{digest}.slang'
+        with self._lock:
+            event = self._pending.get(path)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[path] = event
+        if not owner:
+            event.wait()
+            return path
+
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding='utf-8', newline='\n')
+            if self.verbose:
+                print(f"  Fused {' + '.join(unit.stems)} -> {path.name}")
+            with self._lock:
+                self.manifest[path.name] = {'passes': [f'{stem}.slang' for stem in unit.stems]}
+        finally:
+            event.set()
+        return path
+
+    def write_manifest(self):
+        if not self.manifest:
+            return
+        manifest_path = self.output_dir / 'fused.json'
+        existing = {}
+        if manifest_path.exists():
+            existing = json.loads(manifest_path.read_text(encoding='utf-8'))
+        existing.update(self.manifest)
+        manifest_path.write_text(json.dumps(existing, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+
+def pass_aliases(unit: ShaderUnit, values: dict, idx: int):
+    names = {unit.name} if unit.name else set()
+    if values.get(f'alias{idx}'):
+        names.add(values[f'alias{idx}'])
+    return names
+
+
+def writes_float(unit: ShaderUnit, values: dict, idx: int) -> bool:
+    if unit.format:
+        return bool(FLOAT_FORMAT_PATTERN.search(unit.format))
+    return values.get(f'float_framebuffer{idx}', 'false') == 'true'
+
+
+def fusable(units, values, idx) -> bool:
+    first, second = units[idx], units[idx + 1]
+    if not slangp.pass_keeps_size(values, idx + 1):
+        return False
+    if not writes_float(first, values, idx) or first.reads_feedback:
+        return False
+    if second.names('SourceSize') and not slangp.pass_keeps_size(values, idx):
+        return False
+    names = [f'{alias}{suffix}' for alias in pass_aliases(first, values, idx) for suffix in ('', 'Size', 'Feedback')]
+    return not any(unit.names(*names) for position, unit in enumerate(units) if position != idx)
+
+
+def move_pass_keys(lines, source_idx, target_idx, keys):
+    """Replace pass `target_idx`'s `keys` with pass `source_idx`'s, keeping the line text."""
+    out = []
+    for line in lines:
+        key = (slangp.split_assignment(line) or ('',))[0]
+        if key in {f'{name}{target_idx}' for name in keys}:
+            continue
+        if key in {f'{name}{source_idx}' for name in keys}:
+            line = line.replace(key, key[: -len(str(source_idx))] + str(target_idx), 1)
+        out.append(line)
+    lines[:] = out
+
+
+def transform_preset(preset_path: Path, fuser: PassFuser, verbose=False):
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+    count = slangp.shader_count(values)
+
+    units = []
+    for idx in range(count):
+        shader_path = values.get(f'shader{idx}', '')
+        shader_file = (preset_path.parent / shader_path).resolve()
+        if not shader_file.is_file():
+            print(f"Warning: {shader_path} not found for {preset_path}; skipping fusion")
+            return 0
+        try:
+            units.append(fuser.unit(shader_file))
+        except FusionError as exc:
+            print(f"Warning: cannot read {shader_path} for {preset_path} ({exc}); skipping fusion")
+            return 0
+    if any(unit.indexed for unit in units):
+        return 0
+
+    fused_count = 0
+    idx = 0
+    serial = 0
+    while idx < len(units) - 1:
+        first = units[idx]
+        if not fusable(units, values, idx):
+            idx += 1
+            continue
+        try:
+            # Re-expand the downstream pass against the includes A already pulled in
+            second = fuser.unit((preset_path.parent / values[f'shader{idx + 1}']).resolve(), first.included)
+            unit = fuser.fuse(first, second, serial)
+        except FusionError as exc:
+            if verbose:
+                print(f"  Not fusing passes {idx} and {idx + 1} of {preset_path.name}: {exc}")
+            idx += 1
+            continue
+        serial += 1
+        move_pass_keys(lines, idx + 1, idx, ('alias', 'float_framebuffer', 'srgb_framebuffer'))
+        lines = slangp.reindex_passes(lines, {idx + 1}, len(units))
+        values = slangp.values_from_lines(lines)
+        units[idx:idx + 2] = [unit]
+        fused_count += 1
+
+    if fused_count:
+        # Only the end of each chain is written; intermediate fusions are never used
+        for idx, unit in enumerate(units):
+            if len(unit.stems) > 1:
+                fused_path = fuser.write(unit)
+                slangp.replace_value(lines, f'shader{idx}', slangp.relative_preset_path(preset_path, fused_path), quote=False)
+        preset_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+        if verbose:
+            print(f"Fused {fused_count} pass pair(s): {preset_path}")
+    return fused_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fuse point-wise passes into their predecessors in generated presets')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing shaders/ and presets/')
+    parser.add_argument('--input-dir', type=Path, action='append', default=[], help='Preset folder to process (repeatable)')
+    parser.add_argument(
+        '--max-varyings',
+        type=int,
+        default=MAX_VARYING_LOCATIONS,
+        help=f'Varying locations a fused pass may use (default: {MAX_VARYING_LOCATIONS}, the Vulkan minimum)',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    fuser = PassFuser(args.root_dir / 'shaders', max_varyings=args.max_varyings, verbose=args.verbose)
+    total = 0
+    for input_dir in args.input_dir:
+        if not input_dir.exists():
+            print(f"Warning: Input directory not found: {input_dir}")
+            continue
+        presets = sorted(input_dir.rglob('*.slangp'))
+        print(f"Fusing passes for {input_dir.name} ({len(presets)} preset(s))")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(transform_preset, preset, fuser, args.verbose) for preset in presets]
+            for future in concurrent.futures.as_completed(futures):
+                total += future.result()
+
+    fuser.write_manifest()
+    print(f"Pass fusion complete: {total} pair(s) fused, {len(fuser.manifest)} fused shader(s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,13 @@ Rules:
 - steamdeck-lcd: Source from uhd-4k-sdr, cap TVL to 400
 - steamdeck-oled-native: Source from uhd-4k-wcg, cap TVL to 400, add GAMUT_SELECT = 1.0
 """
-import concurrent.futures
 import os
 from pathlib import Path
 import argparse
 
+import build_trace
+import preset_stream
+
 
 ## -fhd suffix logic removed (mipmaps supported)
 
@@ -28,110 +30,99 @@ def transform_preset(input_path: Path, output_path: Path, add_gamut_select=False
     if verbose:
         print(f"Transforming {input_path} -> {output_path}")
     
-    lines = input_path.read_text(encoding='utf-8').splitlines()
-    transformed_lines = []
-    gamut_select_added = False
-    zoom_found = False
-    bezel_zoom_found = False
-
-    for line in lines:
-        # Check if this line sets a parameter
-        if '=' in line:
-            key, value = line.split('=', 1)
-            key = key.strip()
-            value = value.strip().strip('"')
-
-            # Cap TVL to 400 if it's greater
-            if key == 'TVL':
-                try:
-                    tvl_value = float(value)
-                    if tvl_value > 320.0:
+    # Only add GAMUT_SELECT when the preset does not set it already
+    insert_gamut_select = add_gamut_select and not any('GAMUT_SELECT' in line for line in preset_stream.lines(input_path))
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open('w', encoding='utf-8', newline='\n') as out:
+        zoom_found = False
+        bezel_zoom_found = False
+
+        for line in preset_stream.lines(input_path):
+            # Add GAMUT_SELECT = 1.0 for OLED presets before the first shader line
+            if insert_gamut_select and line.strip().startswith('shader'):
+                if verbose:
+                    print("  Added: GAMUT_SELECT = 1.0")
+                out.write('GAMUT_SELECT = "1.0"\n')
+                insert_gamut_select = False
+
+            # Check if this line sets a parameter
+            if '=' in line:
+                key, value = line.split('=', 1)
+                key = key.strip()
+                value = value.strip().strip('"')
+
+                # Cap TVL to 400 if it's greater
+                if key == 'TVL':
+                    try:
+                        tvl_value = float(value)
+                        if tvl_value > 320.0:
+                            if verbose:
+                                print(f"  Capped: TVL = {tvl_value} -> 320.0")
+                            out.write('TVL = "320.0"\n')
+                        else:
+                            out.write(line + '\n')
+                    except ValueError:
+                        # If we can't parse as float, keep the line as is
+                        out.write(line + '\n')
+                elif key == 'BORDER' and is_share_path(value):
+                    out.write(line + '\n')
+                elif key == 'ZOOM':
+                    try:
+                        zoom_value = float(value)
+                        new_zoom = int(round(zoom_value * 1.06))
                         if verbose:
-                            print(f"  Capped: TVL = {tvl_value} -> 320.0")
-                        transformed_lines.append('TVL = "320.0"')
-                    else:
-                        transformed_lines.append(line)
-                except ValueError:
-                    # If we can't parse as float, keep the line as is
-                    transformed_lines.append(line)
-            elif key == 'BORDER' and is_share_path(value):
-                transformed_lines.append(line)
-            elif key == 'ZOOM':
-                try:
-                    zoom_value = float(value)
-                    new_zoom = int(round(zoom_value * 1.06))
-                    if verbose:
-                        print(f"  Increased: ZOOM = {zoom_value} -> {new_zoom}")
-                    transformed_lines.append(f'ZOOM = "{new_zoom}"')
-                    zoom_found = True
-                except ValueError:
-                    transformed_lines.append(line)
-            elif key == 'BEZEL_ZOOM':
-                try:
-                    bezel_zoom_value = float(value)
-                    new_bezel_zoom = int(round(bezel_zoom_value * 1.06))
-                    if verbose:
-                        print(f"  Increased: BEZEL_ZOOM = {bezel_zoom_value} -> {new_bezel_zoom}")
-                    transformed_lines.append(f'BEZEL_ZOOM = "{new_bezel_zoom}"')
-                    bezel_zoom_found = True
-                except ValueError:
-                    transformed_lines.append(line)
+                            print(f"  Increased: ZOOM = {zoom_value} -> {new_zoom}")
+                        out.write(f'ZOOM = "{new_zoom}"\n')
+                        zoom_found = True
+                    except ValueError:
+                        out.write(line + '\n')
+                elif key == 'BEZEL_ZOOM':
+                    try:
+                        bezel_zoom_value = float(value)
+                        new_bezel_zoom = int(round(bezel_zoom_value * 1.06))
+                        if verbose:
+                            print(f"  Increased: BEZEL_ZOOM = {bezel_zoom_value} -> {new_bezel_zoom}")
+                        out.write(f'BEZEL_ZOOM = "{new_bezel_zoom}"\n')
+                        bezel_zoom_found = True
+                    except ValueError:
+                        out.write(line + '\n')
+                else:
+                    out.write(line + '\n')
             else:
-                transformed_lines.append(line)
-        else:
-            transformed_lines.append(line)
-
-    # If ZOOM or BEZEL_ZOOM were not found, add them with value 106.0
-    if not zoom_found:
-        if verbose:
-            print("  Added: ZOOM = 106.0 (default, not found in preset)")
-        transformed_lines.append('ZOOM = "106.0"')
-    if not bezel_zoom_found:
-        if verbose:
-            print("  Added: BEZEL_ZOOM = 106.0 (default, not found in preset)")
-        transformed_lines.append('BEZEL_ZOOM = "106.0"')
-    
-    # Add GAMUT_SELECT = 1.0 for OLED presets (insert before the first shader line or at the end)
-    if add_gamut_select:
-        # Find the position to insert GAMUT_SELECT (before first shader line)
-        insert_pos = len(transformed_lines)
-        for i, line in enumerate(transformed_lines):
-            if line.strip().startswith('shader'):
-                insert_pos = i
-                break
-        
-        # Check if GAMUT_SELECT already exists
-        has_gamut_select = any('GAMUT_SELECT' in line for line in transformed_lines)
-        
-        if not has_gamut_select:
+                out.write(line + '\n')
+
+        # If ZOOM or BEZEL_ZOOM were not found, add them with value 106.0
+        if not zoom_found:
             if verbose:
-                print(f"  Added: GAMUT_SELECT = 1.0")
-            transformed_lines.insert(insert_pos, 'GAMUT_SELECT = "1.0"')
-    
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text('\n'.join(transformed_lines) + '\n', encoding='utf-8')
+                print("  Added: ZOOM = 106.0 (default, not found in preset)")
+            out.write('ZOOM = "106.0"\n')
+        if not bezel_zoom_found:
+            if verbose:
+                print("  Added: BEZEL_ZOOM = 106.0 (default, not found in preset)")
+            out.write('BEZEL_ZOOM = "106.0"\n')
+
+        # No shader line: GAMUT_SELECT goes at the end
+        if insert_gamut_select:
+            if verbose:
+                print("  Added: GAMUT_SELECT = 1.0")
+            out.write('GAMUT_SELECT = "1.0"\n')
 
 
 def process_preset_folder(input_dir: Path, output_dir: Path, add_gamut_select=False, verbose=False, jobs=1):
     """Process all presets in a folder."""
-    presets = list(input_dir.rglob('*.slangp'))
-    
-    if not presets:
-        print(f"No presets found in {input_dir}")
-        return
-    
-    if verbose:
-        print(f"Found {len(presets)} preset(s) in {input_dir}")
-    
     def run_one(preset: Path):
         rel_path = preset.relative_to(input_dir)
         output_path = output_dir / rel_path
-        transform_preset(preset, output_path, add_gamut_select=add_gamut_select, verbose=verbose)
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
-        futures = [executor.submit(run_one, preset) for preset in presets]
-        for future in concurrent.futures.as_completed(futures):
-            future.result()
+        with build_trace.span(f'{output_dir.name}:{rel_path.as_posix()}', output_dir.name, reads=[preset], writes=[output_path]):
+            transform_preset(preset, output_path, add_gamut_select=add_gamut_select, verbose=verbose)
+
+    # Stream the folder with a bounded number of presets in flight
+    count = sum(1 for _ in preset_stream.map_bounded(run_one, preset_stream.walk(input_dir), jobs))
+    if not count:
+        print(f"No presets found in {input_dir}")
+    elif verbose:
+        print(f"Processed {count} preset(s) in {input_dir}")
 
 
 def main():
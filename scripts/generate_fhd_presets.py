@@ -4,11 +4,13 @@ Rules:
 - Scan uhd-4k-sdr and uhd-4k-hdr for all .slangp files recursively.
 - Write outputs to fhd-sdr and fhd-hdr with matching directory structure and filenames.
 """
-import concurrent.futures
 import os
 from pathlib import Path
 import argparse
 
+import build_trace
+import preset_stream
+
 
 ## -fhd suffix logic removed (mipmaps supported)
 
@@ -26,56 +28,46 @@ def transform_preset(input_path: Path, output_path: Path, verbose=False):
     if verbose:
         print(f"Transforming {input_path} -> {output_path}")
     
-    lines = input_path.read_text(encoding='utf-8').splitlines()
-    transformed_lines = []
-    
-    for line in lines:
-        if '=' in line:
-            key, value = line.split('=', 1)
-            key = key.strip()
-            value = value.strip().strip('"')
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open('w', encoding='utf-8', newline='\n') as out:
+        for line in preset_stream.lines(input_path):
+            if '=' in line:
+                key, value = line.split('=', 1)
+                key = key.strip()
+                value = value.strip().strip('"')
             
-            # Cap TVL to 640 if it's greater
-            if key == 'TVL':
-                try:
-                    tvl_value = float(value)
-                    if tvl_value > 640.0:
-                        if verbose:
-                            print(f"  Capped: TVL = {tvl_value} -> 640.0")
-                        transformed_lines.append('TVL = "640.0"')
-                    else:
-                        transformed_lines.append(line)
-                except ValueError:
-                    # If we can't parse as float, keep the line as is
-                    transformed_lines.append(line)
+                # Cap TVL to 640 if it's greater
+                if key == 'TVL':
+                    try:
+                        tvl_value = float(value)
+                        if tvl_value > 640.0:
+                            if verbose:
+                                print(f"  Capped: TVL = {tvl_value} -> 640.0")
+                            out.write('TVL = "640.0"\n')
+                        else:
+                            out.write(line + '\n')
+                    except ValueError:
+                        # If we can't parse as float, keep the line as is
+                        out.write(line + '\n')
+                else:
+                    out.write(line + '\n')
             else:
-                transformed_lines.append(line)
-        else:
-            transformed_lines.append(line)
-    
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text('\n'.join(transformed_lines) + '\n', encoding='utf-8')
+                out.write(line + '\n')
 
 def process_preset_folder(input_dir: Path, output_dir: Path, verbose=False, jobs=1):
     """Process all presets in a folder."""
-    presets = list(input_dir.rglob('*.slangp'))
-    
-    if not presets:
-        print(f"No presets found in {input_dir}")
-        return
-    
-    if verbose:
-        print(f"Found {len(presets)} preset(s) in {input_dir}")
-    
     def run_one(preset: Path):
         rel_path = preset.relative_to(input_dir)
         output_path = output_dir / rel_path
-        transform_preset(preset, output_path, verbose=verbose)
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
-        futures = [executor.submit(run_one, preset) for preset in presets]
-        for future in concurrent.futures.as_completed(futures):
-            future.result()
+        with build_trace.span(f'{output_dir.name}:{rel_path.as_posix()}', output_dir.name, reads=[preset], writes=[output_path]):
+            transform_preset(preset, output_path, verbose=verbose)
+
+    # Stream the folder with a bounded number of presets in flight
+    count = sum(1 for _ in preset_stream.map_bounded(run_one, preset_stream.walk(input_dir), jobs))
+    if not count:
+        print(f"No presets found in {input_dir}")
+    elif verbose:
+        print(f"Processed {count} preset(s) in {input_dir}")
 
 def main():
     parser = argparse.ArgumentParser(description='Generate FHD presets from UHD-4K presets')
@@ -6,12 +6,13 @@ Rules:
 - Verify the replaced shader file exists and warn if not found.
 - Write outputs to uhd-4k-hdr with matching directory structure and filenames.
 """
-import concurrent.futures
 import os
-import sys
 from pathlib import Path
 import argparse
 
+import build_trace
+import preset_stream
+
 def default_workers():
     count = os.cpu_count() or 4
     return max(1, min(32, count))
@@ -19,11 +20,10 @@ def default_workers():
 def transform_preset(input_path: Path, output_path: Path, root_dir: Path, verbose=False):
     if verbose:
         print(f"Transforming {input_path} -> {output_path}")
-    lines = input_path.read_text(encoding='utf-8').splitlines()
     # RetroArch HDR bug: final pass scale_type can break preset recognition.
     # We remove scale_type for the last pass (index shaders_count - 1).
     shaders_count = None
-    for line in lines:
+    for line in preset_stream.lines(input_path):
         if line.strip().startswith('shaders') and '=' in line:
             _, value = line.split('=', 1)
             try:
@@ -34,49 +34,45 @@ def transform_preset(input_path: Path, output_path: Path, root_dir: Path, verbos
     last_scale_type_key = None
     if shaders_count is not None and shaders_count > 0:
         last_scale_type_key = f"scale_type{shaders_count - 1}"
-    transformed_lines = []
-    for line in lines:
-        if last_scale_type_key and '=' in line:
-            key, _ = line.split('=', 1)
-            if key.strip() == last_scale_type_key:
-                if verbose:
-                    print(f"  Removed: {last_scale_type_key} (RetroArch HDR workaround)")
-                continue
-        if line.strip().startswith('shader') and '=' in line:
-            prefix, shader_path = line.split('=', 1)
-            shader_path = shader_path.strip()
-            if shader_path.endswith('-sdr.slang'):
-                hdr_path = shader_path.replace('-sdr.slang', '-hdr.slang')
-                # Always resolve relative to root_dir/shaders
-                hdr_path_norm = Path(hdr_path)
-                # Remove leading ..\ or ../
-                hdr_path_parts = []
-                found_shaders = False
-                for part in hdr_path_norm.parts:
-                    if part == '..':
-                        continue
-                    if not found_shaders and part.lower() == 'shaders':
-                        found_shaders = True
-                        continue
-                    if found_shaders:
-                        hdr_path_parts.append(part)
-                hdr_rel = Path(*hdr_path_parts)
-                resolved_hdr = (root_dir / 'shaders' / hdr_rel).resolve()
-                if resolved_hdr.exists():
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open('w', encoding='utf-8', newline='\n') as out:
+        for line in preset_stream.lines(input_path):
+            if last_scale_type_key and '=' in line:
+                key, _ = line.split('=', 1)
+                if key.strip() == last_scale_type_key:
                     if verbose:
-                        print(f"  Replaced: {shader_path} -> {hdr_path}")
-                    transformed_lines.append(f"{prefix.strip()} = {hdr_path}")
+                        print(f"  Removed: {last_scale_type_key} (RetroArch HDR workaround)")
+                    continue
+            if line.strip().startswith('shader') and '=' in line:
+                prefix, shader_path = line.split('=', 1)
+                shader_path = shader_path.strip()
+                if shader_path.endswith('-sdr.slang'):
+                    hdr_path = shader_path.replace('-sdr.slang', '-hdr.slang')
+                    # Always resolve relative to root_dir/shaders
+                    hdr_path_norm = Path(hdr_path)
+                    # Keep what follows the last `shaders` folder, so paths that pass
+                    # through another one (e.g. RetroArch's shaders/) still resolve
+                    hdr_path_parts = []
+                    for part in hdr_path_norm.parts:
+                        if part.lower() == 'shaders':
+                            hdr_path_parts = []
+                        elif part != '..':
+                            hdr_path_parts.append(part)
+                    hdr_rel = Path(*hdr_path_parts)
+                    resolved_hdr = (root_dir / 'shaders' / hdr_rel).resolve()
+                    if resolved_hdr.exists():
+                        if verbose:
+                            print(f"  Replaced: {shader_path} -> {hdr_path}")
+                        out.write(f"{prefix.strip()} = {hdr_path}\n")
+                    else:
+                        print(f"Warning: HDR shader not found: {resolved_hdr} (referenced in {input_path})")
+                        if verbose:
+                            print(f"  Keeping original: {shader_path} (HDR not found)")
+                        out.write(line + '\n')
                 else:
-                    print(f"Warning: HDR shader not found: {resolved_hdr} (referenced in {input_path})")
-                    if verbose:
-                        print(f"  Keeping original: {shader_path} (HDR not found)")
-                    transformed_lines.append(line)
+                    out.write(line + '\n')
             else:
-                transformed_lines.append(line)
-        else:
-            transformed_lines.append(line)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text('\n'.join(transformed_lines) + '\n', encoding='utf-8')
+                out.write(line + '\n')
 
 def main():
     parser = argparse.ArgumentParser(description='Generate HDR presets from SDR presets')
@@ -91,17 +87,16 @@ def main():
     hdr_dir = args.output_dir
     root_dir = args.root_dir
     jobs = max(1, args.jobs)
-    sdr_presets = list(sdr_dir.rglob('*.slangp'))
 
     def run_one(sdr_preset: Path):
         rel_path = sdr_preset.relative_to(sdr_dir)
         hdr_preset = hdr_dir / rel_path
-        transform_preset(sdr_preset, hdr_preset, root_dir=root_dir, verbose=args.verbose)
+        with build_trace.span(f'{hdr_dir.name}:{rel_path.as_posix()}', hdr_dir.name, reads=[sdr_preset], writes=[hdr_preset]):
+            transform_preset(sdr_preset, hdr_preset, root_dir=root_dir, verbose=args.verbose)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
-        futures = [executor.submit(run_one, sdr_preset) for sdr_preset in sdr_presets]
-        for future in concurrent.futures.as_completed(futures):
-            future.result()
+    # Stream the folder with a bounded number of presets in flight
+    for _ in preset_stream.map_bounded(run_one, preset_stream.walk(sdr_dir), jobs):
+        pass
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,159 @@
+"""
+Generates the WCG and HDR menu shaders from the SDR menu shaders in one pass.
+Rules:
+- Inputs: every `*-sdr.slang` under the menus folder. Each is read and parsed
+  once, and all target colour spaces are written from that parse.
+- Target colour spaces are listed in COLOR_SPACES (pick a subset with
+  --spaces). Output filename: replace "-sdr" with "-<space>".
+- For each include, in the output for one colour space:
+  * Skip includes that end with another colour space's suffix (e.g. -hdr in
+    WCG output) before extension.
+    * If include ends with -sdr and a sibling -<space> variant exists, replace it.
+    * If include ends with -sdr and no -<space> variant exists, skip it.
+    * Otherwise keep the original include.
+- Sibling variants are looked up in one directory listing per include folder
+  (IncludeIndex), shared by every shader and colour space.
+"""
+import argparse
+import os
+import re
+import threading
+from pathlib import Path
+
+import build_trace
+import preset_stream
+
+
+# Colour spaces a menu shader is generated for, besides its SDR source
+COLOR_SPACES = ('wcg', 'hdr')
+
+INCLUDE_PATTERN = re.compile(r'^\s*#include\s+"([^"]+)"\s*$')
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def normalize_include_path(include_path: str) -> str:
+    return include_path.replace('\\', '/')
+
+
+def variant_path(include_path: Path, space: str) -> Path:
+    if include_path.stem.endswith('-sdr'):
+        stem = include_path.stem[:-4] + f'-{space}'
+    else:
+        stem = include_path.stem + f'-{space}'
+    return include_path.with_name(stem + include_path.suffix)
+
+
+def menu_output_path(sdr_shader: Path, sdr_dir: Path, base: Path, space: str) -> Path:
+    """Return where the `space` counterpart of a menu shader under `sdr_dir` goes."""
+    shader = base / sdr_shader.relative_to(sdr_dir)
+    return shader.with_name(shader.stem.replace('-sdr', f'-{space}') + shader.suffix)
+
+
+class IncludeIndex:
+    """File names per directory, listed once; safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listings = {}
+
+    def exists(self, path: Path) -> bool:
+        directory, name = os.path.split(os.path.normpath(path))
+        with self._lock:
+            listing = self._listings.get(directory)
+        if listing is None:
+            try:
+                listing = frozenset(os.listdir(directory))
+            except OSError:
+                listing = frozenset()
+            with self._lock:
+                self._listings[directory] = listing
+        return name in listing
+
+
+def parse_shader(input_path: Path):
+    """Split a menu shader into lines of text and (normalized) include paths."""
+    parts = []
+    for line in input_path.read_text(encoding='utf-8').splitlines(keepends=True):
+        m = INCLUDE_PATTERN.match(line)
+        parts.append(('include', normalize_include_path(m.group(1))) if m else ('text', line))
+    return parts
+
+
+def render_variant(parts, input_dir: Path, space: str, index: IncludeIndex, verbose=False) -> str:
+    other_suffixes = tuple(f'-{other}' for other in COLOR_SPACES if other != space)
+    out_lines = []
+    for kind, value in parts:
+        if kind == 'text':
+            out_lines.append(value)
+            continue
+        inc_path = Path(value)
+        if inc_path.stem.endswith(other_suffixes):
+            if verbose:
+                print(f"  Skipping include: {value}")
+            continue  # skip this line, do not add blank
+
+        # Check if this is an SDR include that needs replacement
+        if inc_path.stem.endswith('-sdr'):
+            replacement = variant_path(inc_path, space)
+            if index.exists(input_dir / replacement):
+                if verbose:
+                    print(f"  Replacing: {value} -> {replacement.as_posix()}")
+                out_lines.append(f'#include "{replacement.as_posix()}"\n')
+            elif verbose:
+                print(f"  Skipping SDR include ({space.upper()} not found): {value}")
+        else:
+            if verbose:
+                print(f"  Keeping include: {value}")
+            out_lines.append(f'#include "{value}"\n')
+    return ''.join(out_lines)
+
+
+def write_variants(sdr_shader: Path, sdr_dir: Path, base: Path, spaces=COLOR_SPACES, index=None, verbose=False):
+    """Write every colour-space variant of one SDR menu shader; returns the paths written."""
+    index = index or IncludeIndex()
+    parts = parse_shader(sdr_shader)
+    written = []
+    for space in spaces:
+        output = menu_output_path(sdr_shader, sdr_dir, base, space)
+        if verbose:
+            print(f"Transforming {sdr_shader} -> {output}")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(render_variant(parts, sdr_shader.parent, space, index, verbose), encoding='utf-8', newline='\n')
+        written.append(output)
+    return written
+
+
+def sdr_menu_shaders(sdr_dir: Path):
+    return sorted(sdr_dir.rglob('*-sdr.slang'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate WCG and HDR menu shaders from SDR menu shaders')
+    parser.add_argument('--menus-dir', type=Path, default=Path(__file__).parent.parent / 'shaders' / 'menus')
+    parser.add_argument('--out-dir', type=Path, default=None, help='Output root directory for generated content')
+    parser.add_argument('--spaces', nargs='+', choices=COLOR_SPACES, default=list(COLOR_SPACES), help='Colour spaces to generate')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    sdr_dir = args.menus_dir
+    # Output menus go in out_root/shaders/menus, mirroring SDR structure
+    base = Path(args.out_dir) / 'shaders' / 'menus' if args.out_dir else sdr_dir
+    index = IncludeIndex()
+
+    def run_one(sdr_shader: Path):
+        outputs = [menu_output_path(sdr_shader, sdr_dir, base, space) for space in args.spaces]
+        with build_trace.span(f'menu:{sdr_shader.relative_to(sdr_dir).as_posix()}', 'menu', reads=[sdr_shader], writes=outputs):
+            write_variants(sdr_shader, sdr_dir, base, args.spaces, index, args.verbose)
+
+    # Stream the folder with a bounded number of shaders in flight
+    for _ in preset_stream.map_bounded(run_one, preset_stream.walk(sdr_dir, '-sdr.slang'), max(1, args.jobs)):
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""
+Generates preset distributions with config/options.skel.cfg options already applied.
+Rules:
+- A distribution is a set of OPTION_* defines (DISTRIBUTIONS, or `--options
+  NAME=OPTION_A,OPTION_B=1.07` on the command line). Each preset folder gets a
+  sibling `<folder>-<distribution>` with the same structure.
+- Every pass is resolved for the distribution: includes are expanded,
+  `#ifdef`/`#ifndef` blocks on the chosen options are evaluated (and dropped),
+  valued options are substituted where they are used, and the result is
+  flattened as in flatten_shaders.py so code only the dropped branches used
+  goes with them. Conditionals on other names stay, so options.cfg still
+  works for the options the distribution leaves open.
+- Resolved copies go to `shaders/options/<distribution>/<shader>-<sha1[:12]>.slang`,
+  named by content hash; `options.json` records their source and options.
+- Passes that no longer do anything are removed, one at a time, while:
+  - the next pass neither samples `Source` nor sizes itself from it (the glow
+    passes under OPTION_NOGLOW or OPTION_NOBEZEL), or
+  - the pass is listed in PASSTHROUGH_PASSES for a chosen option and keeps its
+    input size (Phosphor3 under OPTION_NOPHOSPHOR).
+  As in eliminate_identity_passes.py, the last pass, passes sampled by alias
+  elsewhere, and presets with indexed PassOutputN/PassFeedbackN references
+  are left alone. A preset's passes are built once and renumbered in memory
+  as passes drop; each shader is scanned once per run (its PresetPass
+  caches).
+- Run last: resolved copies are single files and later steps would not
+  recognize them.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+
+import build_trace
+import eliminate_identity_passes
+import flatten_shaders
+import preset_stream
+import shader_source
+import slangp
+
+
+DISTRIBUTIONS = {
+    'performance': (
+        'OPTION_NOBEZEL',
+        'OPTION_NOGLOW',
+        'OPTION_FLAT',
+        'OPTION_NOMASK',
+        'OPTION_NOPHOSPHOR',
+    ),
+}
+# `#pragma name` -> option under which the pass writes its Source unchanged
+PASSTHROUGH_PASSES = {
+    'Phosphor3': 'OPTION_NOPHOSPHOR',
+}
+
+IFDEF_PATTERN = re.compile(r'^\s*#\s*(ifdef|ifndef)\s+(\w+)')
+IF_PATTERN = re.compile(r'^(\s*#\s*)(if|elif)\b(.*)$')
+ELSE_PATTERN = re.compile(r'^\s*#\s*else\b')
+ENDIF_PATTERN = re.compile(r'^\s*#\s*endif\b')
+DEFINE_PATTERN = re.compile(r'^\s*#\s*(define|undef)\b')
+# A sampler declaration (`uniform sampler2D Source;`) is not a read
+SOURCE_READ_PATTERN = re.compile(r'\bSource\b(?!\s*;)|\.\s*SourceSize\b')
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def parse_options(value: str):
+    name, sep, options = value.partition('=')
+    if not sep or not name or not options:
+        raise argparse.ArgumentTypeError(f"expected NAME=OPTION_A,OPTION_B, got {value!r}")
+    return name, tuple(option.strip() for option in options.split(',') if option.strip())
+
+
+def option_values(options):
+    """Split `OPTION_X` / `OPTION_X=VALUE` entries into a name -> value mapping."""
+    values = {}
+    for option in options:
+        name, _, value = option.partition('=')
+        values[name] = value
+    return values
+
+
+def resolve_options(expanded, options: dict):
+    """Evaluate conditionals on `options` (all defined) and keep every other conditional."""
+    substitutions = [(re.compile(rf'\b{name}\b'), value) for name, value in options.items() if value]
+    out = []
+    # Each frame: {'resolved': bool, 'emit': directives are kept, 'active': branch live, 'taken': a branch was live}
+    frames = []
+
+    def active():
+        return all(frame['active'] for frame in frames)
+
+    for source, line in expanded:
+        ifdef = IFDEF_PATTERN.match(line)
+        branch = IF_PATTERN.match(line)
+        if ifdef and ifdef.group(2) in options:
+            taken = ifdef.group(1) == 'ifdef'
+            frames.append({'resolved': True, 'emit': False, 'active': taken, 'taken': taken})
+            continue
+        if ifdef or (branch and branch.group(2) == 'if'):
+            frames.append({'resolved': False, 'emit': active(), 'active': True, 'taken': True})
+            if frames[-1]['emit']:
+                out.append((source, line))
+            continue
+
+        if frames and (ELSE_PATTERN.match(line) or branch):
+            frame = frames[-1]
+            if not frame['resolved']:
+                if frame['emit']:
+                    out.append((source, line))
+                continue
+            if frame['taken']:
+                frame['active'] = False
+            elif branch:
+                # `#ifndef CHOSEN ... #elif X`: the #elif becomes the opening test
+                frame['resolved'] = False
+                frame['active'] = frame['taken'] = True
+                frame['emit'] = active()
+                if frame['emit']:
+                    out.append((source, f'{branch.group(1)}if{branch.group(3)}'))
+            else:
+                frame['active'] = frame['taken'] = True
+            continue
+
+        if frames and ENDIF_PATTERN.match(line):
+            frame = frames.pop()
+            if not frame['resolved'] and frame['emit']:
+                out.append((source, line))
+            continue
+
+        if not active():
+            continue
+        if not DEFINE_PATTERN.match(line):
+            for pattern, value in substitutions:
+                line = pattern.sub(value, line)
+        out.append((source, line))
+    return out
+
+
+class OptionResolver:
+    """Resolves each source once per distribution; safe to share between threads."""
+
+    def __init__(self, shaders_dir: Path, distribution: str, options: dict, verbose=False):
+        self.output_dir = shaders_dir / 'options' / distribution
+        self.distribution = distribution
+        self.options = options
+        self.verbose = verbose
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._paths = {}
+
+    def resolve(self, shader_file: Path) -> Path:
+        with self._lock:
+            event = self._pending.get(shader_file)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[shader_file] = event
+        if not owner:
+            event.wait()
+            return self._paths[shader_file]
+
+        try:
+            resolved = resolve_options(shader_source.expand_includes(shader_file), self.options)
+            header = f'Resolved from {shader_file.name} for the {self.distribution} distribution by scripts/generate_option_variants.py'
+            lines, removed = flatten_shaders.flatten_lines(resolved, self.output_dir, header)
+            text = '\n'.join(lines) + '\n'
+            digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+            path = self.output_dir / f'{shader_file.stem}-{digest}.slang'
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding='utf-8', newline='\n')
+            if self.verbose:
+                print(f"  Resolved {shader_file.name} -> {path.name}")
+            with self._lock:
+                self._paths[shader_file] = path
+                self.manifest[path.name] = {
+                    'source': shader_file.name,
+                    'options': self.options,
+                    'removed_functions': removed,
+                }
+        finally:
+            event.set()
+        return path
+
+    def write_manifest(self):
+        if not self.manifest:
+            return
+        manifest_path = self.output_dir / 'options.json'
+        existing = {}
+        if manifest_path.exists():
+            existing = json.loads(manifest_path.read_text(encoding='utf-8'))
+        existing.update(self.manifest)
+        manifest_path.write_text(json.dumps(existing, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+
+def sized_from_source(values: dict, idx: int, last: bool) -> bool:
+    default_type = 'viewport' if last else 'source'
+    for axis in ('_x', '_y'):
+        if values.get(f'scale_type{axis}{idx}', values.get(f'scale_type{idx}', default_type)) == 'source':
+            return True
+    return False
+
+
+def removable_pass(passes, values: dict, options: dict):
+    """Return the index of one pass the distribution leaves without effect, or None."""
+    if any(p.references(eliminate_identity_passes.INDEXED_REFERENCE_PATTERN) for p in passes):
+        return None
+    for position, current in enumerate(passes[:-1]):
+        following = passes[position + 1]
+        unread = (
+            not following.references(SOURCE_READ_PATTERN)
+            and not sized_from_source(values, following.index, following is passes[-1])
+        )
+        passthrough = (
+            current.keeps_size()
+            and any(PASSTHROUGH_PASSES.get(name) in options for name in current.aliases())
+        )
+        if not (unread or passthrough):
+            continue
+        if not any(p.samples(current) for p in passes if p is not current):
+            return current.index
+    return None
+
+
+def transform_preset(input_path: Path, output_path: Path, resolver: OptionResolver, verbose=False):
+    lines = input_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+
+    resolved_files = []
+    for idx in range(slangp.shader_count(values)):
+        shader_path = values.get(f'shader{idx}', '')
+        shader_file = (input_path.parent / shader_path).resolve()
+        if not shader_file.is_file():
+            print(f"Warning: {shader_path} not found for {input_path}; skipping")
+            return False
+        resolved = resolver.resolve(shader_file).resolve()
+        resolved_files.append(resolved)
+        slangp.replace_value(lines, f'shader{idx}', slangp.relative_preset_path(output_path, resolved), quote=False)
+
+    values = slangp.values_from_lines(lines)
+    passes = [eliminate_identity_passes.PresetPass(idx, values, path) for idx, path in enumerate(resolved_files)]
+    dropped = []
+    while True:
+        index = removable_pass(passes, values, resolver.options)
+        if index is None:
+            break
+        dropped.append(passes[index].shader_file.name)
+        lines = slangp.reindex_passes(lines, {index}, len(passes))
+        values = slangp.values_from_lines(lines)
+        del passes[index]
+        for idx, current in enumerate(passes):
+            current.index = idx
+            current.values = values
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+    if verbose and dropped:
+        print(f"Dropped pass(es): {output_path} ({', '.join(dropped)})")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate preset distributions with global options resolved')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing shaders/ and presets/')
+    parser.add_argument('--input-dir', type=Path, action='append', default=[], help='Preset folder to derive from (repeatable)')
+    parser.add_argument(
+        '--distribution',
+        choices=sorted(DISTRIBUTIONS),
+        action='append',
+        default=[],
+        help='Built-in distribution to generate (repeatable, default: all)',
+    )
+    parser.add_argument(
+        '--options',
+        type=parse_options,
+        action='append',
+        default=[],
+        help='Extra distribution as NAME=OPTION_A,OPTION_B=VALUE (repeatable)',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    distributions = {name: DISTRIBUTIONS[name] for name in (args.distribution or ([] if args.options else DISTRIBUTIONS))}
+    distributions.update(dict(args.options))
+
+    total = 0
+    for distribution, options in distributions.items():
+        resolver = OptionResolver(args.root_dir / 'shaders', distribution, option_values(options), verbose=args.verbose)
+        for input_dir in args.input_dir:
+            if not input_dir.exists():
+                print(f"Warning: Input directory not found: {input_dir}")
+                continue
+            output_dir = input_dir.with_name(f'{input_dir.name}-{distribution}')
+            if output_dir.exists():
+                shutil.rmtree(output_dir)
+            print(f"Generating {distribution} distribution for {input_dir.name}")
+
+            def run_one(preset: Path, input_dir=input_dir, output_dir=output_dir):
+                output_path = output_dir / preset.relative_to(input_dir)
+                with build_trace.span(f'{output_dir.name}:{preset.relative_to(input_dir).as_posix()}', 'distribution', reads=[preset], writes=[output_path]):
+                    return transform_preset(preset, output_path, resolver, args.verbose)
+
+            # Stream the folder with a bounded number of presets in flight
+            total += sum(1 for written in preset_stream.map_bounded(run_one, preset_stream.walk(input_dir), jobs) if written)
+        resolver.write_manifest()
+
+    print(f"Option variant generation complete: {total} preset(s).")
+
+
+if __name__ == '__main__':
+    main()
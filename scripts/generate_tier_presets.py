@@ -0,0 +1,415 @@
+"""
+Derives "standard" and "lite" performance tiers from generated preset folders.
+Rules:
+- The existing folder is the "full" tier. Each tier is written to a sibling
+  folder `<folder>-<tier>` with the same structure, so relative shader and
+  texture paths stay valid.
+- Every preset gets a rough per-frame cost: PASS_COSTS (texture fetch
+  equivalents per output pixel at typical settings) times the pass area,
+  following the preset's scale types from a NOMINAL_SOURCE frame to a 16:9
+  viewport at the folder's output height. The figures are estimates for
+  ranking rules, not measurements.
+- Cost-reducing rules allowed for the tier are tried on the preset, ranked by
+  estimated saving, and applied greedily until the cost falls to the tier's
+  TIER_BUDGETS fraction of full (or no rule is left). Lite has no budget
+  and takes every rule that saves anything:
+  - fast-noise: `NOISE_MODE = 0.0` for presets with `iq-noise.slang`.
+  - reduced-taps: passes whose early-exit loops test FILTER_THRESHOLD run
+    from a copy at `shaders/tiers/<shader>-taps<N>.slang` with the threshold
+    raised to 1/N (TAP_THRESHOLDS), so windowed filters stop at fewer taps.
+  - baked-mask: `mask.slang` becomes `mask-baked.slang` via
+    bake_mask_textures.py. The supersample loops of mask.slang are fixed in
+    the shader, so baking is how a tier gets rid of them.
+  - no-glow (lite only): the glow passes (slangp.GLOW_SHADERS) are dropped
+    and `GLOW_WEIGHT = 0.0`, which keeps bezel-*.slang from sampling the glow.
+- Taps copies are expanded sources (as in specialize_shaders.py) shared
+  across presets; `tiers.json` next to the copies records their sources, and
+  `<folder>-<tier>/tiers.json` the rules and cost ratio of every preset.
+- Run after the derived folders and before the baking steps, so the tier
+  folders go through the same post-processing as their full presets.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import bake_mask_textures
+import build_trace
+import preset_stream
+import shader_source
+import slangp
+
+
+TIERS = ('standard', 'lite')
+# Target cost as a fraction of the full preset
+TIER_BUDGETS = {
+    'standard': 0.7,
+    'lite': 0.0,
+}
+# Early-exit threshold 1/N for reduced-taps copies
+TAP_THRESHOLDS = {
+    'standard': 128,
+    'lite': 64,
+}
+FULL_TAP_THRESHOLD = 255
+
+# Rough texture fetch equivalents per output pixel of each pass at typical
+# settings; used only to rank rules against each other.
+PASS_COSTS = {
+    'mask.slang': 200.0,
+    'mask-baked.slang': 2.0,
+    'iq-filter.slang': 90.0,
+    'iq-demod.slang': 90.0,
+    'composite-iq.slang': 60.0,
+    'composite-demod.slang': 65.0,
+    'composite-prefilter.slang': 40.0,
+    'display-component.slang': 65.0,
+    'display-svideo.slang': 65.0,
+    'svideo.slang': 65.0,
+    'digital-ycc-filter.slang': 40.0,
+    'digital-upsample.slang': 30.0,
+    'sys-component.slang': 33.0,
+    'sys-rgb-bandlimit.slang': 17.0,
+    'display-rgb-bandlimit.slang': 17.0,
+    'sys-display-rgb-bandlimit.slang': 17.0,
+    'filter.slang': 17.0,
+    'limiter.slang': 20.0,
+    'glow-reduce.slang': 37.0,
+    'glow-h.slang': 17.0,
+    'glow-v.slang': 17.0,
+    'curve.slang': 16.0,
+    'curve-baked.slang': 17.0,
+    'bezel-sdr.slang': 10.0,
+    'bezel-wcg.slang': 10.0,
+    'bezel-hdr.slang': 10.0,
+    'beam.slang': 8.0,
+    'color-sdr.slang': 3.0,
+    'color-wcg.slang': 3.0,
+    'color-hdr.slang': 3.0,
+    'color-lut.slang': 2.0,
+    'crt-linear.slang': 1.0,
+    'stock.slang': 1.0,
+}
+DEFAULT_PASS_COST = 4.0
+# iq-noise per pixel cost by NOISE_MODE (advanced, fast)
+NOISE_COSTS = (40.0, 6.0)
+DEFAULT_NOISE_MODE = 1.0
+
+NOMINAL_SOURCE = (320.0, 240.0)
+OUTPUT_ASPECT = 16.0 / 9.0
+
+TAPS_PATTERN = re.compile(r'^(?P<stem>.+)-taps(?P<taps>\d+)\.slang$')
+EARLY_EXIT_PATTERN = re.compile(r'<\s*FILTER_THRESHOLD\b')
+THRESHOLD_PATTERN = re.compile(r'^(\s*const\s+float\s+FILTER_THRESHOLD\s*=\s*)[^;]+;')
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def shader_name(values: dict, idx: int) -> str:
+    return values.get(f'shader{idx}', '').replace('\\', '/').rsplit('/', 1)[-1]
+
+
+def tap_factor(taps: int) -> float:
+    """Relative filter length for an early-exit threshold of 1/taps."""
+    # Window tails fall off roughly exponentially, so the exit point moves
+    # with the log of the threshold.
+    return math.sqrt(math.log(taps) / math.log(FULL_TAP_THRESHOLD))
+
+
+def pass_cost(values: dict, idx: int) -> float:
+    name = shader_name(values, idx)
+    if name == 'iq-noise.slang':
+        try:
+            mode = float(values.get('NOISE_MODE', DEFAULT_NOISE_MODE))
+        except ValueError:
+            mode = DEFAULT_NOISE_MODE
+        return NOISE_COSTS[0] if mode > 0.5 else NOISE_COSTS[1]
+    match = TAPS_PATTERN.match(name)
+    if match:
+        base = PASS_COSTS.get(f"{match.group('stem')}.slang", DEFAULT_PASS_COST)
+        return base * tap_factor(int(match.group('taps')))
+    return PASS_COSTS.get(name, DEFAULT_PASS_COST)
+
+
+def axis_size(values: dict, idx: int, axis: str, previous: float, viewport: float, last: bool) -> float:
+    default_type = 'viewport' if last else 'source'
+    scale_type = values.get(f'scale_type_{axis}{idx}', values.get(f'scale_type{idx}', default_type))
+    try:
+        scale = float(values.get(f'scale_{axis}{idx}', values.get(f'scale{idx}', '1.0')))
+    except ValueError:
+        scale = 1.0
+    if scale_type == 'viewport':
+        return viewport * scale
+    if scale_type == 'absolute':
+        return scale
+    return previous * scale
+
+
+def preset_cost(lines, output_height: int) -> float:
+    values = slangp.values_from_lines(lines)
+    count = slangp.shader_count(values)
+    viewport = (output_height * OUTPUT_ASPECT, float(output_height))
+    width, height = NOMINAL_SOURCE
+    total = 0.0
+    for idx in range(count):
+        last = idx == count - 1
+        width = axis_size(values, idx, 'x', width, viewport[0], last)
+        height = axis_size(values, idx, 'y', height, viewport[1], last)
+        total += pass_cost(values, idx) * width * height
+    return total
+
+
+@lru_cache(maxsize=None)
+def expanded_source(shader_file: Path):
+    return tuple(shader_source.expand_includes(shader_file))
+
+
+def has_early_exit(shader_file: Path) -> bool:
+    return any(EARLY_EXIT_PATTERN.search(line) for _, line in expanded_source(shader_file))
+
+
+class TapsWriter:
+    """Writes each reduced-taps copy once; safe to share between threads."""
+
+    def __init__(self, shaders_dir: Path, verbose=False):
+        self.output_dir = shaders_dir / 'tiers'
+        self.verbose = verbose
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def path(self, shader_file: Path, taps: int) -> Path:
+        return self.output_dir / f'{shader_file.stem}-taps{taps}.slang'
+
+    def write(self, shader_file: Path, taps: int) -> Path:
+        path = self.path(shader_file, taps)
+        with self._lock:
+            event = self._pending.get(path)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[path] = event
+        if not owner:
+            event.wait()
+            return path
+
+        try:
+            out = []
+            for source, line in expanded_source(shader_file):
+                match = THRESHOLD_PATTERN.match(line)
+                if match:
+                    line = f'{match.group(1)}1.0 / {float(taps)};'
+                out.append(shader_source.rebase_include_optional(source, line, self.output_dir))
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text('\n'.join(out) + '\n', encoding='utf-8', newline='\n')
+            if self.verbose:
+                print(f"  Reduced taps: {shader_file.name} -> {path.name}")
+            with self._lock:
+                self.manifest[path.name] = {
+                    'source': shader_file.name,
+                    'filter_threshold': f'1/{taps}',
+                }
+        finally:
+            event.set()
+        return path
+
+    def write_manifest(self):
+        if not self.manifest:
+            return
+        manifest_path = self.output_dir / 'tiers.json'
+        existing = {}
+        if manifest_path.exists():
+            existing = json.loads(manifest_path.read_text(encoding='utf-8'))
+        existing.update(self.manifest)
+        manifest_path.write_text(json.dumps(existing, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+
+class TierContext:
+    """What a rule needs to rewrite one tier preset.
+
+    While rules are ranked `apply` is False: rules only edit the lines so the
+    cost model sees the result, and write nothing.
+    """
+
+    def __init__(self, preset_path: Path, tier: str, taps_writer: TapsWriter, apply=False):
+        self.preset_path = preset_path
+        self.tier = tier
+        self.taps_writer = taps_writer
+        self.apply = apply
+        self.bake_mask = False
+
+
+def fast_noise(lines, context: TierContext) -> bool:
+    values = slangp.values_from_lines(lines)
+    if slangp.find_shader_index(values, 'iq-noise.slang') is None:
+        return False
+    try:
+        if float(values.get('NOISE_MODE', DEFAULT_NOISE_MODE)) <= 0.5:
+            return False
+    except ValueError:
+        return False
+    slangp.set_value(lines, 'NOISE_MODE', '0.0')
+    return True
+
+
+def reduced_taps(lines, context: TierContext) -> bool:
+    values = slangp.values_from_lines(lines)
+    taps = TAP_THRESHOLDS[context.tier]
+    changed = False
+    for idx in range(slangp.shader_count(values)):
+        shader_path = values.get(f'shader{idx}', '')
+        shader_file = (context.preset_path.parent / shader_path).resolve()
+        if TAPS_PATTERN.match(shader_file.name) or not shader_file.is_file():
+            continue
+        if not has_early_exit(shader_file):
+            continue
+        if context.apply:
+            target = context.taps_writer.write(shader_file, taps)
+        else:
+            target = context.taps_writer.path(shader_file, taps)
+        slangp.replace_value(lines, f'shader{idx}', slangp.relative_preset_path(context.preset_path, target), quote=False)
+        changed = True
+    return changed
+
+
+def baked_mask(lines, context: TierContext) -> bool:
+    values = slangp.values_from_lines(lines)
+    mask_index = slangp.find_shader_index(values, 'mask.slang')
+    if mask_index is None:
+        return False
+    if context.apply:
+        # bake_mask_textures.py rewrites the written preset afterwards
+        context.bake_mask = True
+        return True
+    shader_key = f'shader{mask_index}'
+    shader_path = values[shader_key]
+    slangp.replace_value(lines, shader_key, shader_path[: -len('mask.slang')] + 'mask-baked.slang', quote=False)
+    return True
+
+
+def no_glow(lines, context: TierContext) -> bool:
+    return slangp.drop_glow_passes(lines)
+
+
+# name -> (rule, tiers allowed to use it)
+RULES = {
+    'fast-noise': (fast_noise, ('standard', 'lite')),
+    'reduced-taps': (reduced_taps, ('standard', 'lite')),
+    'baked-mask': (baked_mask, ('standard', 'lite')),
+    'no-glow': (no_glow, ('lite',)),
+}
+
+
+def select_rules(lines, context: TierContext, output_height: int):
+    """Greedily pick rules by estimated saving until the tier budget is met."""
+    full = preset_cost(lines, output_height)
+    budget = TIER_BUDGETS[context.tier] * full
+    current = list(lines)
+    cost = full
+    remaining = [name for name, (_, tiers) in RULES.items() if context.tier in tiers]
+    chosen = []
+    while remaining and cost > budget:
+        best = None
+        for name in remaining:
+            trial = list(current)
+            if not RULES[name][0](trial, context):
+                continue
+            saving = cost - preset_cost(trial, output_height)
+            if saving > 0 and (best is None or saving > best[1]):
+                best = (name, saving, trial)
+        if best is None:
+            break
+        name, saving, current = best
+        cost -= saving
+        chosen.append(name)
+        remaining.remove(name)
+    return chosen, full, cost
+
+
+def transform_preset(input_path: Path, output_path: Path, tier: str, output_height: int,
+                     taps_writer: TapsWriter, baker, verbose=False):
+    lines = input_path.read_text(encoding='utf-8').splitlines()
+    context = TierContext(output_path, tier, taps_writer)
+    chosen, full, cost = select_rules(lines, context, output_height)
+
+    context.apply = True
+    for name in chosen:
+        RULES[name][0](lines, context)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+    if context.bake_mask:
+        bake_mask_textures.transform_preset(output_path, baker, output_height)
+
+    ratio = cost / full if full > 0 else 1.0
+    if verbose:
+        print(f"Tier {tier}: {output_path} ({', '.join(chosen) or 'no rules'}; cost {ratio:.0%})")
+    return {'rules': chosen, 'cost_ratio': round(ratio, 3)}
+
+
+def process_folder(input_dir: Path, output_height: int, tier: str, taps_writer: TapsWriter,
+                   baker, verbose=False, jobs=1):
+    output_dir = input_dir.with_name(f'{input_dir.name}-{tier}')
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    print(f"Generating {tier} tier for {input_dir.name}")
+
+    def run_one(preset: Path):
+        relative = preset.relative_to(input_dir).as_posix()
+        output_path = output_dir / relative
+        with build_trace.span(f'{output_dir.name}:{relative}', 'tier', reads=[preset], writes=[output_path]):
+            return relative, transform_preset(preset, output_path, tier, output_height, taps_writer, baker, verbose)
+
+    # Stream the folder with a bounded number of presets in flight
+    report = dict(preset_stream.map_bounded(run_one, preset_stream.walk(input_dir), jobs))
+
+    if report:
+        (output_dir / 'tiers.json').write_text(json.dumps(report, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+        average = sum(entry['cost_ratio'] for entry in report.values()) / len(report)
+        print(f"  {output_dir.name}: {len(report)} preset(s), estimated cost {average:.0%} of full on average")
+    return len(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate lite and standard performance tiers of preset folders')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing share/, shaders/ and presets/')
+    parser.add_argument(
+        '--target',
+        type=bake_mask_textures.parse_target,
+        action='append',
+        default=[],
+        help='Preset folder and output height to derive tiers from, as DIR=HEIGHT (repeatable)',
+    )
+    parser.add_argument('--tier', choices=TIERS, action='append', default=[], help='Tier to generate (repeatable, default: all)')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    tiers = args.tier or list(TIERS)
+    taps_writer = TapsWriter(args.root_dir / 'shaders', verbose=args.verbose)
+    baker = bake_mask_textures.MaskBaker(args.root_dir / 'share', verbose=args.verbose)
+
+    total = 0
+    for presets_dir, output_height in args.target:
+        if not presets_dir.exists():
+            print(f"Warning: Input directory not found: {presets_dir}")
+            continue
+        for tier in tiers:
+            total += process_folder(presets_dir, output_height, tier, taps_writer, baker, args.verbose, jobs)
+
+    taps_writer.write_manifest()
+    baker.write_manifest()
+    print(f"Tier generation complete: {total} preset(s), {len(taps_writer.manifest)} reduced-taps pass(es).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Rewrites generated presets as thin `#reference` layers over a base preset.
+Rules:
+- RetroArch takes the pass list, texture list and texture options from the
+  end of a `#reference` chain; a referencing preset can only override
+  parameter values and texture paths. A preset is layered only when its
+  structure (STRUCTURE_KEYS, per-pass keys and texture options) matches its
+  base exactly, with shader paths compared after resolving, and when it sets
+  every parameter and texture the base sets.
+- Variant folders reference the preset with the same relative path in their
+  base folder (LAYER_BASES; `<folder>-<suffix>` folders such as tiers and
+  distributions use `<folder>`), and keep only the keys whose values differ.
+- Presets not layered onto another folder are grouped by structure within
+  their folder. Groups of two or more share a stack preset at
+  `<folder>/_stacks/stack-<sha1[:12] of its text>.slangp` holding the
+  structure and the values common to the whole group; members reference it.
+- Every preset is read before any is written, so references always see
+  their base in full. Run last, after everything that reads `shaderN`.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import os
+from pathlib import Path
+
+import slangp
+
+
+# variant folder -> folder it was generated from
+LAYER_BASES = {
+    'uhd-4k-wcg': 'uhd-4k-sdr',
+    'uhd-4k-hdr': 'uhd-4k-sdr',
+    'fhd-sdr': 'uhd-4k-sdr',
+    'fhd-hdr': 'uhd-4k-hdr',
+    'steamdeck-lcd': 'uhd-4k-sdr',
+    'steamdeck-oled-native': 'uhd-4k-wcg',
+}
+STRUCTURE_KEYS = ('shaders', 'textures', 'parameters', 'feedback_pass')
+TEXTURE_OPTION_SUFFIXES = ('_linear', '_mipmap', '_wrap_mode')
+STACKS_DIR = '_stacks'
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+class Preset:
+    def __init__(self, path: Path):
+        self.path = path
+        self.text = path.read_text(encoding='utf-8')
+        self.values = slangp.values_from_lines(self.text.splitlines())
+        # Original line of each key, so layers keep the writer's quoting
+        self.lines = {}
+        for line in self.text.splitlines():
+            assignment = slangp.split_assignment(line)
+            if assignment:
+                self.lines[assignment[0]] = line.strip()
+        self.textures = set(slangp.texture_names(self.values))
+
+    def is_layered(self) -> bool:
+        return any(line.startswith('#reference') for line in self.text.splitlines())
+
+    def is_path(self, key: str) -> bool:
+        return key in self.textures or slangp.SHADER_KEY_PATTERN.match(key) is not None
+
+    def is_structure(self, key: str) -> bool:
+        if key in STRUCTURE_KEYS or slangp.PASS_KEY_PATTERN.match(key):
+            return True
+        return any(key == f'{name}{suffix}' for name in self.textures for suffix in TEXTURE_OPTION_SUFFIXES)
+
+    def resolved(self, key: str) -> str:
+        value = self.values[key]
+        if self.is_path(key):
+            return (self.path.parent / value).resolve().as_posix()
+        return value
+
+    def structure(self):
+        return tuple(sorted((key, self.resolved(key)) for key in self.values if self.is_structure(key)))
+
+    def settings(self):
+        return {key: self.resolved(key) for key in self.values if not self.is_structure(key)}
+
+
+def overrides(preset: Preset, base_settings: dict):
+    """Keys `preset` must set on top of a base with `base_settings`, or None when it cannot layer."""
+    settings = preset.settings()
+    if any(key not in settings for key in base_settings):
+        return None
+    return [key for key in preset.values if key in settings and settings[key] != base_settings.get(key)]
+
+
+def thin_text(preset: Preset, reference: Path, keys) -> str:
+    lines = [f'#reference "{slangp.relative_preset_path(preset.path, reference)}"', '']
+    lines.extend(preset.lines[key] for key in keys)
+    return '\n'.join(lines) + '\n'
+
+
+def stack_text(stack_path: Path, member: Preset, keys) -> str:
+    lines = []
+    for key, value in member.values.items():
+        if not member.is_structure(key) and key not in keys:
+            continue
+        if not member.is_path(key):
+            lines.append(member.lines[key])
+            continue
+        value = slangp.relative_preset_path(stack_path, (member.path.parent / value).resolve())
+        lines.append(f'{key} = "{value}"' if '"' in member.lines[key] else f'{key} = {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def base_folder(name: str, folders):
+    if name in LAYER_BASES:
+        return LAYER_BASES[name]
+    for folder in sorted(folders, key=len, reverse=True):
+        if name.startswith(f'{folder}-'):
+            return folder
+    return None
+
+
+def plan_folder(folder: Path, presets: dict, base_presets: dict, writes: dict):
+    """Queue thin presets and stacks for `folder`; both dicts map relative path -> Preset."""
+    standalone = []
+    for relative, preset in presets.items():
+        base = base_presets.get(relative)
+        if base is not None and base.structure() == preset.structure():
+            keys = overrides(preset, base.settings())
+            if keys is not None:
+                writes[preset.path] = thin_text(preset, base.path, keys)
+                continue
+        standalone.append(preset)
+
+    groups = {}
+    for preset in standalone:
+        groups.setdefault(preset.structure(), []).append(preset)
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        settings = [member.settings() for member in members]
+        # Common values, plus every texture path: the root of a chain must name them all
+        stack_settings = {
+            key: value
+            for key, value in settings[0].items()
+            if key in members[0].textures or all(other.get(key) == value for other in settings[1:])
+        }
+        # Named by content (its paths are relative to _stacks/), so the name does not depend on where out/ is
+        text = stack_text(folder / STACKS_DIR / 'stack.slangp', members[0], stack_settings)
+        stack_path = folder / STACKS_DIR / f"stack-{hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]}.slangp"
+        writes[stack_path] = text
+        for member in members:
+            writes[member.path] = thin_text(member, stack_path, overrides(member, stack_settings))
+
+
+def read_folder(folder: Path, jobs: int):
+    paths = [
+        path for path in sorted(folder.rglob('*.slangp'))
+        if STACKS_DIR not in path.relative_to(folder).parts
+    ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        loaded = list(executor.map(Preset, paths))
+    presets = {}
+    for preset in loaded:
+        if preset.is_layered():
+            print(f"Warning: {preset.path} is already layered; skipping")
+            continue
+        presets[preset.path.relative_to(folder)] = preset
+    return presets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rewrite generated presets as #reference layers over base presets')
+    parser.add_argument('--presets-dir', type=Path, required=True, help='Folder holding the generated preset folders')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    folders = {}
+    for folder in sorted(p for p in args.presets_dir.iterdir() if p.is_dir()):
+        folders[folder.name] = (folder, read_folder(folder, jobs))
+
+    before = sum(len(p.text.encode('utf-8')) for _, presets in folders.values() for p in presets.values())
+    writes = {}
+    for name, (folder, presets) in folders.items():
+        base = base_folder(name, folders)
+        base_presets = folders[base][1] if base in folders else {}
+        plan_folder(folder, presets, base_presets, writes)
+
+    for path, text in writes.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding='utf-8', newline='\n')
+        if args.verbose:
+            print(f"Layered: {path}")
+
+    after = sum(
+        len(writes[p.path].encode('utf-8')) if p.path in writes else len(p.text.encode('utf-8'))
+        for _, presets in folders.values() for p in presets.values()
+    )
+    after += sum(len(text.encode('utf-8')) for path, text in writes.items() if STACKS_DIR in path.parts)
+    layered = sum(1 for path in writes if STACKS_DIR not in path.parts)
+    stacks = len(writes) - layered
+    print(f"Preset layering complete: {layered} preset(s) layered, {stacks} stack(s), {before} -> {after} bytes.")
+
+
+if __name__ == '__main__':
+    main()
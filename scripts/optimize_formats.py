@@ -0,0 +1,474 @@
+"""
+Checks each pass's render-target format against what the rest of the chain reads and recommends cheaper ones.
+Rules:
+- A pass's current format is its `#pragma format`, else R16G16B16A16_SFLOAT
+  with `float_framebufferN`, else R8G8B8A8_UNORM. The last pass writes the
+  viewport and is skipped, as are passes that already write a UNORM format
+  (their clamp and quantization are part of the signal) and presets with
+  indexed PassOutputN/PassFeedbackN references.
+- Channels read: every consumer of the pass (the next pass through `Source`,
+  any pass through the alias or `<alias>Feedback`) is scanned for texture
+  reads. A read followed by a swizzle counts those channels. A read stored
+  in a variable counts the swizzles the variable is read through, and a read
+  written straight to FragColor counts the channels the consumer's own
+  consumers read. Any other use (whole vec4, sampler handed to a helper)
+  counts all four.
+- Candidates are the formats RetroArch accepts (FORMATS) with enough channels.
+  Dropping channels of the same component type is lossless. Any change of
+  component type needs a SIGNALS entry for the pass. The error model is a
+  range quantizer, not a render of the chain: it quantizes samples across the
+  signal's range, maps them to light (voltage through BT.1886 at the default
+  picture and brightness, 1.0 V = 100 IRE = white), encodes that as the
+  preset's output does (sRGB 8-bit SDR, gamma 2.4 10-bit WCG, PQ 10-bit HDR;
+  1.0 = 100 nit white) and measures the worst error in output code values.
+  The chain in between is assumed to pass light through at unity gain or
+  less. A UNORM candidate must hold the whole range: tone mapping can bring
+  clamped values back on screen, so a clamp is never within the threshold.
+- A candidate is accepted when its error stays under --threshold (output
+  LSBs). The cheapest accepted format in bytes per pixel wins.
+- The script only reports; it does not rewrite presets, and the build does
+  not run it. The range quantizer is not a reference render of each pass, and
+  on the shipped pipelines it recommends nothing: RetroArch has no 3-channel
+  half format for passes read as rgb, A2B10G10R10 cannot hold voltages below
+  0 or above 100 IRE, and linear-light passes miss the threshold at the dark
+  end. A recommendation is a lead to check by rendering the chain, not a
+  change to ship.
+"""
+import argparse
+import concurrent.futures
+import functools
+import os
+import re
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+import shader_source
+import slangp
+
+
+@dataclass(frozen=True)
+class Format:
+    channels: int
+    component: str  # 'half', 'unorm8' or 'unorm10'
+    bytes_per_pixel: int
+
+
+@dataclass(frozen=True)
+class Signal:
+    low: float
+    high: float
+    transfer: str  # 'nits' (cd/m2), 'linear' (1.0 = reference white) or 'voltage' (1.0 V = 100 IRE)
+
+
+# Formats RetroArch's slang backend accepts that are useful as color targets
+FORMATS = {
+    'R8_UNORM': Format(1, 'unorm8', 1),
+    'R8G8_UNORM': Format(2, 'unorm8', 2),
+    'R8G8B8A8_UNORM': Format(4, 'unorm8', 4),
+    # 2-bit alpha: only usable when nothing reads alpha
+    'A2B10G10R10_UNORM_PACK32': Format(3, 'unorm10', 4),
+    'R16_SFLOAT': Format(1, 'half', 2),
+    'R16G16_SFLOAT': Format(2, 'half', 4),
+    'R16G16B16A16_SFLOAT': Format(4, 'half', 8),
+}
+DEFAULT_FORMAT = 'R8G8B8A8_UNORM'
+FLOAT_FRAMEBUFFER_FORMAT = 'R16G16B16A16_SFLOAT'
+
+# Voltage passes carry sync-tip to peak levels (-40 to 140 IRE, the limiter's
+# highest setting); chroma and I/Q swing negative, so only half formats fit
+VOLTAGE = Signal(-0.4, 1.4, 'voltage')
+# Output range of passes whose signal is documented; the upper bound is the
+# level the model checks precision up to, not a clamp
+SIGNALS = {
+    'sys-rgb-amp.slang': VOLTAGE,
+    'sys-rgb-bandlimit.slang': VOLTAGE,
+    'display-rgb-bandlimit.slang': VOLTAGE,
+    'sys-display-rgb-bandlimit.slang': VOLTAGE,
+    'sys-component.slang': VOLTAGE,
+    'display-component.slang': VOLTAGE,
+    'sys-yc.slang': VOLTAGE,
+    'dac.slang': VOLTAGE,
+    'yc-composite.slang': VOLTAGE,
+    'composite-mod.slang': VOLTAGE,
+    'composite-iq.slang': VOLTAGE,
+    'composite-prefilter.slang': VOLTAGE,
+    'composite-demod.slang': VOLTAGE,
+    'iq-filter.slang': VOLTAGE,
+    'iq-noise.slang': VOLTAGE,
+    'iq-demod.slang': VOLTAGE,
+    # Negative voltages are clamped before the limiter's curve
+    'limiter.slang': Signal(0.0, 1.4, 'voltage'),
+    'crt-linear.slang': Signal(0.0, 10000.0, 'nits'),
+    'mask.slang': Signal(0.0, 10000.0, 'nits'),
+    'mask-baked.slang': Signal(0.0, 10000.0, 'nits'),
+    'phosphor-trichrome.slang': Signal(0.0, 10000.0, 'nits'),
+    'beam.slang': Signal(0.0, 10000.0, 'nits'),
+    'curve.slang': Signal(0.0, 10000.0, 'nits'),
+    'curve-baked.slang': Signal(0.0, 10000.0, 'nits'),
+    'color-sdr.slang': Signal(0.0, 1.0, 'linear'),
+    'color-wcg.slang': Signal(0.0, 1.0, 'linear'),
+    'color-hdr.slang': Signal(0.0, 1.0, 'linear'),
+    'color-lut.slang': Signal(0.0, 1.0, 'linear'),
+    'glow-reduce.slang': Signal(0.0, 1.0, 'linear'),
+    'glow-h.slang': Signal(0.0, 1.0, 'linear'),
+    'glow-v.slang': Signal(0.0, 1.0, 'linear'),
+}
+# Final pass -> (encoding, bits); SDR otherwise
+OUTPUT_ENCODINGS = {
+    'bezel-hdr.slang': ('pq', 10),
+    'bezel-wcg.slang': ('gamma', 10),
+}
+REFERENCE_WHITE_NITS = 100.0
+# crt-linear.slang at USER_BRIGHTNESS 50 / USER_PICTURE 50: black 0 V, white 1 V
+BT1886_GAMMA = 2.4
+SAMPLE_COUNT = 2048
+DEFAULT_THRESHOLD = 0.5
+
+FORMAT_PATTERN = re.compile(r'^(\s*#pragma\s+format\s+)(\w+)')
+INDEXED_REFERENCE_PATTERN = re.compile(r'\b(PassOutput|PassFeedback)\d+')
+PASS_NAME_PATTERN = re.compile(r'^\s*#pragma\s+name\s+(\w+)')
+PRAGMA_PATTERN = re.compile(r'^\s*#pragma\b')
+TEXTURE_CALL_PATTERN = re.compile(r'\b(texture\w*|texelFetch\w*)\s*\(\s*$')
+SWIZZLE_PATTERN = re.compile(r'\s*\.([xyzwrgba]{1,4})\b')
+# `[vec4] name = ` in front of a texture call whose result is stored whole
+STORE_PATTERN = re.compile(r'(?:^|[;{}\n])\s*(?:vec4\s+)?([A-Za-z_]\w*)\s*=\s*$')
+STATEMENT_END_PATTERN = re.compile(r'\s*;')
+ASSIGNMENT_PATTERN = re.compile(r'\s*=(?!=)')
+TOKEN_PATTERN = re.compile(r'\b[A-Za-z_]\w*\b')
+CHANNEL_INDEX = {'x': 0, 'r': 0, 'y': 1, 'g': 1, 'z': 2, 'b': 2, 'w': 3, 'a': 3}
+SIZE_QUERIES = {'textureSize', 'textureQueryLevels', 'textureQueryLod'}
+ALL_CHANNELS = frozenset(range(4))
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+# ---- CPU error model ----
+
+def quantize_half(value: float) -> float:
+    value = max(-65504.0, min(65504.0, value))
+    return struct.unpack('<e', struct.pack('<e', value))[0]
+
+
+def quantize_unorm(value: float, bits: int) -> float:
+    levels = (1 << bits) - 1
+    return round(max(0.0, min(1.0, value)) * levels) / levels
+
+
+def quantize(component: str, value: float) -> float:
+    if component == 'half':
+        return quantize_half(value)
+    return quantize_unorm(value, 8 if component == 'unorm8' else 10)
+
+
+def srgb_encode(value: float) -> float:
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return 12.92 * value
+    return 1.055 * value ** (1.0 / 2.4) - 0.055
+
+
+def gamma_encode(value: float) -> float:
+    return max(0.0, min(1.0, value)) ** (1.0 / 2.4)
+
+
+def pq_encode(nits: float) -> float:
+    m1, m2 = 2610.0 / 16384.0, 2523.0 / 4096.0 * 128.0
+    c1, c2, c3 = 3424.0 / 4096.0, 2413.0 / 4096.0 * 32.0, 2392.0 / 4096.0 * 32.0
+    y = max(0.0, min(1.0, nits / 10000.0)) ** m1
+    return ((c1 + c2 * y) / (1.0 + c3 * y)) ** m2
+
+
+def output_code(value: float, signal: Signal, encoding: str, bits: int) -> float:
+    if signal.transfer == 'nits':
+        relative = value / REFERENCE_WHITE_NITS
+    elif signal.transfer == 'voltage':
+        relative = max(0.0, value) ** BT1886_GAMMA
+    else:
+        relative = value
+    if encoding == 'pq':
+        encoded = pq_encode(relative * REFERENCE_WHITE_NITS)
+    elif encoding == 'gamma':
+        encoded = gamma_encode(relative)
+    else:
+        encoded = srgb_encode(relative)
+    return encoded * ((1 << bits) - 1)
+
+
+def signal_samples(signal: Signal):
+    """Linear steps across the range plus log steps that resolve the dark end."""
+    span = signal.high - signal.low
+    samples = [signal.low + span * idx / (SAMPLE_COUNT - 1) for idx in range(SAMPLE_COUNT)]
+    floor = max(span * 1e-6, 1e-9)
+    for idx in range(SAMPLE_COUNT):
+        samples.append(signal.low + floor * (span / floor) ** (idx / (SAMPLE_COUNT - 1)))
+    return samples
+
+
+@functools.lru_cache(maxsize=None)
+def quantization_error(component: str, signal: Signal, encoding: str, bits: int) -> float:
+    """Worst output code value error from storing `signal` with `component` precision."""
+    if component != 'half' and (signal.low < 0.0 or signal.high > 1.0):
+        return float('inf')
+    worst = 0.0
+    for value in signal_samples(signal):
+        exact = output_code(value, signal, encoding, bits)
+        stored = output_code(quantize(component, value), signal, encoding, bits)
+        worst = max(worst, abs(stored - exact))
+    return worst
+
+
+# ---- Channel usage ----
+
+def strip_comments(text: str) -> str:
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    return re.sub(r'//[^\n]*', '', text)
+
+
+def closing_paren(text: str, start: int) -> int:
+    depth = 0
+    for pos in range(start, len(text)):
+        if text[pos] == '(':
+            depth += 1
+        elif text[pos] == ')':
+            depth -= 1
+            if depth == 0:
+                return pos
+    return len(text)
+
+
+def variable_channels(text: str, name: str, declared_at: int):
+    """Channels of vec4 `name` read through swizzles; all four when it is used whole."""
+    channels = set()
+    for match in re.finditer(rf'(?<![.\w]){re.escape(name)}\b', text):
+        if match.start() == declared_at or ASSIGNMENT_PATTERN.match(text, match.end()):
+            continue
+        swizzle = SWIZZLE_PATTERN.match(text, match.end())
+        if swizzle is None:
+            return ALL_CHANNELS
+        channels.update(CHANNEL_INDEX[letter] for letter in swizzle.group(1))
+    return channels
+
+
+@functools.lru_cache(maxsize=None)
+def channels_read(text: str, sampler: str, forwarded=ALL_CHANNELS):
+    """Channels of `sampler` the code reads; all four when a read cannot be followed.
+
+    `forwarded` is what the pass's own consumers read of a texel written
+    straight to FragColor.
+    """
+    channels = set()
+    for match in re.finditer(rf'\b{re.escape(sampler)}\b', text):
+        before_start = max(0, match.start() - 48)
+        before = text[before_start:match.start()]
+        if re.search(r'\bsampler\w*\s+$', before):
+            continue
+        call = TEXTURE_CALL_PATTERN.search(before)
+        if call is None:
+            return ALL_CHANNELS
+        if call.group(1) in SIZE_QUERIES:
+            continue
+        call_start = before_start + call.start()
+        open_paren = text.rindex('(', 0, match.start())
+        end = closing_paren(text, open_paren) + 1
+        swizzle = SWIZZLE_PATTERN.match(text, end)
+        if swizzle is not None:
+            channels.update(CHANNEL_INDEX[letter] for letter in swizzle.group(1))
+            continue
+        store = STORE_PATTERN.search(text, max(0, call_start - 80), call_start)
+        if store is None or not STATEMENT_END_PATTERN.match(text, end):
+            return ALL_CHANNELS
+        name = store.group(1)
+        if name == 'FragColor':
+            channels |= forwarded
+        else:
+            channels |= variable_channels(text, name, store.start(1))
+        if len(channels) == 4:
+            return ALL_CHANNELS
+    return frozenset(channels)
+
+
+@dataclass(frozen=True)
+class ShaderText:
+    expanded: list
+    text: str
+    tokens: frozenset
+    pragma_format: str | None
+    names: frozenset
+
+
+@functools.lru_cache(maxsize=None)
+def read_shader(shader_file: Path) -> ShaderText:
+    """Expanded source of a shader; presets share passes, so each file is read once per run."""
+    expanded = shader_source.expand_includes(shader_file)
+    text = strip_comments('\n'.join(line for _, line in expanded if not PRAGMA_PATTERN.match(line)))
+    pragma_format = None
+    names = set()
+    for _, line in expanded:
+        match = FORMAT_PATTERN.match(line)
+        if match:
+            pragma_format = match.group(2)
+        match = PASS_NAME_PATTERN.match(line)
+        if match:
+            names.add(match.group(1))
+    return ShaderText(expanded, text, frozenset(TOKEN_PATTERN.findall(text)), pragma_format, frozenset(names))
+
+
+class PresetPass:
+    def __init__(self, index: int, values: dict, shader_file: Path):
+        self.index = index
+        self.shader_file = shader_file
+        shader = read_shader(shader_file)
+        self.expanded = shader.expanded
+        self.text = shader.text
+        self.tokens = shader.tokens
+        self.pragma_format = shader.pragma_format
+        names = set(shader.names)
+        alias = values.get(f'alias{index}')
+        if alias:
+            names.add(alias)
+        self.aliases = names
+        if self.pragma_format:
+            self.format = self.pragma_format
+        elif values.get(f'float_framebuffer{index}', 'false') == 'true':
+            self.format = FLOAT_FRAMEBUFFER_FORMAT
+        elif values.get(f'srgb_framebuffer{index}', 'false') == 'true':
+            self.format = 'R8G8B8A8_SRGB'
+        else:
+            self.format = DEFAULT_FORMAT
+
+
+def consumed_channels(passes, position: int, consumed):
+    """Channels of pass `position` read downstream; `consumed` holds the answer for every later pass."""
+    current = passes[position]
+    reader = passes[position + 1]
+    channels = set(channels_read(reader.text, 'Source', consumed[position + 1]))
+    for alias in current.aliases:
+        for index, other in enumerate(passes):
+            # A feedback read sees the previous frame, whose consumers are unknown
+            forwarded = consumed.get(index, ALL_CHANNELS)
+            if alias in other.tokens:
+                channels |= channels_read(other.text, alias, forwarded)
+            if f'{alias}Feedback' in other.tokens:
+                channels |= channels_read(other.text, f'{alias}Feedback', ALL_CHANNELS)
+    return frozenset(channels)
+
+
+@dataclass
+class Recommendation:
+    shader: str
+    current: str
+    format: str
+    channels: frozenset
+    error: float
+
+
+def recommend(current: PresetPass, channels, encoding: str, bits: int, threshold: float):
+    current_format = FORMATS.get(current.format)
+    if current_format is None or current_format.component != 'half':
+        return None
+    needed = max(channels) + 1 if channels else 1
+    signal = SIGNALS.get(current.shader_file.name)
+    best = None
+    for name, candidate in FORMATS.items():
+        if candidate.bytes_per_pixel >= current_format.bytes_per_pixel or candidate.channels < needed:
+            continue
+        if candidate.component == current_format.component:
+            error = 0.0
+        elif signal is None:
+            continue
+        else:
+            error = quantization_error(candidate.component, signal, encoding, bits)
+        if error > threshold:
+            continue
+        if best is None or candidate.bytes_per_pixel < FORMATS[best[0]].bytes_per_pixel:
+            best = (name, error)
+    if best is None:
+        return None
+    return Recommendation(current.shader_file.name, current.format, best[0], channels, best[1])
+
+
+def analyze_preset(preset_path: Path, threshold: float):
+    """Return (lines, passes, {pass index: Recommendation})."""
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+    passes = []
+    for idx in range(slangp.shader_count(values)):
+        shader_path = values.get(f'shader{idx}', '')
+        shader_file = (preset_path.parent / shader_path).resolve()
+        if not shader_file.is_file():
+            print(f"Warning: {shader_path} not found for {preset_path}; skipping format check")
+            return lines, passes, {}
+        passes.append(PresetPass(idx, values, shader_file))
+    if not passes or any(INDEXED_REFERENCE_PATTERN.search(p.text) for p in passes):
+        return lines, passes, {}
+
+    encoding, bits = OUTPUT_ENCODINGS.get(passes[-1].shader_file.name, ('srgb', 8))
+    recommendations = {}
+    # The last pass writes the viewport; earlier passes see what their consumers read
+    consumed = {len(passes) - 1: ALL_CHANNELS}
+    for position in reversed(range(len(passes) - 1)):
+        channels = consumed_channels(passes, position, consumed)
+        consumed[position] = channels
+        recommendation = recommend(passes[position], channels, encoding, bits, threshold)
+        if recommendation is not None:
+            recommendations[position] = recommendation
+    return lines, passes, dict(sorted(recommendations.items()))
+
+
+def check_preset(preset_path: Path, threshold: float, verbose=False):
+    _, _, recommendations = analyze_preset(preset_path, threshold)
+    if verbose and recommendations:
+        found = ', '.join(f'{r.shader} -> {r.format}' for r in recommendations.values())
+        print(f"Cheaper formats: {preset_path} ({found})")
+    return recommendations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recommend cheaper render-target formats for generated presets')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing shaders/ and presets/')
+    parser.add_argument('--input-dir', type=Path, action='append', default=[], help='Preset folder to check (repeatable)')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f'Largest accepted quantization error in output code values (default: {DEFAULT_THRESHOLD})',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+
+    # (shader, current, recommended) -> [preset count, channels, error]
+    summary = {}
+    for input_dir in args.input_dir:
+        if not input_dir.exists():
+            print(f"Warning: Input directory not found: {input_dir}")
+            continue
+        presets = sorted(input_dir.rglob('*.slangp'))
+        print(f"Checking render-target formats for {input_dir.name} ({len(presets)} preset(s))")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(check_preset, preset, args.threshold, args.verbose)
+                for preset in presets
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                for recommendation in future.result().values():
+                    key = (recommendation.shader, recommendation.current, recommendation.format)
+                    entry = summary.setdefault(key, [0, set(), 0.0])
+                    entry[0] += 1
+                    entry[1] |= recommendation.channels
+                    entry[2] = max(entry[2], recommendation.error)
+
+    for (shader, current, recommended), (count, channels, error) in sorted(summary.items()):
+        read = ''.join('rgba'[idx] for idx in sorted(channels)) or '-'
+        print(f"  {shader}: {current} -> {recommended} (reads {read}, max error {error:.3f} LSB, {count} preset(s))")
+    print(f"Format check complete: {len(summary)} recommendation(s).")
+
+
+if __name__ == '__main__':
+    main()
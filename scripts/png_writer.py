@@ -0,0 +1,75 @@
+"""
+Minimal PNG encoder for build-time baked textures.
+
+Only what the bakers need: 8-bit or 16-bit RGB/RGBA (or gray) images written
+from rows of normalized floats. Uses the standard library so baking does not
+add a dependency to the build.
+"""
+
+from __future__ import annotations
+
+import struct
+import zlib
+from pathlib import Path
+
+
+COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(kind + data) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+
+def quantize(value: float, bit_depth: int = 8) -> int:
+    max_code = (1 << bit_depth) - 1
+    return int(min(max(value, 0.0), 1.0) * max_code + 0.5)
+
+
+def encode_png(
+    width: int,
+    height: int,
+    rows: list[list[float]],
+    channels: int = 4,
+    bit_depth: int = 8,
+) -> bytes:
+    """Encode `rows` (height lists of width * channels floats in [0, 1])."""
+    if channels not in COLOR_TYPES:
+        raise ValueError(f"Unsupported channel count: {channels}")
+    if bit_depth not in (8, 16):
+        raise ValueError(f"Unsupported bit depth: {bit_depth}")
+    if len(rows) != height:
+        raise ValueError(f"Expected {height} rows, got {len(rows)}")
+
+    raw = bytearray()
+    for row in rows:
+        if len(row) != width * channels:
+            raise ValueError(f"Expected {width * channels} samples per row, got {len(row)}")
+        raw.append(0)  # filter type: none
+        codes = [quantize(value, bit_depth) for value in row]
+        if bit_depth == 8:
+            raw.extend(bytes(codes))
+        else:
+            raw.extend(struct.pack(f">{len(codes)}H", *codes))
+
+    header = struct.pack(">IIBBBBB", width, height, bit_depth, COLOR_TYPES[channels], 0, 0, 0)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _chunk(b"IHDR", header),
+            _chunk(b"IDAT", zlib.compress(bytes(raw), 9)),
+            _chunk(b"IEND", b""),
+        ]
+    )
+
+
+def write_png(
+    path: Path,
+    width: int,
+    height: int,
+    rows: list[list[float]],
+    channels: int = 4,
+    bit_depth: int = 8,
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(encode_png(width, height, rows, channels=channels, bit_depth=bit_depth))
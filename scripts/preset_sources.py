@@ -0,0 +1,144 @@
+"""
+What each presetgen input reads, for tools that rebuild only what changed.
+
+An input JSON under presetdata/input/ reads its pipelines and parameter sets,
+the shaders those pipelines name (with their `#include` chains) and presetgen
+itself. `dependencies` lists those files; `FileHashes` hashes them once per
+(mtime, size), so long-lived processes can tell cheaply whether an input's
+output is still current.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+import shader_source
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PRESETDATA = ROOT / 'presetdata'
+PRESETGEN_DIR = ROOT / 'external' / 'presetgen'
+
+
+def input_files(presetdata_dir: Path = PRESETDATA):
+    return sorted((presetdata_dir / 'input').rglob('*.json'))
+
+
+def _json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def pipeline_shaders(pipeline: Path):
+    """Return the shader files a pipeline JSON names (`root_path` + name + `.slang`)."""
+    data = _json(pipeline)
+    root = pipeline.parent / data.get('root_path', '.')
+    return [(root / f'{name}.slang').resolve() for name in data.get('shaders', {}).values()]
+
+
+def shader_closure(shader_file: Path):
+    """Return `shader_file` and every file its `#include` chain pulls in."""
+    if not shader_file.is_file():
+        return {shader_file}
+    return {source for source, _ in shader_source.expand_includes(shader_file)} | {shader_file.resolve()}
+
+
+def dependencies(infile: Path, closures: dict | None = None):
+    """Return every file presetgen reads for `infile`, sorted.
+
+    `closures` caches shader include chains between calls; drop it when shaders change.
+    """
+    closures = {} if closures is None else closures
+    infile = infile.resolve()
+    data = _json(infile)
+    pipeline_root = infile.parent / data.get('pipeline_root', '.')
+    parameter_root = infile.parent / data.get('parameter_root', '.')
+    pipelines = [(pipeline_root / name).resolve() for name in data.get('pipelines', [])]
+    files = {infile, *pipelines}
+    files.update((parameter_root / name).resolve() for name in data.get('parameter_sets', []))
+    for pipeline in pipelines:
+        for shader_file in pipeline_shaders(pipeline):
+            if shader_file not in closures:
+                closures[shader_file] = shader_closure(shader_file)
+            files.update(closures[shader_file])
+    files.update(path.resolve() for path in PRESETGEN_DIR.rglob('*.py'))
+    return sorted(files)
+
+
+class FileHashes:
+    """sha1 of file contents, recomputed only when mtime or size change; safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes = {}
+
+    def hash(self, path: Path) -> str:
+        try:
+            stat = path.stat()
+        except OSError:
+            return 'missing'
+        state = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[0] == state:
+            return cached[1]
+        digest = hashlib.sha1(path.read_bytes()).hexdigest()
+        with self._lock:
+            self._hashes[path] = (state, digest)
+        return digest
+
+    def digest(self, paths, root: Path = ROOT) -> str:
+        """Combined hash of `paths` (names relative to `root`, and contents).
+
+        Relative names keep the hash the same for a checkout in another folder,
+        so a cache restored there (CI, a second clone) still matches.
+        """
+        combined = hashlib.sha1()
+        for path in paths:
+            try:
+                name = path.relative_to(root).as_posix()
+            except ValueError:
+                name = path.as_posix()
+            combined.update(f'{name}\0{self.hash(path)}\n'.encode('utf-8'))
+        return combined.hexdigest()
+
+
+class PresetgenMemo:
+    """Presetgen output per input, keyed by the digest of what the input reads; safe to share between threads."""
+
+    def __init__(self, hashes: FileHashes | None = None):
+        self.hashes = hashes or FileHashes()
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._outputs = {}
+        self._closures = {}
+
+    def refresh(self):
+        """Forget shader include chains; call before each build."""
+        with self._lock:
+            self._closures = {}
+            self.hits = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._outputs)
+
+    def key(self, infile: Path) -> str:
+        return self.hashes.digest(dependencies(Path(infile), self._closures))
+
+    def get(self, key: str):
+        """Return {relative path: bytes} stored under `key`, or None."""
+        with self._lock:
+            outputs = self._outputs.get(key)
+            if outputs is not None:
+                self.hits += 1
+            return outputs
+
+    def put(self, key: str, outputs: dict):
+        with self._lock:
+            self._outputs[key] = outputs
@@ -0,0 +1,53 @@
+"""
+Streaming traversal shared by the preset generators.
+
+`walk` yields matching files one directory at a time instead of listing the
+whole tree first. Entries are sorted within each directory, so files come in
+the same order as `sorted(rglob(...))` on every file system. `map_bounded`
+runs a function over an iterable on a thread pool with at most `in_flight`
+tasks submitted: the next item is pulled only when the oldest task has been
+collected. Memory therefore stays flat however many presets a folder holds,
+and results come back in submission order.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+
+def walk(directory: Path, suffix: str = '.slangp') -> Iterator[Path]:
+    """Yield files under `directory` ending in `suffix`, depth first."""
+    try:
+        with os.scandir(directory) as scan:
+            entries = sorted(scan, key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.is_dir():
+            yield from walk(Path(entry.path), suffix)
+        elif entry.name.endswith(suffix):
+            yield Path(entry.path)
+
+
+def map_bounded(fn: Callable, items: Iterable, jobs: int, in_flight: int | None = None) -> Iterator:
+    """Yield fn(item) for every item in order, with at most `in_flight` (default 2 * jobs) tasks pending."""
+    in_flight = in_flight or 2 * jobs
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for item in items:
+            if len(pending) >= in_flight:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, item))
+        while pending:
+            yield pending.popleft().result()
+
+
+def lines(path: Path) -> Iterator[str]:
+    """Yield the lines of a text file without line endings, reading one line at a time."""
+    with path.open(encoding='utf-8') as source:
+        for line in source:
+            yield line.rstrip('\n')
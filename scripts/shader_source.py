@@ -0,0 +1,269 @@
+"""
+Shared helpers for reading Scanline Classic shader sources from Python tools.
+
+Resolves `#include` chains the same way RetroArch's slang preprocessor does
+(relative to the including file), tracks `#if`/`#ifdef`/`#else`/`#endif`
+against a set of defines, and extracts `#pragma parameter` declarations.
+`#pragma include_optional "../config/options.cfg"` is not followed: tools see
+the shipped defaults (no options enabled) unless they pass OPTION_* defines.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+
+INCLUDE_PATTERN = re.compile(r'^\s*#include\s+"([^"]+)"')
+INCLUDE_OPTIONAL_PATTERN = re.compile(r'^(\s*#pragma\s+include_optional\s+)"([^"]+)"(.*)$')
+DEFINE_PATTERN = re.compile(r"^\s*#\s*define\s+(\w+)(?:\s+(.*))?$")
+UNDEF_PATTERN = re.compile(r"^\s*#\s*undef\s+(\w+)")
+IFDEF_PATTERN = re.compile(r"^\s*#\s*(ifdef|ifndef)\s+(\w+)")
+IF_PATTERN = re.compile(r"^\s*#\s*(if|elif)\b(.*)$")
+ELSE_PATTERN = re.compile(r"^\s*#\s*else\b")
+ENDIF_PATTERN = re.compile(r"^\s*#\s*endif\b")
+DEFINED_PATTERN = re.compile(r"defined\s*\(?\s*(\w+)\s*\)?")
+PARAMETER_PATTERN = re.compile(
+    r'^\s*#pragma\s+parameter\s+(?P<name>\w+)\s+"(?P<label>[^"]*)"\s+'
+    r"(?P<default>\S+)\s+(?P<minimum>\S+)\s+(?P<maximum>\S+)(?:\s+(?P<step>\S+))?"
+)
+
+
+@dataclass(frozen=True)
+class ShaderParameter:
+    name: str
+    label: str
+    default: float
+    minimum: float
+    maximum: float
+    step: float
+    source: Path
+
+
+def resolve_include(parent_file: Path, include_target: str) -> Path | None:
+    candidate = (parent_file.parent / include_target).resolve()
+    if candidate.is_file():
+        return candidate
+    return None
+
+
+def _evaluate_condition(expression: str, defines: dict[str, str]) -> bool:
+    """Best-effort `#if` evaluation: handles defined(), !, &&, || and integers."""
+    expression = expression.split("//", 1)[0].strip()
+    python_expr = DEFINED_PATTERN.sub(lambda m: "1" if m.group(1) in defines else "0", expression)
+    python_expr = python_expr.replace("&&", " and ").replace("||", " or ")
+    python_expr = re.sub(r"!(?!=)", " not ", python_expr)
+
+    def macro_value(match: re.Match) -> str:
+        name = match.group(0)
+        if name in ("and", "or", "not"):
+            return name
+        if name not in defines:
+            return "0"
+        return defines[name] or "1"
+
+    python_expr = re.sub(r"\b[A-Za-z_]\w*\b", macro_value, python_expr)
+    try:
+        return bool(eval(python_expr, {"__builtins__": {}}, {}))  # noqa: S307 - tokens are sanitized above
+    except Exception:
+        # Unknown expression; keep the block so callers never lose declarations.
+        return True
+
+
+def preprocess_lines(
+    path: Path,
+    defines: dict[str, str] | None = None,
+    stack: tuple[Path, ...] = (),
+) -> list[tuple[Path, int, str]]:
+    """Return (file, line number, text) for every active line, includes expanded.
+
+    `defines` is updated in place as `#define`/`#undef` lines are encountered,
+    matching the single-pass behaviour of the slang preprocessor.
+    """
+    if defines is None:
+        defines = {}
+    path = path.resolve()
+    if path in stack:
+        return []
+
+    out: list[tuple[Path, int, str]] = []
+    # Each frame: (parent_active, this_branch_active, any_branch_taken)
+    frames: list[tuple[bool, bool, bool]] = []
+
+    def active() -> bool:
+        return not frames or (frames[-1][0] and frames[-1][1])
+
+    for idx, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        ifdef_match = IFDEF_PATTERN.match(line)
+        if ifdef_match:
+            is_defined = ifdef_match.group(2) in defines
+            taken = is_defined if ifdef_match.group(1) == "ifdef" else not is_defined
+            frames.append((active(), taken, taken))
+            continue
+
+        if_match = IF_PATTERN.match(line)
+        if if_match:
+            if if_match.group(1) == "if":
+                taken = _evaluate_condition(if_match.group(2), defines)
+                frames.append((active(), taken, taken))
+            elif frames:
+                parent, _, any_taken = frames[-1]
+                taken = not any_taken and _evaluate_condition(if_match.group(2), defines)
+                frames[-1] = (parent, taken, any_taken or taken)
+            continue
+
+        if ELSE_PATTERN.match(line):
+            if frames:
+                parent, _, any_taken = frames[-1]
+                frames[-1] = (parent, not any_taken, True)
+            continue
+
+        if ENDIF_PATTERN.match(line):
+            if frames:
+                frames.pop()
+            continue
+
+        if not active():
+            continue
+
+        define_match = DEFINE_PATTERN.match(line)
+        if define_match:
+            defines[define_match.group(1)] = (define_match.group(2) or "").strip()
+        undef_match = UNDEF_PATTERN.match(line)
+        if undef_match:
+            defines.pop(undef_match.group(1), None)
+
+        include_match = INCLUDE_PATTERN.match(line)
+        if include_match:
+            include_path = resolve_include(path, include_match.group(1))
+            if include_path is not None:
+                out.extend(preprocess_lines(include_path, defines, stack + (path,)))
+                continue
+
+        out.append((path, idx, line))
+
+    return out
+
+
+def expand_includes(path: Path, stack: tuple[Path, ...] = ()) -> list[tuple[Path, str]]:
+    """Return (file, line) for every line with `#include`s expanded, ignoring conditionals.
+
+    This is the text RetroArch hands to glslang: includes are inlined before
+    any `#if` is evaluated.
+    """
+    path = path.resolve()
+    if path in stack:
+        return []
+    out: list[tuple[Path, str]] = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        match = INCLUDE_PATTERN.match(line)
+        if match:
+            include_path = resolve_include(path, match.group(1))
+            if include_path is not None:
+                out.extend(expand_includes(include_path, stack + (path,)))
+                continue
+            print(f"Warning: unresolved include {match.group(1)!r} in {path}")
+        out.append((path, line))
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def expanded_source(path: Path) -> tuple[tuple[Path, str], ...]:
+    """`expand_includes` for `path`, read once per process; presets share passes."""
+    return tuple(expand_includes(path))
+
+
+def rebase_include_optional(source: Path, line: str, target_dir: Path) -> str:
+    """Rewrite a `#pragma include_optional` path in `source` for a copy placed in `target_dir`."""
+    match = INCLUDE_OPTIONAL_PATTERN.match(line)
+    if not match:
+        return line
+    target = (source.parent / match.group(2)).resolve()
+    relative = Path(os.path.relpath(target, target_dir)).as_posix()
+    return f'{match.group(1)}"{relative}"{match.group(3)}'
+
+
+def _to_float(value: str | None, fallback: float = 0.0) -> float:
+    if value is None:
+        return fallback
+    try:
+        return float(value)
+    except ValueError:
+        return fallback
+
+
+@functools.lru_cache(maxsize=None)
+def _collect_parameters_cached(path: Path, define_items: tuple[tuple[str, str], ...]) -> tuple[ShaderParameter, ...]:
+    params: dict[str, ShaderParameter] = {}
+    for source, _, line in preprocess_lines(path, dict(define_items)):
+        match = PARAMETER_PATTERN.match(line)
+        if not match or match.group("name") in params:
+            continue
+        params[match.group("name")] = ShaderParameter(
+            name=match.group("name"),
+            label=match.group("label"),
+            default=_to_float(match.group("default")),
+            minimum=_to_float(match.group("minimum")),
+            maximum=_to_float(match.group("maximum")),
+            step=_to_float(match.group("step")),
+            source=source,
+        )
+    return tuple(params.values())
+
+
+def collect_parameters(path: Path, defines: dict[str, str] | None = None) -> dict[str, ShaderParameter]:
+    """Return the `#pragma parameter` declarations active for `path`, in order."""
+    define_items = tuple(sorted((defines or {}).items()))
+    return {param.name: param for param in _collect_parameters_cached(path.resolve(), define_items)}
+
+
+def clear_caches() -> None:
+    """Forget parsed shaders; long-lived processes call this when shader files change."""
+    _collect_parameters_cached.cache_clear()
+    expanded_source.cache_clear()
+
+
+def strip_comments(lines: list[str]) -> list[str]:
+    """Remove `//` and `/* */` comments line by line, leaving string literals alone.
+
+    The result has one entry per input line, so callers can keep pairing it
+    with line sources.
+    """
+    out: list[str] = []
+    in_block = False
+    for line in lines:
+        kept: list[str] = []
+        idx = 0
+        in_string = False
+        while idx < len(line):
+            if in_block:
+                end = line.find("*/", idx)
+                if end == -1:
+                    idx = len(line)
+                    break
+                # A comment separates tokens like a space does
+                in_block = False
+                idx = end + 2
+                kept.append(" ")
+                continue
+            char = line[idx]
+            if in_string:
+                kept.append(char)
+                in_string = char != '"'
+                idx += 1
+                continue
+            if char == '"':
+                in_string = True
+            elif line.startswith("//", idx):
+                break
+            elif line.startswith("/*", idx):
+                in_block = True
+                idx += 2
+                continue
+            kept.append(char)
+            idx += 1
+        out.append("".join(kept).rstrip())
+    return out
@@ -0,0 +1,163 @@
+"""
+Shared helpers for reading and rewriting RetroArch .slangp presets.
+
+Generated presets are plain `key = value` lines. Values may or may not be
+quoted depending on the writer (PresetGen leaves shader paths bare and quotes
+parameter values), so the helpers here always strip quotes on read and keep
+the original line text untouched unless a value is explicitly replaced.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+
+
+SHADER_KEY_PATTERN = re.compile(r"^shader(\d+)$")
+# Passes that only feed the bezel glow, in pipeline order
+GLOW_SHADERS = ("glow-reduce.slang", "glow-h.slang", "glow-v.slang")
+# Keys that carry a pass index suffix (`scale_type_x` before `scale_type` so the
+# longer prefix wins)
+PASS_KEYS = (
+    "shader",
+    "alias",
+    "filter_linear",
+    "wrap_mode",
+    "mipmap_input",
+    "float_framebuffer",
+    "srgb_framebuffer",
+    "frame_count_mod",
+    "scale_type_x",
+    "scale_type_y",
+    "scale_type",
+    "scale_x",
+    "scale_y",
+    "scale",
+)
+PASS_KEY_PATTERN = re.compile(r"^(" + "|".join(PASS_KEYS) + r")(\d+)$")
+
+
+def split_assignment(line: str) -> tuple[str, str] | None:
+    """Return (key, unquoted value) for an assignment line, or None."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#") or "=" not in stripped:
+        return None
+    key, value = stripped.split("=", 1)
+    return key.strip(), unquote(value)
+
+
+def unquote(value: str) -> str:
+    return value.strip().strip('"')
+
+
+def values_from_lines(lines: list[str]) -> dict[str, str]:
+    """Parse preset lines into an ordered key -> value mapping (last assignment wins)."""
+    values: dict[str, str] = {}
+    for line in lines:
+        assignment = split_assignment(line)
+        if assignment:
+            values[assignment[0]] = assignment[1]
+    return values
+
+
+def read_preset_values(path: Path) -> dict[str, str]:
+    return values_from_lines(path.read_text(encoding="utf-8").splitlines())
+
+
+def shader_count(values: dict[str, str]) -> int:
+    try:
+        return int(float(values.get("shaders", "0")))
+    except ValueError:
+        return 0
+
+
+def texture_names(values: dict[str, str]) -> list[str]:
+    raw = values.get("textures", "")
+    return [name.strip() for name in raw.split(";") if name.strip()]
+
+
+def find_shader_index(values: dict[str, str], shader_name: str) -> int | None:
+    """Return the pass index whose shader file name is `shader_name`, if any."""
+    for idx in range(shader_count(values)):
+        shader_path = values.get(f"shader{idx}", "").replace("\\", "/")
+        if shader_path.rsplit("/", 1)[-1] == shader_name:
+            return idx
+    return None
+
+
+def replace_value(lines: list[str], key: str, value: str, quote: bool = True) -> bool:
+    """Replace the value of `key` in place. Returns False when the key is absent."""
+    formatted = f'{key} = "{value}"' if quote else f"{key} = {value}"
+    for idx, line in enumerate(lines):
+        assignment = split_assignment(line)
+        if assignment and assignment[0] == key:
+            lines[idx] = formatted
+            return True
+    return False
+
+
+def set_value(lines: list[str], key: str, value: str, quote: bool = True) -> None:
+    """Replace `key` if present, otherwise append it."""
+    if not replace_value(lines, key, value, quote=quote):
+        lines.append(f'{key} = "{value}"' if quote else f"{key} = {value}")
+
+
+def relative_preset_path(preset_path: Path, target: Path) -> str:
+    """Return `target` relative to the preset's folder, in forward-slash form."""
+    return Path(os.path.relpath(target, preset_path.parent)).as_posix()
+
+
+def reindex_passes(lines: list[str], dropped: set[int], count: int) -> list[str]:
+    """Remove per-pass keys of `dropped` passes and renumber the remaining ones."""
+    mapping: dict[int, int] = {}
+    for idx in range(count):
+        if idx not in dropped:
+            mapping[idx] = len(mapping)
+
+    out: list[str] = []
+    for line in lines:
+        assignment = split_assignment(line)
+        if assignment:
+            match = PASS_KEY_PATTERN.match(assignment[0])
+            if match and int(match.group(2)) < count:
+                idx = int(match.group(2))
+                if idx in dropped:
+                    continue
+                line = line.replace(assignment[0], f"{match.group(1)}{mapping[idx]}", 1)
+        out.append(line)
+    replace_value(out, "shaders", str(len(mapping)), quote=False)
+    return out
+
+
+def pass_keeps_size(values: dict[str, str], idx: int) -> bool:
+    """True when pass `idx` renders at its input size (scale_type source, scale 1.0)."""
+    for axis in ("_x", "_y"):
+        scale_type = values.get(f"scale_type{axis}{idx}", values.get(f"scale_type{idx}", "source"))
+        if scale_type != "source":
+            return False
+        try:
+            scale = float(values.get(f"scale{axis}{idx}", values.get(f"scale{idx}", "1.0")))
+        except ValueError:
+            return False
+        if scale != 1.0:
+            return False
+    return True
+
+
+def drop_glow_passes(lines: list[str]) -> bool:
+    """Remove the glow passes in place and set GLOW_WEIGHT = 0.0.
+
+    Returns False when there are none, or one is the last pass.
+    """
+    values = values_from_lines(lines)
+    count = shader_count(values)
+    dropped = {
+        idx for idx in range(count)
+        if values.get(f"shader{idx}", "").replace("\\", "/").rsplit("/", 1)[-1] in GLOW_SHADERS
+    }
+    if not dropped or max(dropped) == count - 1:
+        return False
+    lines[:] = reindex_passes(lines, dropped, count)
+    set_value(lines, "GLOW_WEIGHT", "0.0")
+    return True
@@ -0,0 +1,301 @@
+"""
+Emits per-preset specialized shader passes with preset-constant mode parameters folded into #defines.
+Rules:
+- Candidate parameters are the system mode switches in SPECIALIZED_PARAMETERS
+  (plus any given with --parameter). Their value is the preset's value, or the
+  declaring shader's default when the preset does not set one.
+- A pass is specialized for a parameter only when the parameter is a float
+  member of its push/UBO block and every use goes through the semantic alias
+  (`#define NAME config.NAME` or `global.NAME`). Otherwise the parameter stays
+  live for the whole preset.
+- The specialized source is the pass with its includes expanded in place (as
+  RetroArch's preprocessor does), the member removed, the alias replaced by
+  `#define NAME <value>` and the `#pragma parameter NAME` line dropped, so the
+  compiler can fold the branches and the menu no longer shows a dead slider.
+  `#pragma include_optional` paths are rewritten for the new location.
+- Each shader is expanded and scanned once per run (ShaderUses): one pass
+  over its source records block members, aliases, qualified references and
+  declared parameters for every name, so a preset only does set lookups.
+- Files go to `shaders/specialized/<shader>-<sha1[:12]>.slang`, named by the
+  content hash so identical specializations are shared across the catalogue;
+  `specialized.json` records the source and folded values of each.
+- Run after the other generation and baking steps: it rewrites `shaderN` in
+  place, and later steps look passes up by their original file names.
+"""
+import argparse
+import concurrent.futures
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import shader_source
+import slangp
+
+
+SPECIALIZED_PARAMETERS = (
+    'SC_FREQ_MODE',
+    'PIXEL_CLOCK_MODE',
+    'H_FREQ_MODE',
+    'V_FREQ_MODE',
+    'PAL',
+    'FIELD_ORDER',
+    'SHORTEN_ODD_FIELD_TIME',
+)
+
+
+MEMBER_PATTERN = re.compile(r'^\s*float\s+(\w+)\s*;')
+ALIAS_PATTERN = re.compile(r'^\s*#\s*define\s+(\w+)\s+(?:config|global)\.(\w+)\s*(//.*)?$')
+PARAMETER_PATTERN = re.compile(r'^\s*#pragma\s+parameter\s+(\w+)\s')
+REFERENCE_PATTERN = re.compile(r'\b(?:config|global)\.(\w+)\b')
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def member_pattern(name: str):
+    return re.compile(rf'^\s*float\s+{name}\s*;')
+
+
+def alias_pattern(name: str):
+    return re.compile(rf'^\s*#\s*define\s+{name}\s+(config|global)\.{name}\s*(//.*)?$')
+
+
+def parameter_pattern(name: str):
+    return re.compile(rf'^\s*#pragma\s+parameter\s+{name}\s')
+
+
+@dataclass(frozen=True)
+class ShaderUses:
+    expanded: tuple
+    members: frozenset
+    aliases: frozenset
+    # Names used as config.NAME/global.NAME, and those used so outside their alias
+    referenced: frozenset
+    stray: frozenset
+    declared: frozenset
+
+    def uses(self, name: str) -> bool:
+        return name in self.referenced
+
+    def foldable(self, name: str) -> bool:
+        """True when `name` is a block member whose only qualified use is its alias."""
+        return name in self.members and name in self.aliases and name not in self.stray
+
+    def declares(self, name: str) -> bool:
+        return name in self.declared
+
+
+@functools.lru_cache(maxsize=None)
+def shader_uses(shader_file: Path) -> ShaderUses:
+    expanded = shader_source.expanded_source(shader_file)
+    members, aliases, referenced, stray, declared = set(), set(), set(), set(), set()
+    for _, line in expanded:
+        member = MEMBER_PATTERN.match(line)
+        if member:
+            members.add(member.group(1))
+            continue
+        parameter = PARAMETER_PATTERN.match(line)
+        if parameter:
+            declared.add(parameter.group(1))
+        alias = ALIAS_PATTERN.match(line)
+        if alias and alias.group(1) == alias.group(2):
+            aliases.add(alias.group(1))
+            referenced.add(alias.group(1))
+            continue
+        names = REFERENCE_PATTERN.findall(line)
+        referenced.update(names)
+        stray.update(names)
+    return ShaderUses(
+        expanded, frozenset(members), frozenset(aliases), frozenset(referenced), frozenset(stray), frozenset(declared),
+    )
+
+
+def format_value(value: float) -> str:
+    return repr(float(value))
+
+
+@functools.lru_cache(maxsize=None)
+def specialized_text(shader_file: Path, folded_items: tuple, dropped: frozenset, target_dir: Path) -> str:
+    """Specialized source of `shader_file`; presets folding the same values share it."""
+    lines = specialize_lines(shader_uses(shader_file).expanded, dict(folded_items), dropped, target_dir)
+    return '\n'.join(lines) + '\n'
+
+
+def specialize_lines(lines, folded: dict, dropped: set, target_dir: Path):
+    """Rewrite expanded source lines: fold members/aliases and drop parameter pragmas."""
+    patterns = {name: (member_pattern(name), alias_pattern(name)) for name in folded}
+    drop = [parameter_pattern(name) for name in dropped]
+    out = []
+    for source, line in lines:
+        if any(pattern.match(line) for pattern in drop):
+            continue
+        replaced = False
+        for name, (member, alias) in patterns.items():
+            if member.match(line):
+                replaced = True
+                break
+            if alias.match(line):
+                out.append(f'#define {name} {format_value(folded[name])}')
+                replaced = True
+                break
+        if replaced:
+            continue
+        out.append(shader_source.rebase_include_optional(source, line, target_dir))
+    return out
+
+
+class ShaderSpecializer:
+    """Writes each distinct specialized source once; safe to share between threads."""
+
+    def __init__(self, shaders_dir: Path, verbose=False):
+        self.output_dir = shaders_dir / 'specialized'
+        self.verbose = verbose
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def write(self, shader_file: Path, text: str, folded: dict) -> Path:
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+        path = self.output_dir / f'{shader_file.stem}-{digest}.slang'
+        with self._lock:
+            event = self._pending.get(path)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[path] = event
+        if not owner:
+            event.wait()
+            return path
+
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding='utf-8', newline='\n')
+            if self.verbose:
+                print(f"  Specialized {shader_file.name} -> {path.name}")
+            with self._lock:
+                self.manifest[path.name] = {
+                    'source': shader_file.name,
+                    'parameters': folded,
+                }
+        finally:
+            event.set()
+        return path
+
+    def write_manifest(self):
+        if not self.manifest:
+            return
+        manifest_path = self.output_dir / 'specialized.json'
+        existing = {}
+        if manifest_path.exists():
+            existing = json.loads(manifest_path.read_text(encoding='utf-8'))
+        existing.update(self.manifest)
+        manifest_path.write_text(json.dumps(existing, indent=2, sort_keys=True) + '\n', encoding='utf-8', newline='\n')
+
+
+def preset_value(values: dict, name: str, shader_file: Path):
+    raw = values.get(name)
+    if raw is not None:
+        return float(raw)
+    declared = shader_source.collect_parameters(shader_file)
+    if name in declared:
+        return declared[name].default
+    return None
+
+
+def transform_preset(preset_path: Path, specializer: ShaderSpecializer, candidates, verbose=False):
+    lines = preset_path.read_text(encoding='utf-8').splitlines()
+    values = slangp.values_from_lines(lines)
+
+    passes = []
+    for idx in range(slangp.shader_count(values)):
+        shader_path = values.get(f'shader{idx}', '')
+        shader_file = (preset_path.parent / shader_path).resolve()
+        if not shader_file.is_file():
+            print(f"Warning: {shader_path} not found for {preset_path}; skipping specialization")
+            return False
+        passes.append((idx, shader_file, shader_uses(shader_file)))
+
+    # A parameter is folded for the whole preset or not at all, so the menu
+    # never shows a slider that only some passes still honour.
+    folded = {}
+    for name in candidates:
+        users = [(shader_file, uses) for _, shader_file, uses in passes if uses.uses(name)]
+        if not users or not all(uses.foldable(name) for _, uses in users):
+            continue
+        try:
+            value = preset_value(values, name, users[0][0])
+        except ValueError:
+            print(f"Warning: unreadable {name} in {preset_path}; keeping it live")
+            continue
+        if value is not None:
+            folded[name] = value
+
+    if not folded:
+        return False
+
+    changed = False
+    for idx, shader_file, uses in passes:
+        pass_folded = {name: value for name, value in folded.items() if uses.foldable(name)}
+        dropped = frozenset(name for name in folded if uses.declares(name))
+        if not pass_folded and not dropped:
+            continue
+        text = specialized_text(shader_file, tuple(pass_folded.items()), dropped, specializer.output_dir)
+        specialized = specializer.write(shader_file, text, pass_folded)
+        slangp.replace_value(lines, f'shader{idx}', slangp.relative_preset_path(preset_path, specialized), quote=False)
+        changed = True
+
+    if changed:
+        preset_path.write_text('\n'.join(lines) + '\n', encoding='utf-8', newline='\n')
+        if verbose:
+            folded_text = ', '.join(f'{name}={format_value(value)}' for name, value in folded.items())
+            print(f"Specialized: {preset_path} ({folded_text})")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Specialize preset passes by folding constant mode parameters into #defines')
+    parser.add_argument('--root-dir', type=Path, required=True, help='Root directory containing shaders/ and presets/')
+    parser.add_argument('--input-dir', type=Path, action='append', default=[], help='Preset folder to specialize (repeatable)')
+    parser.add_argument(
+        '--parameter',
+        action='append',
+        default=[],
+        help='Additional parameter to fold when constant (repeatable)',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    jobs = max(1, args.jobs)
+    candidates = list(dict.fromkeys(list(SPECIALIZED_PARAMETERS) + args.parameter))
+    specializer = ShaderSpecializer(args.root_dir / 'shaders', verbose=args.verbose)
+
+    specialized_presets = 0
+    for input_dir in args.input_dir:
+        if not input_dir.exists():
+            print(f"Warning: Input directory not found: {input_dir}")
+            continue
+        presets = sorted(input_dir.rglob('*.slangp'))
+        print(f"Specializing shaders for {input_dir.name} ({len(presets)} preset(s))")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(transform_preset, preset, specializer, candidates, args.verbose)
+                for preset in presets
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                if future.result():
+                    specialized_presets += 1
+
+    specializer.write_manifest()
+    print(f"Shader specialization complete: {specialized_presets} preset(s), {len(specializer.manifest)} specialized pass(es).")
+
+
+if __name__ == '__main__':
+    main()
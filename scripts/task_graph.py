@@ -0,0 +1,95 @@
+"""
+Dependency-driven task scheduler shared by build.py and the build tools.
+
+A task is a callable with a name and the names of the tasks it waits for.
+Tasks run on one worker pool as soon as their dependencies finish, so there
+are no stage barriers: a derived preset starts as soon as its source preset
+is written. Running tasks may add further tasks (e.g. one per preset a
+generator produced); dependencies may name tasks that are added later.
+Each task is traced (build_trace) under the part of its name before `:`.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import threading
+from typing import Callable, Iterable
+
+import build_trace
+
+
+class TaskGraph:
+    """Schedules named tasks on a thread pool in dependency order; `add` is safe from inside tasks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks: dict[str, tuple[Callable[[], object], tuple, tuple]] = {}
+        self._waiting: dict[str, set[str]] = {}
+        self._dependents: dict[str, list[str]] = {}
+        self._done: set[str] = set()
+        self._ready: collections.deque[str] = collections.deque()
+
+    def add(self, name: str, fn: Callable[[], object], deps: Iterable[str] = (), reads=(), writes=()) -> str:
+        """Add a task; `reads` and `writes` are the paths its trace span measures."""
+        with self._lock:
+            if name in self._tasks:
+                raise ValueError(f"duplicate task {name!r}")
+            self._tasks[name] = (fn, tuple(reads), tuple(writes))
+            pending = {dep for dep in deps if dep not in self._done}
+            self._waiting[name] = pending
+            for dep in pending:
+                self._dependents.setdefault(dep, []).append(name)
+            if not pending:
+                self._ready.append(name)
+        return name
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._tasks
+
+    def _run_task(self, name: str) -> object:
+        fn, reads, writes = self._tasks[name]
+        with build_trace.span(name, name.partition(':')[0], reads, writes):
+            return fn()
+
+    def _finish(self, name: str) -> None:
+        with self._lock:
+            self._done.add(name)
+            del self._waiting[name]
+            for dependent in self._dependents.pop(name, []):
+                pending = self._waiting[dependent]
+                pending.discard(name)
+                if not pending:
+                    self._ready.append(dependent)
+
+    def run(self, jobs: int) -> list[tuple[str, BaseException]]:
+        """Run every task; returns (name, exception) for failures.
+
+        After the first failure no new task starts, running ones are allowed
+        to finish, and everything downstream is left unrun.
+        """
+        failures: list[tuple[str, BaseException]] = []
+        running: dict[concurrent.futures.Future, str] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            while True:
+                with self._lock:
+                    while self._ready and not failures:
+                        name = self._ready.popleft()
+                        running[executor.submit(self._run_task, name)] = name
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        failures.append((name, exc))
+                        continue
+                    self._finish(name)
+
+        if not failures and self._waiting:
+            missing = sorted({dep for deps in self._waiting.values() for dep in deps if dep not in self._tasks})
+            raise RuntimeError(f"tasks never became ready; unknown dependencies: {', '.join(missing) or 'cycle'}")
+        return failures
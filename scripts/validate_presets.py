@@ -0,0 +1,363 @@
+"""
+Validates .slangp presets: pass indices, quoting, referenced files, parameters and value syntax.
+Rules:
+- Every line is blank, a `#` comment, `#reference "<path>"` or `key = value`.
+  Values are either bare or wrapped in one pair of double quotes; a stray
+  quote (`float_framebuffer2 = true"`) is an error.
+- `#reference` chains are followed as RetroArch does: the preset at the end
+  supplies passes, texture list and texture options, and referencing presets
+  override parameters and texture paths. Structure keys set in a referencing
+  preset are ignored by RetroArch and reported as warnings; missing targets and
+  cycles are errors.
+- `shaders` must be a positive integer and every pass below it needs a
+  `shaderN` that exists. Per-pass keys (slangp.PASS_KEYS) must have an index
+  below `shaders`, and once a file has started the block of `shaderN`, its
+  per-pass keys must belong to that block (`float_framebuffer4` under
+  `shader3` is an error). A key set twice is a warning.
+- Every name in `textures` needs a path that exists. Pass options and texture
+  options must have the syntax RetroArch parses (booleans, scale types, wrap
+  modes, numbers, identifiers).
+- Every other key is a parameter: it must be declared by a `#pragma parameter`
+  in one of the passes (all `#if` branches count, since options.cfg is only
+  known at install time) or listed in `parameters`, and its value must be a
+  number. Values outside the declared range are warnings.
+- Presets are checked in parallel and shader declarations are read once per
+  file. Exits non-zero on errors, and on warnings with `--strict`.
+"""
+import argparse
+import concurrent.futures
+import functools
+import os
+import re
+import time
+from pathlib import Path
+
+import shader_source
+import slangp
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# Hand-maintained preset folders checked when no --input-dir is given
+SOURCE_DIRS = ('basic', 'demo', 'sys-slangp', 'test-presets', 'tv-slangp')
+STRUCTURE_KEYS = ('shaders', 'textures', 'parameters', 'feedback_pass')
+TEXTURE_OPTION_SUFFIXES = ('_linear', '_mipmap', '_wrap_mode')
+MAX_REFERENCE_DEPTH = 16
+
+BOOLEANS = ('true', 'false', '1', '0')
+SCALE_TYPES = ('source', 'viewport', 'absolute')
+WRAP_MODES = ('clamp_to_border', 'clamp_to_edge', 'repeat', 'mirrored_repeat')
+
+REFERENCE_PATTERN = re.compile(r'^#reference\s+"([^"]+)"\s*$')
+KEY_PATTERN = re.compile(r'^[A-Za-z_]\w*$')
+QUOTED_PATTERN = re.compile(r'^"[^"]*"$')
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_]\w*$')
+DECLARATION_PATTERN = re.compile(r'^\s*#pragma\s+parameter\s+(\w+)')
+
+
+def default_workers():
+    count = os.cpu_count() or 4
+    return max(1, min(32, count))
+
+
+def is_number(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def is_integer(value: str) -> bool:
+    try:
+        int(value)
+    except ValueError:
+        return False
+    return True
+
+
+# Pass key prefix -> (check, expected)
+PASS_VALUE_CHECKS = {
+    'shader': (lambda value: bool(value), 'a path'),
+    'alias': (lambda value: IDENTIFIER_PATTERN.match(value) is not None, 'an identifier'),
+    'filter_linear': (lambda value: value in BOOLEANS, 'true or false'),
+    'mipmap_input': (lambda value: value in BOOLEANS, 'true or false'),
+    'float_framebuffer': (lambda value: value in BOOLEANS, 'true or false'),
+    'srgb_framebuffer': (lambda value: value in BOOLEANS, 'true or false'),
+    'wrap_mode': (lambda value: value in WRAP_MODES, ' or '.join(WRAP_MODES)),
+    'frame_count_mod': (is_integer, 'an integer'),
+    'scale_type_x': (lambda value: value in SCALE_TYPES, ' or '.join(SCALE_TYPES)),
+    'scale_type_y': (lambda value: value in SCALE_TYPES, ' or '.join(SCALE_TYPES)),
+    'scale_type': (lambda value: value in SCALE_TYPES, ' or '.join(SCALE_TYPES)),
+    'scale_x': (is_number, 'a number'),
+    'scale_y': (is_number, 'a number'),
+    'scale': (is_number, 'a number'),
+}
+TEXTURE_VALUE_CHECKS = {
+    '_linear': PASS_VALUE_CHECKS['filter_linear'],
+    '_mipmap': PASS_VALUE_CHECKS['mipmap_input'],
+    '_wrap_mode': PASS_VALUE_CHECKS['wrap_mode'],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def declared_parameters(shader_file: Path):
+    """Return {name: (minimum, maximum) or None} for every `#pragma parameter` in any branch."""
+    declared = {}
+    for _, line in shader_source.expand_includes(shader_file):
+        match = DECLARATION_PATTERN.match(line)
+        if not match or match.group(1) in declared:
+            continue
+        full = shader_source.PARAMETER_PATTERN.match(line)
+        declared[match.group(1)] = None
+        if full and is_number(full.group('minimum')) and is_number(full.group('maximum')):
+            declared[match.group(1)] = (float(full.group('minimum')), float(full.group('maximum')))
+    return declared
+
+
+class Entry:
+    """One assignment: unquoted value, and the file and line that set it."""
+
+    def __init__(self, value: str, path: Path, line: int):
+        self.value = value
+        self.path = path
+        self.line = line
+
+
+class Report:
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+
+    def error(self, path: Path, line: int, message: str):
+        self.errors.append((path, line, message))
+
+    def warning(self, path: Path, line: int, message: str):
+        self.warnings.append((path, line, message))
+
+
+def parse_file(path: Path, report: Report):
+    """Return (reference target or None, {key: Entry}) and report line-level problems."""
+    reference = None
+    entries = {}
+    current_pass = None
+    for number, raw in enumerate(path.read_text(encoding='utf-8').splitlines(), start=1):
+        line = raw.strip()
+        if line.startswith('#reference'):
+            match = REFERENCE_PATTERN.match(line)
+            if not match:
+                report.error(path, number, 'malformed #reference (expected #reference "<path>")')
+            elif reference is not None:
+                report.error(path, number, 'more than one #reference')
+            else:
+                reference = (path.parent / match.group(1), number)
+            continue
+        if not line or line.startswith('#'):
+            continue
+        if '=' not in line:
+            report.error(path, number, f'not a key = value assignment: {line!r}')
+            continue
+
+        key, raw_value = (part.strip() for part in line.split('=', 1))
+        if not KEY_PATTERN.match(key):
+            report.error(path, number, f'malformed key {key!r}')
+            continue
+        if '"' in raw_value and not QUOTED_PATTERN.match(raw_value):
+            report.error(path, number, f'malformed quoting in {key}: {raw_value}')
+        if key in entries:
+            report.warning(path, number, f'{key} set again (line {entries[key].line} is ignored)')
+
+        pass_key = slangp.PASS_KEY_PATTERN.match(key)
+        if pass_key:
+            idx = int(pass_key.group(2))
+            if pass_key.group(1) == 'shader':
+                current_pass = idx
+            elif current_pass is not None and idx != current_pass:
+                report.error(path, number, f'{key} set under shader{current_pass}')
+        entries[key] = Entry(slangp.unquote(raw_value), path, number)
+    return reference, entries
+
+
+def load_chain(path: Path, report: Report):
+    """Return {key: Entry} for `path` with its #reference chain applied, or None when the chain is broken."""
+    reference, own = parse_file(path, report)
+    layers = [own]
+    chain = [path.resolve()]
+    while reference is not None:
+        target, number = reference
+        if not target.is_file():
+            report.error(chain[-1], number, f'#reference target not found: {target}')
+            return None
+        target = target.resolve()
+        if target in chain:
+            report.error(path, 0, f'#reference cycle through {target}')
+            return None
+        if len(chain) >= MAX_REFERENCE_DEPTH:
+            report.error(path, 0, f'#reference chain deeper than {MAX_REFERENCE_DEPTH}')
+            return None
+        chain.append(target)
+        # Problems inside referenced files are reported when those files are checked
+        reference, entries = parse_file(target, Report())
+        layers.append(entries)
+
+    merged = dict(layers[-1])
+    texture_names = set(split_names(merged['textures'].value)) if 'textures' in merged else set()
+    for layer in reversed(layers[:-1]):
+        for key, entry in layer.items():
+            if is_structure_key(key, texture_names):
+                if layer is own:
+                    report.warning(entry.path, entry.line, f'{key} is ignored in a preset with #reference')
+                continue
+            merged[key] = entry
+    return merged
+
+
+def split_names(value: str):
+    return [name.strip() for name in value.split(';') if name.strip()]
+
+
+def is_structure_key(key: str, texture_names) -> bool:
+    if key in STRUCTURE_KEYS or slangp.PASS_KEY_PATTERN.match(key):
+        return True
+    return any(key == f'{name}{suffix}' for name in texture_names for suffix in TEXTURE_OPTION_SUFFIXES)
+
+
+def check_value(entry: Entry, key: str, check, report: Report):
+    test, expected = check
+    if not test(entry.value):
+        report.error(entry.path, entry.line, f'{key} = {entry.value!r}, expected {expected}')
+
+
+def validate_preset(path: Path):
+    report = Report()
+    entries = load_chain(path, report)
+    if entries is None:
+        return report
+
+    if 'shaders' not in entries:
+        report.error(path, 0, 'no shaders = N')
+        return report
+    shaders = entries['shaders']
+    if not is_integer(shaders.value) or int(shaders.value) < 1:
+        report.error(shaders.path, shaders.line, f'shaders = {shaders.value!r}, expected a positive integer')
+        return report
+    count = int(shaders.value)
+
+    textures = set(split_names(entries['textures'].value)) if 'textures' in entries else set()
+    listed = set(split_names(entries['parameters'].value)) if 'parameters' in entries else set()
+    shader_files = []
+    for idx in range(count):
+        entry = entries.get(f'shader{idx}')
+        if entry is None:
+            report.error(shaders.path, shaders.line, f'shader{idx} missing (shaders = {count})')
+            continue
+        shader_file = (entry.path.parent / entry.value).resolve()
+        if not shader_file.is_file():
+            report.error(entry.path, entry.line, f'shader{idx} not found: {entry.value}')
+            continue
+        shader_files.append(shader_file)
+
+    for name in textures:
+        entry = entries.get(name)
+        if entry is None:
+            report.error(entries['textures'].path, entries['textures'].line, f'texture {name} has no path')
+        elif not (entry.path.parent / entry.value).is_file():
+            report.error(entry.path, entry.line, f'texture {name} not found: {entry.value}')
+
+    if 'feedback_pass' in entries:
+        check_value(entries['feedback_pass'], 'feedback_pass', (is_integer, 'an integer'), report)
+
+    declared = {}
+    complete = len(shader_files) == count
+    for shader_file in shader_files:
+        for name, limits in declared_parameters(shader_file).items():
+            declared.setdefault(name, limits)
+
+    for key, entry in entries.items():
+        pass_key = slangp.PASS_KEY_PATTERN.match(key)
+        if pass_key:
+            if int(pass_key.group(2)) >= count:
+                report.error(entry.path, entry.line, f'{key} set but the preset has {count} pass(es)')
+            else:
+                check_value(entry, key, PASS_VALUE_CHECKS[pass_key.group(1)], report)
+            continue
+        if key in STRUCTURE_KEYS or key in textures:
+            continue
+        option = next((suffix for suffix in TEXTURE_OPTION_SUFFIXES if key.endswith(suffix) and key[:-len(suffix)] in textures), None)
+        if option:
+            check_value(entry, key, TEXTURE_VALUE_CHECKS[option], report)
+            continue
+
+        if not is_number(entry.value):
+            report.error(entry.path, entry.line, f'{key} = {entry.value!r}, expected a number')
+            continue
+        if key not in declared:
+            # Without every pass the declarations are incomplete; missing passes are already errors
+            if complete and key not in listed:
+                report.error(entry.path, entry.line, f'{key} is not a parameter of any pass')
+            continue
+        limits = declared[key]
+        if limits and not limits[0] <= float(entry.value) <= limits[1]:
+            report.warning(entry.path, entry.line, f'{key} = {entry.value} outside [{limits[0]:g}, {limits[1]:g}]')
+    return report
+
+
+def preset_paths(input_dirs):
+    paths = []
+    for input_dir in input_dirs:
+        if input_dir.is_file():
+            paths.append(input_dir)
+        elif input_dir.exists():
+            paths.extend(sorted(input_dir.rglob('*.slangp')))
+        else:
+            print(f"Warning: Input directory not found: {input_dir}")
+    return paths
+
+
+def location(path: Path, line: int) -> str:
+    try:
+        path = path.resolve().relative_to(ROOT)
+    except ValueError:
+        pass
+    return f'{path.as_posix()}:{line}' if line else path.as_posix()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check .slangp presets for index, quoting, path and parameter errors')
+    parser.add_argument(
+        '--input-dir',
+        type=Path,
+        action='append',
+        default=[],
+        help='Preset folder or file to check (repeatable, default: hand-maintained folders and out/presets)',
+    )
+    parser.add_argument('--strict', action='store_true', help='Fail on warnings too')
+    parser.add_argument('--max-errors', type=int, default=200, help='Maximum number of issues to print')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--jobs', type=int, default=default_workers())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    input_dirs = args.input_dir or [d for d in [ROOT / name for name in SOURCE_DIRS] + [ROOT / 'out' / 'presets'] if d.exists()]
+    paths = preset_paths(input_dirs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        reports = list(executor.map(validate_preset, paths))
+
+    # A problem in a referenced preset shows up once for every preset that references it
+    errors = sorted({('error', *issue) for report in reports for issue in report.errors})
+    warnings = sorted({('warning', *issue) for report in reports for issue in report.warnings})
+    issues = sorted(errors + warnings, key=lambda issue: (location(issue[1], 0), issue[2]))
+    for kind, path, line, message in issues[:args.max_errors]:
+        print(f"{location(path, line)}: {kind}: {message}")
+    if len(issues) > args.max_errors:
+        print(f"... {len(issues) - args.max_errors} more issue(s) not shown")
+
+    elapsed = time.perf_counter() - start
+    failed = errors or (args.strict and warnings)
+    status = 'failed' if failed else 'passed'
+    print(f"Preset validation {status}: {len(paths)} preset(s), {len(errors)} error(s), {len(warnings)} warning(s) in {elapsed:.2f}s.")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()